@@ -0,0 +1,89 @@
+"""
+Gráficas de analítica como imágenes PNG/SVG cacheables.
+
+Cada gráfica se identifica con una huella de los datos agregados que dibuja:
+la huella es el ETag de la respuesta y la clave de la imagen en la caché de
+Django, así que mientras las ventas no cambien no se vuelve a usar matplotlib.
+Se dibuja con la API orientada a objetos (``Figure``), sin el estado global de
+pyplot, en el pool de procesos de render_pool.py.
+"""
+import hashlib
+import io
+import json
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .render_pool import render_many
+
+CHART_CACHE_TIMEOUT = 60 * 60 * 24  # la clave cambia con los datos: no hay imágenes obsoletas
+CHART_STYLE_VERSION = 1  # subir al cambiar el estilo para invalidar la caché
+
+FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+# nombre -> (campo de sales_by_product, título, etiqueta del eje Y, color)
+CHARTS = {
+    "unidades": ("unidades", "Cantidad vendida por producto", "Unidades vendidas", "#a97155"),
+    "facturacion": ("facturado", "Facturación total por producto", "Total facturado ($)", "#6d4c41"),
+}
+
+
+def chart_series(name, ventas):
+    """(etiquetas, valores) de la gráfica ``name`` a partir de ``sales_by_product``."""
+    field = CHARTS[name][0]
+    return [v["nombre"] for v in ventas], [v[field] for v in ventas]
+
+
+def chart_fingerprint(name, fmt, labels, values):
+    raw = json.dumps([CHART_STYLE_VERSION, name, fmt, labels, [str(v) for v in values]])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def render_chart(name, fmt, labels, values):
+    """Dibuja la gráfica de barras y devuelve los bytes en ``fmt``."""
+    from matplotlib.figure import Figure  # solo al dibujar: las vistas en caché no lo importan
+
+    _, title, ylabel, color = CHARTS[name]
+    fig = Figure(figsize=(8, 5))
+    ax = fig.subplots()
+    positions = range(len(labels))
+    ax.bar(positions, [float(v) for v in values], width=0.5, color=color)
+    ax.set_title(title)
+    ax.set_xlabel("Producto")
+    ax.set_ylabel(ylabel)
+    ax.set_xticks(positions, labels, rotation=90)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def get_charts(specs):
+    """
+    ``specs``: lista de (name, fmt, labels, values). Devuelve una lista de
+    (bytes, fecha de generación): las que no están en la caché se dibujan en
+    paralelo en el pool de procesos y se guardan. Si una no termina a tiempo su
+    lugar queda en None y se guarda en la caché cuando el pool la entrega.
+    """
+    keys = [f"analytics:chart:{chart_fingerprint(*spec)}" for spec in specs]
+    cached = cache.get_many(keys)
+    missing = [(key, spec) for key, spec in zip(keys, specs) if key not in cached]
+    if missing:
+        def store_late(index, image):
+            cache.set(missing[index][0], (image, timezone.now()), CHART_CACHE_TIMEOUT)
+
+        images = render_many(render_chart, [spec for _, spec in missing], on_late=store_late)
+        now = timezone.now()
+        rendered = {key: (image, now) for (key, _), image in zip(missing, images) if image is not None}
+        cache.set_many(rendered, CHART_CACHE_TIMEOUT)
+        cached.update(rendered)
+    return [cached.get(key) for key in keys]
+
+
+def get_chart(name, fmt, labels, values):
+    """(bytes, fecha de generación) de una gráfica, o None si el pool aún la está dibujando."""
+    return get_charts([(name, fmt, labels, values)])[0]
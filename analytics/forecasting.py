@@ -0,0 +1,169 @@
+"""
+Pronóstico de demanda por producto, calculado por lotes para todo el catálogo.
+
+Con SalesDaily (facturas + Venta ya sumadas por día) se arma una matriz
+productos × días. Sobre ella se ajustan a la vez, con operaciones de numpy
+por columna (un paso por día, no un bucle por producto), suavizado
+exponencial simple y Holt para una pequeña grilla de parámetros; cada
+producto se queda con la combinación de menor error a un día. El resultado
+se guarda en DemandForecast con ``manage.py refresh_forecasts`` (pensado para
+correr cada noche) y lo leen el motor de reabastecimiento y las alertas de
+inventario lento.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from inventory.models import Product
+
+from .models import DemandForecast, SalesDaily
+
+BATCH_SIZE = 1000
+INIT_DAYS = 7  # el nivel inicial es el promedio de la primera semana
+
+# (alpha, beta): beta = 0 es suavizado exponencial simple
+GRID = [
+    (0.1, 0.0), (0.2, 0.0), (0.3, 0.0), (0.5, 0.0),
+    (0.1, 0.05), (0.2, 0.05), (0.3, 0.1), (0.5, 0.1),
+]
+
+
+def _history_days():
+    return getattr(settings, "FORECAST_HISTORY_DAYS", 90)
+
+
+def demand_matrix(product_ids, start, end):
+    """
+    Matriz (productos × días) con las unidades vendidas de ``start`` a ``end``
+    (ambos incluidos). Las filas siguen el orden de ``product_ids``, que debe
+    estar ordenado; los días sin ventas quedan en 0 y las ventas de productos
+    que no están en ``product_ids`` se ignoran.
+    """
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+    days = (end - start).days + 1
+    matrix = np.zeros((len(product_ids), days), dtype=np.float64)
+    rows = list(
+        SalesDaily.objects
+        .filter(day__gte=start, day__lte=end)
+        .values_list("product_id", "day", "units")
+        .iterator(chunk_size=10000)
+    )
+    if not rows:
+        return matrix
+
+    ids, sale_days, units = zip(*rows)
+    ids = np.fromiter(ids, dtype=np.int64, count=len(ids))
+    pos = np.searchsorted(product_ids, ids)
+    known = (pos < len(product_ids)) & (product_ids[np.minimum(pos, len(product_ids) - 1)] == ids)
+    offsets = np.fromiter((d.toordinal() for d in sale_days), dtype=np.int64, count=len(sale_days)) - start.toordinal()
+    np.add.at(matrix, (pos[known], offsets[known]), np.asarray(units, dtype=np.float64)[known])
+    return matrix
+
+
+def fit(matrix, grid=GRID):
+    """
+    Ajusta Holt (y SES cuando beta = 0) a todas las filas de ``matrix`` para
+    cada (alpha, beta) de ``grid`` y elige, por fila, la combinación con menor
+    error absoluto medio a un día. Devuelve un diccionario de arreglos con
+    ``alpha``, ``beta``, ``level``, ``trend`` y ``error``.
+    """
+    n, days = matrix.shape
+    init = min(INIT_DAYS, days)
+    fits = []
+    for alpha, beta in grid:
+        level = matrix[:, :init].mean(axis=1)
+        trend = np.zeros(n)
+        abs_error = np.zeros(n)
+        for t in range(init, days):
+            actual = matrix[:, t]
+            predicted = level + trend
+            abs_error += np.abs(actual - np.maximum(predicted, 0.0))
+            new_level = alpha * actual + (1 - alpha) * predicted
+            trend = beta * (new_level - level) + (1 - beta) * trend
+            level = new_level
+        fits.append((level, trend, abs_error / max(days - init, 1)))
+
+    levels, trends, errors = (np.stack(values) for values in zip(*fits))
+    best = errors.argmin(axis=0)  # a igual error gana la primera: SES antes que Holt
+    rows = np.arange(n)
+    alphas, betas = (np.array(values) for values in zip(*grid))
+    return {
+        "alpha": alphas[best],
+        "beta": betas[best],
+        "level": np.maximum(levels[best, rows], 0.0),
+        "trend": trends[best, rows],
+        "error": errors[best, rows],
+    }
+
+
+def expected_units(level, trend, days):
+    """Unidades esperadas en los próximos ``days`` días para cada producto."""
+    horizon = np.arange(1, days + 1)
+    return np.maximum(level[:, None] + trend[:, None] * horizon, 0.0).sum(axis=1)
+
+
+def refresh_forecasts(history_days=None, batch_size=BATCH_SIZE):
+    """
+    Recalcula y guarda el pronóstico de todos los productos con el historial de
+    los últimos ``history_days`` días. Devuelve la cantidad de productos.
+    """
+    history_days = history_days or _history_days()
+    end = timezone.localdate()
+    start = end - timedelta(days=history_days - 1)
+
+    product_ids = np.fromiter(Product.objects.order_by("pk").values_list("pk", flat=True), dtype=np.int64)
+    if not len(product_ids):
+        return 0
+    model = fit(demand_matrix(product_ids, start, end))
+    units_7d = expected_units(model["level"], model["trend"], 7)
+    units_30d = expected_units(model["level"], model["trend"], 30)
+
+    now = timezone.now()
+    forecasts = [
+        DemandForecast(
+            product_id=product_id,
+            method=DemandForecast.HOLT if beta else DemandForecast.SES,
+            alpha=alpha, beta=beta, level=level, trend=trend, error=error,
+            units_7d=u7, units_30d=u30,
+            history_days=history_days,
+            computed_at=now,
+        )
+        for product_id, alpha, beta, level, trend, error, u7, u30 in zip(
+            product_ids.tolist(), model["alpha"].tolist(), model["beta"].tolist(),
+            model["level"].tolist(), model["trend"].tolist(), model["error"].tolist(),
+            units_7d.tolist(), units_30d.tolist(),
+        )
+    ]
+    update_fields = ["method", "alpha", "beta", "level", "trend", "error",
+                     "units_7d", "units_30d", "history_days", "computed_at"]
+    with transaction.atomic():
+        DemandForecast.objects.bulk_create(
+            forecasts,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=update_fields,
+        )
+    return len(forecasts)
+
+
+def forecast_rates(product_ids, days=30):
+    """
+    Demanda diaria prevista (unidades de los próximos ``days`` días / ``days``)
+    alineada con ``product_ids`` (ordenado); NaN para los productos sin
+    pronóstico. Solo admite 7 o 30 días, los horizontes guardados.
+    """
+    field = {7: "units_7d", 30: "units_30d"}[days]
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+    rates = np.full(len(product_ids), np.nan)
+    rows = list(DemandForecast.objects.values_list("product_id", field))
+    if rows and len(product_ids):
+        ids, units = zip(*rows)
+        ids = np.fromiter(ids, dtype=np.int64, count=len(ids))
+        pos = np.minimum(np.searchsorted(product_ids, ids), len(product_ids) - 1)
+        known = product_ids[pos] == ids
+        rates[pos[known]] = np.asarray(units, dtype=np.float64)[known] / days
+    return rates
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from analytics.rollup import rebuild
+from analytics.stats import RAW, ROLLUP, product_sales_stats, window_field
+
+CHECK_WINDOWS = (30, 60, 365)
+
+
+class Command(BaseCommand):
+    help = "Reconstruye la tabla resumen de ventas diarias (SalesDaily) desde facturas y ventas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="Primer día a recalcular (AAAA-MM-DD). Por defecto, todo el historial.")
+        parser.add_argument("--hasta", help="Último día a recalcular (AAAA-MM-DD).")
+        parser.add_argument("--check", action="store_true",
+                            help="Solo comparar el resumen con las ventas originales, sin modificarlo.")
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            return self.check_rollup()
+
+        dates = {}
+        for option in ("desde", "hasta"):
+            if options[option]:
+                try:
+                    dates[option] = parse_date(options[option])
+                except ValueError:
+                    dates[option] = None
+                if dates[option] is None:
+                    raise CommandError(f"Fecha no válida: {options[option]}")
+        rows = rebuild(start=dates.get("desde"), end=dates.get("hasta"))
+        self.stdout.write(self.style.SUCCESS(f"{rows} filas de ventas diarias recalculadas."))
+
+    def check_rollup(self):
+        fields = [window_field(days) for days in CHECK_WINDOWS] + ["ultima_venta"]
+        rollup = {p.pk: p for p in product_sales_stats(*CHECK_WINDOWS, source=ROLLUP)}
+        mismatches = 0
+        for product in product_sales_stats(*CHECK_WINDOWS, source=RAW):
+            expected = [getattr(product, field) for field in fields]
+            actual = [getattr(rollup[product.pk], field) for field in fields]
+            if expected != actual:
+                mismatches += 1
+                self.stdout.write(self.style.WARNING(
+                    f"{product.name}: resumen {actual} ≠ ventas {expected} ({', '.join(fields)})"
+                ))
+        if mismatches:
+            self.stdout.write(self.style.WARNING(
+                f"{mismatches} productos no coinciden: ejecuta rebuild_sales_rollup sin --check."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("El resumen coincide con las ventas originales."))
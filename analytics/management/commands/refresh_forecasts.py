@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.forecasting import refresh_forecasts
+
+
+class Command(BaseCommand):
+    help = "Recalcula el pronóstico de demanda de todos los productos (ejecutar cada noche)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=None,
+                            help="Días de historial a usar (por defecto FORECAST_HISTORY_DAYS).")
+
+    def handle(self, *args, **options):
+        if options["dias"] is not None and options["dias"] < 14:
+            raise CommandError("Se necesitan al menos 14 días de historial.")
+        start = time.perf_counter()
+        count = refresh_forecasts(history_days=options["dias"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Pronóstico actualizado para {count} productos en {time.perf_counter() - start:.1f}s."
+        ))
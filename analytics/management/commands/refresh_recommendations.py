@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from analytics.models import Recommendation
+from analytics.recommendations import refresh
+
+
+class Command(BaseCommand):
+    help = ("Actualiza las recomendaciones de reabastecimiento e inventario lento con IA, "
+            "solo para los productos cuyos datos cambiaron (ejecutar periódicamente).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tipo", choices=[kind for kind, _ in Recommendation.KIND_CHOICES],
+                            help="Actualizar solo un tipo de recomendación.")
+        parser.add_argument("--force", action="store_true",
+                            help="Volver a consultar todos los productos aunque sus datos no cambiaran.")
+        parser.add_argument("--concurrency", type=int, default=None,
+                            help="Consultas simultáneas a OpenAI (por defecto LLM_FANOUT_CONCURRENCY).")
+
+    def handle(self, *args, **options):
+        kinds = [options["tipo"]] if options["tipo"] else [kind for kind, _ in Recommendation.KIND_CHOICES]
+        labels = dict(Recommendation.KIND_CHOICES)
+        for kind in kinds:
+            result = refresh(kind, force=options["force"], concurrency=options["concurrency"])
+            self.stdout.write(self.style.SUCCESS(
+                f"{labels[kind]}: {result.generated} generadas, {result.unchanged} sin cambios, "
+                f"{result.removed} eliminadas."
+            ))
+            for product, message in result.invalid:
+                self.stdout.write(self.style.WARNING(f"  {product}: {message}"))
+            for group, message in result.failed:
+                self.stdout.write(self.style.ERROR(f"  Grupo {group} falló: {message}"))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('inventory', '0011_product_updated_at_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(choices=[('ses', 'Suavizado exponencial simple'), ('holt', 'Holt (nivel y tendencia)')], max_length=10)),
+                ('alpha', models.FloatField()),
+                ('beta', models.FloatField(default=0)),
+                ('level', models.FloatField()),
+                ('trend', models.FloatField(default=0)),
+                ('error', models.FloatField()),
+                ('units_7d', models.FloatField()),
+                ('units_30d', models.FloatField()),
+                ('history_days', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField()),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast', to='inventory.product')),
+            ],
+        ),
+    ]
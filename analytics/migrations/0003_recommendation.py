@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_demandforecast'),
+        ('inventory', '0011_product_updated_at_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('restock', 'Reabastecimiento'), ('slow', 'Inventario lento')], max_length=10)),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(blank=True, max_length=30)),
+                ('action', models.CharField(max_length=30)),
+                ('quantity', models.PositiveIntegerField(blank=True, null=True)),
+                ('lead_time_days', models.PositiveIntegerField(blank=True, null=True)),
+                ('reason', models.TextField(blank=True)),
+                ('input_fingerprint', models.CharField(max_length=64)),
+                ('generated_at', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'position'], name='recommendation_kind_pos_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'product'), name='recommendation_kind_product_uniq')],
+            },
+        ),
+    ]
@@ -1,3 +1,103 @@
 from django.db import models
 
 # Create your models here.
+
+
+class SalesDaily(models.Model):
+    """
+    Ventas acumuladas por producto y día (facturas + Venta).
+
+    Se mantiene al registrar cada factura (ver rollup.py) y se puede
+    reconstruir con ``manage.py rebuild_sales_rollup``.
+    """
+
+    product = models.ForeignKey("inventory.Product", on_delete=models.CASCADE, related_name="sales_daily")
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    invoice_count = models.PositiveIntegerField(default=0)  # facturas distintas con el producto ese día
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "day"], name="salesdaily_product_day_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["day"], name="salesdaily_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product} {self.day}: {self.units}"
+
+
+class DemandForecast(models.Model):
+    """
+    Pronóstico de demanda diaria de un producto (suavizado exponencial / Holt).
+
+    Lo recalcula ``manage.py refresh_forecasts`` (ver forecasting.py); las
+    vistas leen estas filas en vez de recorrer el historial de ventas.
+    """
+
+    SES = "ses"
+    HOLT = "holt"
+    METHOD_CHOICES = [
+        (SES, "Suavizado exponencial simple"),
+        (HOLT, "Holt (nivel y tendencia)"),
+    ]
+
+    product = models.OneToOneField("inventory.Product", on_delete=models.CASCADE, related_name="forecast")
+    method = models.CharField(max_length=10, choices=METHOD_CHOICES)
+    alpha = models.FloatField()
+    beta = models.FloatField(default=0)
+    level = models.FloatField()  # unidades diarias estimadas para hoy
+    trend = models.FloatField(default=0)  # cambio diario de la demanda
+    error = models.FloatField()  # error absoluto medio de los pronósticos a un día sobre el historial
+    units_7d = models.FloatField()  # unidades esperadas en los próximos 7 días
+    units_30d = models.FloatField()  # unidades esperadas en los próximos 30 días
+    history_days = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    def expected_units(self, days):
+        """Unidades esperadas en los próximos ``days`` días (nunca negativas)."""
+        return sum(max(self.level + h * self.trend, 0.0) for h in range(1, days + 1))
+
+    def __str__(self):
+        return f"{self.product}: {self.units_30d:.1f} u/30d ({self.method})"
+
+
+class Recommendation(models.Model):
+    """
+    Recomendación de la IA para un producto, guardada en forma estructurada.
+
+    La genera ``manage.py refresh_recommendations`` (ver recommendations.py)
+    solo para los productos cuyos datos de entrada cambiaron: ``input_fingerprint``
+    es la huella de esos datos. Las páginas de análisis leen estas filas.
+    """
+
+    RESTOCK = "restock"
+    SLOW = "slow"
+    KIND_CHOICES = [
+        (RESTOCK, "Reabastecimiento"),
+        (SLOW, "Inventario lento"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    product = models.ForeignKey("inventory.Product", on_delete=models.CASCADE, related_name="recommendations")
+    position = models.PositiveIntegerField(default=0)  # orden en la página (urgencia o nombre)
+    status = models.CharField(max_length=30, blank=True)  # p. ej. "Movimiento lento" / "Obsoleto"
+    action = models.CharField(max_length=30)
+    quantity = models.PositiveIntegerField(null=True, blank=True)
+    lead_time_days = models.PositiveIntegerField(null=True, blank=True)
+    reason = models.TextField(blank=True)
+    input_fingerprint = models.CharField(max_length=64)
+    generated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "product"], name="recommendation_kind_product_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["kind", "position"], name="recommendation_kind_pos_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.product}: {self.action}"
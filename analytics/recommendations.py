@@ -0,0 +1,291 @@
+"""
+Recomendaciones de la IA guardadas por producto (modelo Recommendation).
+
+Se piden a OpenAI en JSON estructurado (producto, acción, cantidad, plazo y
+motivo), por grupos de ``LLM_FANOUT_CHUNK_SIZE`` productos consultados en
+paralelo (``llm.chat_many``), y se validan antes de guardarse. El límite de
+tokens de cada consulta crece con el tamaño del grupo; si aun así la respuesta
+se corta, el grupo se parte en dos y se vuelve a pedir. Cada fila guarda la huella de los
+datos del producto con que se generó: ``refresh`` solo vuelve a consultar los
+productos cuyos datos cambiaron. Las páginas de análisis solo leen la tabla;
+la actualiza ``manage.py refresh_recommendations`` (programado con cron).
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from inventory.llm import ResponseTruncated, chat_many
+
+from .models import DemandForecast, Recommendation
+from .restock import restock_plan
+from .stats import product_sales_stats
+
+logger = logging.getLogger(__name__)
+
+NORMAL = "Normal"
+SLOW_STATUSES = (NORMAL, "Movimiento lento", "Obsoleto")
+SLOW_ACTIONS = ("Mantener", "Promoción", "Remate", "Retirar")
+RESTOCK_ACTION = "Reabastecer"
+MAX_REASON_LENGTH = 500
+RESPONSE_BASE_TOKENS = 50  # {"recomendaciones": [...]} sin los elementos
+
+
+class RefreshResult:
+    def __init__(self):
+        self.generated = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.invalid = []  # [(producto, mensaje)]
+        self.failed = []  # [(grupo, mensaje)]
+
+
+def fingerprint(data):
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def restock_inputs():
+    """Productos a reabastecer según restock.py, en orden de urgencia."""
+    return [
+        {
+            "producto_id": p["producto_id"],
+            "nombre": p["nombre"],
+            "categoria": p["categoria"],
+            "stock": p["stock"],
+            "demanda_diaria": p["demanda_diaria"],
+            "dias_cobertura": p["dias_cobertura"],
+            "cantidad_sugerida": p["cantidad_sugerida"],
+            "plazo_dias": p["plazo_dias"],
+        }
+        for p in restock_plan(only_restock=True)
+    ]
+
+
+def slow_inputs():
+    """Todos los productos con ventas de 60 días, última venta y demanda prevista, por nombre."""
+    # unidades esperadas en 30 días según el pronóstico nocturno (refresh_forecasts)
+    pronosticos = dict(DemandForecast.objects.values_list("product_id", "units_30d"))
+    productos = []
+    for p in product_sales_stats(60):
+        pronostico = pronosticos.get(p.pk)
+        productos.append({
+            "producto_id": p.pk,
+            "nombre": p.name,
+            "categoria": p.category,
+            "stock": p.quantity,
+            "ventas_ult_60d": p.ventas_60d,
+            "ultima_venta": p.ultima_venta.isoformat() if p.ultima_venta else "Nunca",
+            "demanda_prevista_30d": round(pronostico, 1) if pronostico is not None else "Sin pronóstico",
+        })
+    return productos
+
+
+def _prompt_rows(chunk):
+    return json.dumps([{k: v for k, v in p.items() if k != "producto_id"} for p in chunk], ensure_ascii=False)
+
+
+def restock_messages(chunk):
+    prompt = f"""
+Eres un asistente experto en gestión de inventario para comercios.
+
+Estos productos necesitan reabastecerse. La cantidad sugerida y el plazo (días) ya están calculados
+a partir de las ventas: cópialos tal cual. Para cada producto explica en una o dos frases por qué
+conviene el pedido (ventas, stock actual, días de cobertura).
+
+Responde solo con JSON con esta forma, un elemento por producto:
+{{"recomendaciones": [{{"producto": "<nombre exacto>", "accion": "{RESTOCK_ACTION}", "cantidad": <número>, "plazo_dias": <número>, "motivo": "<texto corto>"}}]}}
+
+Productos:
+{_prompt_rows(chunk)}
+    """
+    return [
+        {"role": "system", "content": "Eres un asistente de inventario inteligente."},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def slow_messages(chunk):
+    prompt = f"""
+Eres un analista de inventario experto.
+
+Tienes información de productos, su stock, ventas en los últimos 60 días, la última venta y la demanda prevista para los próximos 30 días.
+Para cada producto indica si tiene movimiento lento u obsolescencia.
+
+Responde solo con JSON con esta forma, un elemento por producto:
+{{"recomendaciones": [{{"producto": "<nombre exacto>", "estado": "<{' / '.join(SLOW_STATUSES)}>", "accion": "<{' / '.join(SLOW_ACTIONS)}>", "motivo": "<breve justificación (por ejemplo: sin ventas en X días, stock muy alto respecto ventas)>"}}]}}
+
+Productos:
+{_prompt_rows(chunk)}
+    """
+    return [
+        {"role": "system", "content": "Eres un experto en análisis de inventario."},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _clean_restock(item, product):
+    if item.get("accion", RESTOCK_ACTION) != RESTOCK_ACTION:
+        raise ValueError(f"acción no válida: {item.get('accion')!r}")
+    # Las cifras son las del motor de reabastecimiento aunque la IA escriba otras
+    return {
+        "status": "",
+        "action": RESTOCK_ACTION,
+        "quantity": product["cantidad_sugerida"],
+        "lead_time_days": product["plazo_dias"],
+    }
+
+
+def _clean_slow(item, product):
+    status, action = item.get("estado"), item.get("accion")
+    if status not in SLOW_STATUSES:
+        raise ValueError(f"estado no válido: {status!r}")
+    if action not in SLOW_ACTIONS:
+        raise ValueError(f"acción no válida: {action!r}")
+    return {"status": status, "action": action, "quantity": None, "lead_time_days": None}
+
+
+# (datos, mensajes, validación, tokens de respuesta por producto)
+KINDS = {
+    Recommendation.RESTOCK: (restock_inputs, restock_messages, _clean_restock, 150),
+    Recommendation.SLOW: (slow_inputs, slow_messages, _clean_slow, 130),
+}
+
+
+def parse_response(kind, chunk, raw):
+    """
+    Valida la respuesta JSON de un grupo. Devuelve ({producto_id: campos de
+    Recommendation}, [(producto, error)]). Los productos que falten o no sean
+    válidos no se guardan y se vuelven a pedir en el siguiente refresco.
+    """
+    clean = KINDS[kind][2]
+    by_name = {p["nombre"]: p for p in chunk}
+    try:
+        items = json.loads(raw or "")["recomendaciones"]
+        if not isinstance(items, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("La respuesta no es el JSON esperado.")
+
+    valid, errors = {}, []
+    for item in items:
+        if not isinstance(item, dict):
+            errors.append(("?", "elemento que no es un objeto"))
+            continue
+        name = str(item.get("producto", "")).strip()
+        product = by_name.get(name)
+        if product is None:
+            errors.append((name or "?", "producto que no estaba en la consulta"))
+            continue
+        try:
+            fields = clean(item, product)
+        except ValueError as exc:
+            errors.append((name, str(exc)))
+            continue
+        fields["reason"] = str(item.get("motivo") or "").strip()[:MAX_REASON_LENGTH]
+        valid[product["producto_id"]] = fields
+    reported = {name for name, _ in errors}
+    errors.extend((name, "sin respuesta") for name, product in by_name.items()
+                  if product["producto_id"] not in valid and name not in reported)
+    return valid, errors
+
+
+def _request(kind, chunk):
+    """Argumentos de ``chat`` para un grupo de productos."""
+    _, messages, _, tokens_per_item = KINDS[kind]
+    # Sin la caché de llm.py: esta tabla ya cumple esa función
+    return {
+        "messages": messages(chunk),
+        "temperature": 0.2,
+        "max_tokens": RESPONSE_BASE_TOKENS + tokens_per_item * len(chunk),
+        "use_cache": False,
+        "allow_truncated": False,
+        "response_format": {"type": "json_object"},
+    }
+
+
+def refresh(kind, force=False, chunk_size=None, concurrency=None):
+    """
+    Actualiza las recomendaciones de ``kind``: consulta la IA solo por los
+    productos nuevos o con datos distintos (todos con ``force``), borra las de
+    productos que ya no aplican y reordena las demás. Devuelve un RefreshResult.
+    """
+    chunk_size = chunk_size or getattr(settings, "LLM_FANOUT_CHUNK_SIZE", 15)
+    result = RefreshResult()
+
+    inputs = KINDS[kind][0]()
+    fingerprints = {p["producto_id"]: fingerprint({k: v for k, v in p.items() if k != "producto_id"})
+                    for p in inputs}
+    positions = {p["producto_id"]: position for position, p in enumerate(inputs)}
+    current = Recommendation.objects.filter(kind=kind)
+    existing = dict(current.values_list("product_id", "input_fingerprint"))
+
+    stale = [p for p in inputs if force or existing.get(p["producto_id"]) != fingerprints[p["producto_id"]]]
+    result.unchanged = len(inputs) - len(stale)
+    chunks = [stale[i:i + chunk_size] for i in range(0, len(stale), chunk_size)]
+
+    now = timezone.now()
+    generated = []
+    while chunks:
+        responses = chat_many([_request(kind, chunk) for chunk in chunks], concurrency=concurrency)
+        retry = []
+        for chunk, response in zip(chunks, responses):
+            label = f"{chunk[0]['nombre']} … {chunk[-1]['nombre']}"
+            if isinstance(response, ResponseTruncated) and len(chunk) > 1:
+                # Motivos más largos de lo previsto: se pide en dos grupos más chicos
+                logger.info("Recomendaciones %s (%s): respuesta cortada, se divide el grupo", kind, label)
+                half = (len(chunk) + 1) // 2
+                retry.extend([chunk[:half], chunk[half:]])
+                continue
+            if isinstance(response, Exception):
+                logger.warning("Recomendaciones %s (%s): %s", kind, label, response)
+                result.failed.append((label, str(response)))
+                continue
+            try:
+                valid, errors = parse_response(kind, chunk, response)
+            except ValueError as exc:
+                result.failed.append((label, str(exc)))
+                continue
+            result.invalid.extend(errors)
+            for product_id, fields in valid.items():
+                generated.append(Recommendation(
+                    kind=kind,
+                    product_id=product_id,
+                    position=positions[product_id],
+                    input_fingerprint=fingerprints[product_id],
+                    generated_at=now,
+                    **fields,
+                ))
+        chunks = retry
+
+    with transaction.atomic():
+        result.removed, _ = current.exclude(product_id__in=list(fingerprints)).delete()
+        Recommendation.objects.bulk_create(
+            generated,
+            update_conflicts=True,
+            unique_fields=["kind", "product"],
+            update_fields=["position", "status", "action", "quantity", "lead_time_days", "reason",
+                           "input_fingerprint", "generated_at"],
+        )
+        # Las que no cambiaron igual pueden cambiar de lugar (p. ej. urgencia)
+        moved = [rec for rec in current.only("id", "product_id", "position")
+                 if rec.product_id in positions and rec.position != positions[rec.product_id]]
+        for rec in moved:
+            rec.position = positions[rec.product_id]
+        Recommendation.objects.bulk_update(moved, ["position"], batch_size=500)
+    result.generated = len(generated)
+    return result
+
+
+def latest(kind):
+    """Recomendaciones guardadas de ``kind`` para mostrar (una consulta), en orden."""
+    recommendations = (Recommendation.objects
+                       .filter(kind=kind)
+                       .select_related("product")
+                       .order_by("position"))
+    if kind == Recommendation.SLOW:
+        recommendations = recommendations.exclude(status=NORMAL)
+    return recommendations
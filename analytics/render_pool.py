@@ -0,0 +1,125 @@
+"""
+Pool de procesos para dibujar gráficas fuera del hilo de la solicitud.
+
+Dibujar con matplotlib es CPU pura y retiene el GIL: en un pool de procesos
+las gráficas de un mismo tablero se dibujan en paralelo en núcleos distintos.
+Los procesos se crean una vez (con matplotlib ya importado) y se reutilizan.
+Si el pool se cae se dibuja en el propio proceso; si solo tarda, la gráfica
+sigue en el pool y la solicitud no la espera (ver ``render_many``).
+
+Todas las gráficas nuevas deben pasar por ``render``/``render_many``.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_pid = None  # un pool heredado por fork (gunicorn --preload) no sirve en el hijo
+_pool_lock = threading.Lock()
+
+
+def _workers():
+    return getattr(settings, "CHART_RENDER_WORKERS", min(2, os.cpu_count() or 1))
+
+
+def _timeout():
+    return getattr(settings, "CHART_RENDER_TIMEOUT", 10)
+
+
+def _warm():
+    """Inicializador de cada proceso: importa matplotlib una sola vez."""
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    import matplotlib.figure  # noqa: F401
+    from matplotlib.backends import backend_agg, backend_svg  # noqa: F401
+
+
+def get_pool():
+    """El pool compartido, o None si CHART_RENDER_WORKERS = 0 (dibujar en el proceso)."""
+    global _pool, _pool_pid
+    if _workers() <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool_pid = os.getpid()
+            # spawn: no se heredan conexiones a la base de datos ni hilos del servidor
+            _pool = ProcessPoolExecutor(
+                max_workers=_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm,
+            )
+        return _pool
+
+
+def warm_up():
+    """Arranca los procesos en segundo plano (en vez de en la primera gráfica)."""
+    pool = get_pool()
+    if pool is not None:
+        for _ in range(_workers()):
+            pool.submit(_warm)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _deliver_late(on_late, index, future):
+    if not future.cancelled() and future.exception() is None:
+        on_late(index, future.result())
+
+
+def render_many(func, calls, timeout=None, on_late=None):
+    """
+    Ejecuta ``func(*args)`` para cada tupla de ``calls`` en el pool, en paralelo,
+    y devuelve los resultados en el mismo orden. ``func`` debe ser una función
+    de módulo (se envía al proceso por referencia).
+
+    Lo que no termine en ``timeout`` segundos queda como None: sigue en el pool
+    (un proceso ocupado no se puede cancelar, y dibujarla también aquí duplicaría
+    el trabajo justo cuando el pool está saturado) y, al terminar, se entrega a
+    ``on_late(índice, resultado)`` si se pasó. Si el pool falla, se dibuja aquí.
+    """
+    calls = list(calls)
+    pool = get_pool()
+    if pool is None:
+        return [func(*args) for args in calls]
+
+    try:
+        futures = [pool.submit(func, *args) for args in calls]
+    except (BrokenProcessPool, RuntimeError) as exc:
+        logger.warning("Pool de gráficas no disponible (%s); se dibuja en el proceso", exc)
+        shutdown()
+        return [func(*args) for args in calls]
+
+    timeout = _timeout() if timeout is None else timeout
+    wait(futures, timeout=timeout)
+    results = []
+    for index, (future, args) in enumerate(zip(futures, calls)):
+        try:
+            results.append(future.result(timeout=0))
+        except FutureTimeout:
+            logger.warning("Gráfica %s tardó más de %ss en el pool; se entrega cuando termine",
+                           func.__name__, timeout)
+            results.append(None)
+            if on_late is not None:
+                future.add_done_callback(partial(_deliver_late, on_late, index))
+        except BrokenProcessPool as exc:
+            logger.warning("Pool de gráficas caído (%s); se reinicia", exc)
+            shutdown()
+            results.append(func(*args))
+    return results
+
+
+def render(func, *args, timeout=None, on_late=None):
+    return render_many(func, [args], timeout=timeout, on_late=on_late)[0]
@@ -0,0 +1,182 @@
+"""
+Motor de reabastecimiento: cálculo local y determinista con numpy.
+
+Se leen el stock y el mínimo de cada producto y, agrupadas en la base de
+datos, las unidades vendidas en la ventana de demanda (suma y suma de
+cuadrados de SalesDaily); después todas las cifras se calculan de una vez sobre
+arreglos numpy, sin bucles por producto:
+
+- demanda diaria = pronóstico de DemandForecast (forecasting.py) o, si el
+  producto no tiene, unidades de la ventana / días de la ventana
+- stock de seguridad = z · desviación diaria · √(plazo del proveedor)
+- punto de reorden = max(min_stock, ⌈demanda · plazo + seguridad⌉)
+- cantidad sugerida = punto de reorden + demanda del periodo de revisión - stock
+- plazo (días) = días que faltan para llegar al punto de reorden
+
+La IA solo redacta el motivo de cada recomendación (ver recommendations.py);
+las cantidades y los plazos salen siempre de aquí.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from inventory.models import Product
+
+from .forecasting import forecast_rates
+from .models import SalesDaily
+
+
+def restock_params():
+    """Parámetros del motor (configurables en settings)."""
+    return {
+        "ventana_dias": getattr(settings, "RESTOCK_DEMAND_DAYS", 30),
+        "plazo_proveedor_dias": getattr(settings, "RESTOCK_LEAD_TIME_DAYS", 7),
+        "revision_dias": getattr(settings, "RESTOCK_REVIEW_DAYS", 14),
+        "nivel_servicio_z": getattr(settings, "RESTOCK_SERVICE_Z", 1.65),
+    }
+
+
+def compute_restock(quantity, min_stock, units, units_sq, window, lead_time, review, z, forecast_rate=None):
+    """
+    Cálculo vectorizado. Recibe arreglos alineados por producto (stock, mínimo,
+    unidades de la ventana y suma de cuadrados de las unidades diarias) y,
+    opcionalmente, la demanda diaria pronosticada (NaN donde no hay
+    pronóstico; ahí se usa el promedio de la ventana). Devuelve un diccionario de arreglos con ``demanda_diaria``,
+    ``dias_cobertura`` (inf sin demanda), ``punto_reorden``, ``reabastecer``,
+    ``cantidad_sugerida`` y ``plazo_dias`` (-1 sin demanda).
+    """
+    quantity = np.asarray(quantity, dtype=np.float64)
+    min_stock = np.asarray(min_stock, dtype=np.float64)
+    units = np.asarray(units, dtype=np.float64)
+    units_sq = np.asarray(units_sq, dtype=np.float64)
+
+    rate = units / window
+    if forecast_rate is not None:
+        forecast_rate = np.asarray(forecast_rate, dtype=np.float64)
+        rate = np.where(np.isnan(forecast_rate), rate, forecast_rate)
+    # Los días sin ventas cuentan como 0: var = E[x²] - E[x]²
+    sigma = np.sqrt(np.maximum(units_sq / window - rate ** 2, 0.0))
+    safety = z * sigma * np.sqrt(lead_time)
+    reorder_point = np.maximum(min_stock, np.ceil(rate * lead_time + safety))
+
+    selling = rate > 0
+    cover = np.divide(quantity, rate, out=np.full_like(quantity, np.inf), where=selling)
+    restock = quantity <= reorder_point
+
+    order_up_to = reorder_point + np.ceil(rate * review)
+    order = np.where(restock, np.maximum(order_up_to - quantity, 0.0), 0.0)
+
+    until_reorder = np.divide(quantity - reorder_point, rate, out=np.full_like(quantity, -1.0), where=selling)
+    lead = np.where(restock, 0.0, np.floor(until_reorder))
+
+    return {
+        "demanda_diaria": rate,
+        "dias_cobertura": cover,
+        "punto_reorden": reorder_point.astype(np.int64),
+        "reabastecer": restock,
+        "cantidad_sugerida": order.astype(np.int64),
+        "plazo_dias": lead.astype(np.int64),
+    }
+
+
+def _load(window):
+    """
+    Productos (ordenados por id) y sus ventas de la ventana, en dos consultas
+    simples: agrupar SalesDaily sin unir con Product es mucho más rápido que
+    anotar cada producto con un LEFT JOIN.
+    """
+    since = timezone.localdate() - timedelta(days=window - 1)  # ``window`` días incluyendo hoy
+    in_window = Q(day__gte=since)
+    products = list(
+        Product.objects
+        .order_by("pk")
+        .values_list("pk", "name", "category", "quantity", "min_stock")
+    )
+    sales = list(
+        SalesDaily.objects
+        .order_by()
+        .values("product_id")
+        .annotate(
+            window_units=Coalesce(Sum("units", filter=in_window), Value(0)),
+            window_units_sq=Coalesce(Sum(F("units") * F("units"), filter=in_window), Value(0)),
+            last_day=Max("day"),
+        )
+        .values_list("product_id", "window_units", "window_units_sq", "last_day")
+    )
+    return products, sales
+
+
+def restock_plan(only_restock=False):
+    """
+    Plan de reabastecimiento de todos los productos (tres consultas), como lista
+    de diccionarios listos para JSON, ordenada por urgencia: primero los que hay
+    que reabastecer, con menos días de cobertura.
+    """
+    params = restock_params()
+    products, sales = _load(params["ventana_dias"])
+    if not products:
+        return []
+    ids, names, categories, quantity, min_stock = zip(*products)
+
+    # Se alinean las ventas con los productos por id (los que no vendieron quedan en 0)
+    pk = np.fromiter(ids, dtype=np.int64, count=len(ids))
+    units = np.zeros(len(ids), dtype=np.int64)
+    units_sq = np.zeros(len(ids), dtype=np.int64)
+    last = [None] * len(ids)
+    if sales:
+        sale_ids, sale_units, sale_sq, sale_last = zip(*sales)
+        sale_ids = np.fromiter(sale_ids, dtype=np.int64, count=len(sale_ids))
+        pos = np.minimum(np.searchsorted(pk, sale_ids), len(pk) - 1)
+        # Las dos consultas no son atómicas: se ignoran ventas de productos que no
+        # estaban en la primera (creados entre ambas)
+        known = pk[pos] == sale_ids
+        pos = pos[known]
+        units[pos] = np.asarray(sale_units, dtype=np.int64)[known]
+        units_sq[pos] = np.asarray(sale_sq, dtype=np.int64)[known]
+        for i, day in zip(pos.tolist(), np.asarray(sale_last, dtype=object)[known]):
+            last[i] = day
+
+    result = compute_restock(
+        quantity, min_stock, units, units_sq,
+        window=params["ventana_dias"],
+        lead_time=params["plazo_proveedor_dias"],
+        review=params["revision_dias"],
+        z=params["nivel_servicio_z"],
+        forecast_rate=forecast_rates(pk),
+    )
+    restock = result["reabastecer"]
+    cover = result["dias_cobertura"]
+    order = np.lexsort((cover, ~restock))
+    if only_restock:
+        order = order[restock[order]]
+
+    rate = np.round(result["demanda_diaria"][order], 2).tolist()
+    cover = [None if np.isinf(c) else c for c in np.round(cover[order], 1).tolist()]
+    plan = []
+    for i, sold, r, c, rp, needs, qty, lead in zip(
+        order.tolist(), units[order].tolist(), rate, cover,
+        result["punto_reorden"][order].tolist(),
+        restock[order].tolist(),
+        result["cantidad_sugerida"][order].tolist(),
+        result["plazo_dias"][order].tolist(),
+    ):
+        plan.append({
+            "producto_id": ids[i],
+            "nombre": names[i],
+            "categoria": categories[i],
+            "stock": quantity[i],
+            "stock_minimo": min_stock[i],
+            "ventas_periodo": sold,
+            "demanda_diaria": r,
+            "dias_cobertura": c,
+            "punto_reorden": rp,
+            "reabastecer": needs,
+            "cantidad_sugerida": qty,
+            "plazo_dias": None if lead < 0 else lead,
+            "ultima_venta": last[i].isoformat() if last[i] else None,
+        })
+    return plan
@@ -0,0 +1,123 @@
+"""
+Tabla resumen SalesDaily: ventas por producto y día.
+
+``record_invoice`` se llama dentro de la transacción de ``register_invoice`` y
+``record_venta`` desde la señal post_save de Venta, así que la tabla crece con
+productos × días y no con las líneas de venta. Las ediciones o borrados de
+ventas hechos por fuera (admin, shell) no se reflejan:
+``manage.py rebuild_sales_rollup`` la reconstruye desde los datos originales.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from invoices.models import DetalleFactura, Venta
+from .models import SalesDaily
+
+CENTS = Decimal("0.01")
+
+
+def _add(product_id, day, units, revenue, invoices):
+    increments = {
+        "units": F("units") + units,
+        "revenue": F("revenue") + revenue,
+        "invoice_count": F("invoice_count") + invoices,
+    }
+    if SalesDaily.objects.filter(product_id=product_id, day=day).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            SalesDaily.objects.create(product_id=product_id, day=day, units=units,
+                                      revenue=revenue, invoice_count=invoices)
+    except IntegrityError:
+        # Otra transacción creó la fila entre el UPDATE y el INSERT
+        SalesDaily.objects.filter(product_id=product_id, day=day).update(**increments)
+
+
+def _add_many(day, increments):
+    """
+    Igual que ``_add`` para varios productos del mismo día en dos sentencias:
+    se crean en cero las filas que falten (ignorando las que ya existen, aunque
+    otra transacción las cree a la vez) y se incrementan todas con un UPDATE.
+    ``increments``: {product_id: (unidades, facturado, facturas)}.
+    """
+    if not increments:
+        return
+    SalesDaily.objects.bulk_create(
+        [SalesDaily(product_id=product_id, day=day) for product_id in increments],
+        ignore_conflicts=True,
+    )
+
+    def per_product(index, output_field):
+        return Case(
+            *[When(product_id=product_id, then=Value(values[index], output_field=output_field))
+              for product_id, values in increments.items()],
+            default=Value(0, output_field=output_field),
+            output_field=output_field,
+        )
+
+    SalesDaily.objects.filter(day=day, product_id__in=list(increments)).update(
+        units=F("units") + per_product(0, IntegerField()),
+        revenue=F("revenue") + per_product(1, DecimalField(max_digits=12, decimal_places=2)),
+        invoice_count=F("invoice_count") + per_product(2, IntegerField()),
+    )
+
+
+def record_invoice(factura):
+    """Suma las líneas de ``factura`` al resumen (una fila por producto)."""
+    day = timezone.localdate(factura.fecha)
+    lines = (DetalleFactura.objects
+             .filter(factura=factura)
+             .values("producto_id")
+             .annotate(units=Sum("cantidad"), revenue=Sum("subtotal")))
+    _add_many(day, {
+        line["producto_id"]: (line["units"], line["revenue"].quantize(CENTS), 1)
+        for line in lines
+    })
+
+
+def record_venta(venta):
+    _add(venta.product_id, timezone.localdate(venta.fecha), venta.cantidad, venta.total or 0, 0)
+
+
+def rebuild(start=None, end=None, batch_size=1000):
+    """
+    Recalcula el resumen (completo o entre las fechas ``start`` y ``end``,
+    incluidas) a partir de DetalleFactura y Venta. Devuelve las filas creadas.
+    """
+    detalles = DetalleFactura.objects.annotate(day=TruncDate("factura__fecha"))
+    ventas = Venta.objects.annotate(day=TruncDate("fecha"))
+    existing = SalesDaily.objects.all()
+    if start:
+        detalles, ventas, existing = (qs.filter(day__gte=start) for qs in (detalles, ventas, existing))
+    if end:
+        detalles, ventas, existing = (qs.filter(day__lte=end) for qs in (detalles, ventas, existing))
+
+    totals = defaultdict(lambda: [0, Decimal(0), 0])
+    for row in (detalles.values("producto_id", "day")
+                .annotate(units=Sum("cantidad"), revenue=Sum("subtotal"),
+                          invoices=Count("factura_id", distinct=True))):
+        entry = totals[row["producto_id"], row["day"]]
+        entry[0] += row["units"]
+        entry[1] += row["revenue"]
+        entry[2] += row["invoices"]
+    zero = Value(Decimal(0), output_field=DecimalField())
+    for row in (ventas.values("product_id", "day")
+                .annotate(units=Sum("cantidad"), revenue=Sum(Coalesce("total", zero)))):
+        entry = totals[row["product_id"], row["day"]]
+        entry[0] += row["units"]
+        entry[1] += row["revenue"]
+
+    with transaction.atomic():
+        existing.delete()
+        SalesDaily.objects.bulk_create(
+            (SalesDaily(product_id=product_id, day=day, units=units,
+                        revenue=revenue.quantize(CENTS), invoice_count=invoices)
+             for (product_id, day), (units, revenue, invoices) in totals.items()),
+            batch_size=batch_size,
+        )
+    return len(totals)
@@ -0,0 +1,65 @@
+"""
+Agregados de ventas por producto para las vistas de analítica.
+
+La suma se hace en la base de datos (una sola consulta agrupada por producto)
+sobre la tabla resumen SalesDaily (ver rollup.py), así que el costo depende de
+productos × días y no de la cantidad de líneas de venta. Los totales se
+mantienen como Decimal.
+"""
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.utils.dateparse import parse_date
+
+from .models import SalesDaily
+
+CENTS = Decimal("0.01")
+
+
+def sales_by_product(start=None, end=None, category=None):
+    """
+    Unidades y facturación por producto (facturas y ventas sueltas).
+
+    ``start`` y ``end`` son fechas (ambas incluidas) y ``category`` el código de
+    categoría del producto. Devuelve una lista de diccionarios con
+    ``producto_id``, ``nombre``, ``unidades`` y ``facturado`` (Decimal),
+    ordenada por nombre.
+    """
+    daily = SalesDaily.objects.all()
+    if start:
+        daily = daily.filter(day__gte=start)
+    if end:
+        daily = daily.filter(day__lte=end)
+    if category:
+        daily = daily.filter(product__category=category)
+
+    rows = (daily
+            .values("product_id", "product__name")
+            .annotate(unidades=Sum("units"), facturado=Sum("revenue"))
+            .order_by("product__name"))
+    return [
+        {
+            "producto_id": row["product_id"],
+            "nombre": row["product__name"],
+            "unidades": row["unidades"],
+            # SQLite suma los DECIMAL como REAL: se vuelve a redondear al centavo
+            "facturado": row["facturado"].quantize(CENTS),
+        }
+        for row in rows
+    ]
+
+
+def _parse_date(value):
+    try:
+        return parse_date((value or "").strip())
+    except ValueError:  # formato correcto pero fecha inexistente (2024-02-30)
+        return None
+
+
+def sales_filters(params):
+    """Lee ``desde``, ``hasta`` y ``category`` del GET como kwargs de ``sales_by_product``."""
+    return {
+        "start": _parse_date(params.get("desde")),
+        "end": _parse_date(params.get("hasta")),
+        "category": (params.get("category") or "").strip() or None,
+    }
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from invoices.models import Venta
+from .rollup import record_venta
+
+
+@receiver(post_save, sender=Venta)
+def acumular_venta(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_venta(instance)
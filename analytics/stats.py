@@ -0,0 +1,88 @@
+"""
+Estadísticas de ventas por producto para los análisis con IA.
+
+``product_sales_stats(30, 60, ...)`` devuelve todos los productos anotados con
+las unidades vendidas en cada ventana de días y la fecha de la última venta,
+en una sola consulta (en lugar de varias consultas por producto).
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import DateTimeField, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from inventory.models import Product
+from invoices.models import DetalleFactura, Venta
+
+ROLLUP = "rollup"
+RAW = "raw"
+
+
+def window_field(days):
+    """Nombre de la anotación con las ventas de los últimos ``days`` días."""
+    return f"ventas_{days}d"
+
+
+def _sum_subquery(queryset, product_field, amount):
+    total = (queryset
+             .filter(**{product_field: OuterRef("pk")})
+             .order_by()
+             .values(product_field)
+             .annotate(total=Sum(amount))
+             .values("total"))
+    return Coalesce(Subquery(total, output_field=IntegerField()), Value(0))
+
+
+def _max_subquery(queryset, product_field, date_field):
+    last = (queryset
+            .filter(**{product_field: OuterRef("pk")})
+            .order_by()
+            .values(product_field)
+            .annotate(last=Max(date_field))
+            .values("last"))
+    return Subquery(last, output_field=DateTimeField())
+
+
+def product_sales_stats(*windows, source=ROLLUP, queryset=None):
+    """
+    Productos de ``queryset`` (por defecto todos, solo con los campos que usan
+    los análisis: el GROUP BY incluye cada columna) anotados con ``ventas_<n>d``
+    para cada ventana ``n`` y con ``ultima_venta`` (fecha o None).
+
+    Con ``source="rollup"`` se agrega la tabla SalesDaily (facturas y Venta ya
+    sumadas por día). Con ``source="raw"`` se calculan con subconsultas sobre
+    Venta y DetalleFactura, por ejemplo para comprobar el resumen.
+    """
+    if queryset is None:
+        queryset = Product.objects.only("name", "category", "quantity", "price")
+    today = timezone.localdate()
+    annotations = {}
+
+    if source == ROLLUP:
+        for days in windows:
+            since = today - timedelta(days=days)
+            annotations[window_field(days)] = Coalesce(
+                Sum("sales_daily__units", filter=Q(sales_daily__day__gte=since)), Value(0)
+            )
+        annotations["ultima_venta"] = Max("sales_daily__day")
+        return queryset.annotate(**annotations).order_by("name")
+
+    if source != RAW:
+        raise ValueError(f"source debe ser {ROLLUP!r} o {RAW!r}")
+
+    for days in windows:
+        # Mismo corte que el resumen: desde la medianoche local de hace ``days`` días
+        since = timezone.make_aware(datetime.combine(today - timedelta(days=days), time.min))
+        annotations[window_field(days)] = (
+            _sum_subquery(Venta.objects.filter(fecha__gte=since), "product", "cantidad")
+            + _sum_subquery(DetalleFactura.objects.filter(factura__fecha__gte=since), "producto", "cantidad")
+        )
+    annotations["_ultima_venta"] = _max_subquery(Venta.objects.all(), "product", "fecha")
+    annotations["_ultima_factura"] = _max_subquery(DetalleFactura.objects.all(), "producto", "factura__fecha")
+
+    products = list(queryset.annotate(**annotations).order_by("name"))
+    for product in products:
+        # GREATEST() devuelve NULL en SQLite si alguno es NULL: se combina aquí
+        dates = [d for d in (product._ultima_venta, product._ultima_factura) if d]
+        product.ultima_venta = timezone.localdate(max(dates)) if dates else None
+    return products
@@ -0,0 +1,48 @@
+"""
+Respuestas Server-Sent Events para los análisis con IA.
+
+Las páginas se muestran de inmediato y abren un EventSource hacia la vista
+``*_stream`` correspondiente, que reenvía los fragmentos de ``llm.astream``.
+Cada evento lleva ``{"text": ...}``; al final se envía ``event: done`` o
+``event: error``. Conviene servir estas vistas con kontago/asgi.py: así la
+espera de OpenAI no ocupa un worker síncrono.
+"""
+import json
+import logging
+
+from django.http import StreamingHttpResponse
+from openai import OpenAIError
+
+logger = logging.getLogger(__name__)
+
+
+def _event(data, event=None):
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _events(chunks):
+    try:
+        async for text in chunks:
+            yield _event({"text": text})
+    except TimeoutError:
+        logger.warning("La respuesta de OpenAI superó el tiempo máximo")
+        yield _event({"message": "La IA tardó demasiado en responder. Intenta de nuevo."}, "error")
+        return
+    except OpenAIError as exc:
+        logger.warning("Error de OpenAI en streaming: %s", exc)
+        yield _event({"message": "No se pudo obtener la respuesta de la IA."}, "error")
+        return
+    yield _event({}, "done")
+
+
+async def static_text(text):
+    yield text
+
+
+def sse_response(chunks):
+    """StreamingHttpResponse text/event-stream a partir de un iterable asíncrono de textos."""
+    response = StreamingHttpResponse(_events(chunks), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: no acumular la respuesta
+    return response
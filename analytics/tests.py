@@ -1,3 +1,456 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from inventory import llm
+from inventory.models import LLMCacheEntry, Product
+from invoices.models import DetalleFactura, Factura, Venta
+
+from . import charts, recommendations, render_pool, restock, rollup
+from .forecasting import expected_units, fit, refresh_forecasts
+from .models import DemandForecast, Recommendation, SalesDaily
+from .sales import sales_by_product
+from .stats import RAW, ROLLUP, product_sales_stats
+from .views import _selling_request
+
+
+class SalesByProductTests(TestCase):
+    def setUp(self):
+        self.a = Product.objects.create(name="A", category="utiles", price=Decimal("0.10"), quantity=10)
+        self.b = Product.objects.create(name="B", category="limpieza", price=Decimal("0.20"), quantity=10)
+        self.factura = Factura.objects.create(codigo="F1")
+        for product, cantidad in [(self.a, 1), (self.b, 1), (self.a, 2)]:
+            DetalleFactura.objects.create(factura=self.factura, producto=product, cantidad=cantidad,
+                                          precio_unitario=product.price, subtotal=product.price * cantidad)
+        rollup.rebuild()
+
+    def test_single_grouped_query(self):
+        with self.assertNumQueries(1):
+            rows = sales_by_product()
+        self.assertEqual([(r["nombre"], r["unidades"], r["facturado"]) for r in rows],
+                         [("A", 3, Decimal("0.30")), ("B", 1, Decimal("0.20"))])
+
+    def test_filters(self):
+        day = self.factura.fecha.date()
+        self.assertEqual(len(sales_by_product(category="utiles")), 1)
+        self.assertEqual(sales_by_product(start=day), sales_by_product())
+        self.assertEqual(sales_by_product(end=day - timedelta(days=1)), [])
+
+    def test_selling_prompt_uses_the_totals(self):
+        prompt = _selling_request({})["messages"][0]["content"]
+        self.assertIn("{'A': 3, 'B': 1}", prompt)
+        self.assertIn("{'A': '0.30', 'B': '0.20'}", prompt)
+
+    def test_graphics_page_ignores_invalid_dates(self):
+        response = self.client.get("/analytics/graphics/?desde=2020-01-01&hasta=2020-02-30&category=utiles")
+        self.assertContains(response, "/analytics/charts/unidades.png")
+        self.assertContains(response, 'value="2020-01-01"')
+
+
+class SalesRollupTests(TestCase):
+    def rows(self):
+        return list(SalesDaily.objects.order_by("product_id", "day")
+                    .values("product_id", "units", "revenue", "invoice_count"))
+
+    def test_incremental_updates_match_a_rebuild(self):
+        a = Product.objects.create(name="A", category="utiles", price=Decimal("0.10"), quantity=10)
+        b = Product.objects.create(name="B", category="limpieza", price=Decimal("2.50"), quantity=10)
+        cart = [{"product_id": a.id, "quantity": 2}, {"product_id": b.id, "quantity": 1},
+                {"product_id": a.id, "quantity": 1}]
+        self.client.post("/invoices/nueva/", {"cliente": "x", "cart_data": json.dumps(cart)})
+        self.client.post("/invoices/nueva/", {"cliente": "y",
+                                              "cart_data": json.dumps([{"product_id": a.id, "quantity": 1}])})
+        Venta.objects.create(product=b, cantidad=2)
+
+        incremental = self.rows()
+        self.assertEqual(incremental, [
+            {"product_id": a.id, "units": 4, "revenue": Decimal("0.40"), "invoice_count": 2},
+            {"product_id": b.id, "units": 3, "revenue": Decimal("7.50"), "invoice_count": 1},
+        ])
+        call_command("rebuild_sales_rollup", stdout=StringIO())
+        self.assertEqual(self.rows(), incremental)
+
+
+class ProductSalesStatsTests(TestCase):
+    def setUp(self):
+        self.products = [Product.objects.create(name=f"P{i}", category="utiles", price=1, quantity=i)
+                         for i in range(5)]
+        now = timezone.now()
+        for i, age in [(0, 1), (0, 40), (1, 70), (2, 5)]:
+            factura = Factura.objects.create(codigo=f"F{i}{age}")
+            Factura.objects.filter(pk=factura.pk).update(fecha=now - timedelta(days=age))
+            DetalleFactura.objects.create(factura=factura, producto=self.products[i], cantidad=age,
+                                          precio_unitario=1, subtotal=age)
+        venta = Venta.objects.create(product=self.products[3], cantidad=7)
+        Venta.objects.filter(pk=venta.pk).update(fecha=now - timedelta(days=50))
+        rollup.rebuild()
+
+    def stats(self, source):
+        with self.assertNumQueries(1):
+            return [(p.name, p.ventas_30d, p.ventas_60d, p.ultima_venta is not None)
+                    for p in product_sales_stats(30, 60, source=source)]
+
+    def test_rollup_and_raw_agree(self):
+        expected = [("P0", 1, 41, True), ("P1", 0, 0, True), ("P2", 5, 5, True),
+                    ("P3", 0, 7, True), ("P4", 0, 0, False)]
+        self.assertEqual(self.stats(ROLLUP), expected)
+        self.assertEqual(self.stats(RAW), expected)
+
+    def test_check_reports_drift(self):
+        out = StringIO()
+        call_command("rebuild_sales_rollup", "--check", stdout=out)
+        self.assertIn("coincide", out.getvalue())
+
+        SalesDaily.objects.filter(product=self.products[0]).delete()
+        out = StringIO()
+        call_command("rebuild_sales_rollup", "--check", stdout=out)
+        self.assertIn("1 productos no coinciden", out.getvalue())
+
+
+@override_settings(CHART_RENDER_WORKERS=0)
+class ChartEndpointTests(TestCase):
+    def add_sale(self):
+        product = Product.objects.create(name="A", category="utiles", price=Decimal("1.5"), quantity=10)
+        factura = Factura.objects.create(codigo="F1")
+        DetalleFactura.objects.create(factura=factura, producto=product, cantidad=2, precio_unitario=product.price,
+                                      subtotal=3)
+        rollup.record_invoice(factura)
+
+    def test_without_sales(self):
+        self.assertContains(self.client.get("/analytics/graphics/"), "No hay datos")
+        self.assertEqual(self.client.get("/analytics/charts/unidades.png").status_code, 404)
+
+    def test_page_links_the_filtered_images(self):
+        self.add_sale()
+        response = self.client.get("/analytics/graphics/?category=utiles")
+        self.assertContains(response, "/analytics/charts/unidades.png?category=utiles")
+
+    def test_images_are_cached_and_revalidated(self):
+        self.add_sale()
+        with mock.patch("analytics.charts.render_chart", wraps=charts.render_chart) as render:
+            png = self.client.get("/analytics/charts/unidades.png")
+            self.assertEqual(png["Content-Type"], "image/png")
+            self.assertTrue(png.content.startswith(b"\x89PNG"))
+            self.assertEqual(png["Cache-Control"], "private, max-age=60")
+            self.assertIn("Last-Modified", png)
+
+            self.assertEqual(self.client.get("/analytics/charts/unidades.png").content, png.content)
+            not_modified = self.client.get("/analytics/charts/unidades.png", HTTP_IF_NONE_MATCH=png["ETag"])
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(render.call_count, 1)
+
+            svg = self.client.get("/analytics/charts/facturacion.svg")
+            self.assertEqual(svg["Content-Type"], "image/svg+xml")
+            self.assertIn(b"<svg", svg.content)
+
+    def test_unknown_charts_and_formats(self):
+        self.add_sale()
+        self.assertEqual(self.client.get("/analytics/charts/x.png").status_code, 404)
+        self.assertEqual(self.client.get("/analytics/charts/unidades.gif").status_code, 404)
+
+    def test_chart_still_rendering_gets_a_placeholder(self):
+        self.add_sale()
+        with mock.patch("analytics.views.get_chart", return_value=None):
+            response = self.client.get("/analytics/charts/unidades.png")
+        self.assertEqual((response.status_code, response["Content-Type"]), (503, "image/svg+xml"))
+        self.assertEqual((response["Retry-After"], response["Cache-Control"]), ("5", "no-store"))
+
+
+CHART_SPECS = [
+    ("unidades", "png", [f"P{i}" for i in range(40)], list(range(40))),
+    ("facturacion", "svg", ["A", "B"], [Decimal("1.5"), Decimal("2")]),
+]
+
+
+class RenderPoolTests(TestCase):
+    def tearDown(self):
+        render_pool.shutdown()
+
+    def test_pool_renders_like_the_process(self):
+        rendered = render_pool.render_many(charts.render_chart, CHART_SPECS)
+        self.assertEqual(rendered[0][:8], b"\x89PNG\r\n\x1a\n")
+        self.assertIn(b"<svg", rendered[1])
+        self.assertEqual(len(charts.get_charts(CHART_SPECS)), 2)
+
+    def test_late_results_are_delivered_not_rendered_twice(self):
+        late = {}
+        done = threading.Event()
+
+        def on_late(index, image):
+            late[index] = image
+            if len(late) == 2:
+                done.set()
+
+        with self.assertLogs("analytics.render_pool", "WARNING"):
+            rendered = render_pool.render_many(charts.render_chart, CHART_SPECS, timeout=0, on_late=on_late)
+        self.assertEqual(rendered, [None, None])  # nada se dibujó en el proceso
+        self.assertTrue(done.wait(60))
+        self.assertEqual(late[0][:8], b"\x89PNG\r\n\x1a\n")
+        self.assertIn(b"<svg", late[1])
+
+    @override_settings(CHART_RENDER_WORKERS=0)
+    def test_pool_can_be_disabled(self):
+        self.assertIsNone(render_pool.get_pool())
+
+
+class FakeStream:
+    """Imita el stream asíncrono de chat.completions.create(stream=True)."""
+
+    def __init__(self, parts, delay=0):
+        self.parts = parts
+        self.delay = delay
+        self.closed = False
+
+    async def __aiter__(self):
+        for part in self.parts:
+            await asyncio.sleep(self.delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+
+    async def close(self):
+        self.closed = True
+
+
+def fake_async_client(stream):
+    async def create(**kwargs):
+        assert kwargs["stream"] is True
+        return stream
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+class SellingStreamTests(TransactionTestCase):
+    async def get_stream(self):
+        response = await self.async_client.get("/analytics/sellingsugg/stream/")
+        return response, "".join([chunk.decode() async for chunk in response.streaming_content])
+
+    async def test_streams_and_caches_the_answer(self):
+        product = await Product.objects.acreate(name="X", category="alimentos", price=1, quantity=1)
+        await SalesDaily.objects.acreate(product=product, day=timezone.localdate(), units=2, revenue=2)
+        stream = FakeStream(["# Hola", "\n- uno"])
+        with mock.patch.object(llm, "get_async_client", return_value=fake_async_client(stream)):
+            response, body = await self.get_stream()
+        self.assertEqual((response["Content-Type"], response["Cache-Control"]), ("text/event-stream", "no-cache"))
+        self.assertEqual(body, 'data: {"text": "# Hola"}\n\ndata: {"text": "\\n- uno"}\n\nevent: done\ndata: {}\n\n')
+        self.assertTrue(stream.closed)
+        self.assertEqual(await LLMCacheEntry.objects.acount(), 1)
+
+        with mock.patch.object(llm, "get_async_client", side_effect=AssertionError):
+            _, cached = await self.get_stream()
+        self.assertEqual(cached, 'data: {"text": "# Hola\\n- uno"}\n\nevent: done\ndata: {}\n\n')
+
+    async def test_without_sales(self):
+        _, body = await self.get_stream()
+        self.assertIn("No hay datos suficientes", body)
+
+    async def test_page_opens_the_stream(self):
+        response = await self.async_client.get("/analytics/sellingsugg/?desde=2020-01-01")
+        self.assertContains(response, "EventSource")
+        self.assertContains(response, "/analytics/sellingsugg/stream/?desde\\u003D2020")
+
+
+class AsyncStreamTests(TransactionTestCase):
+    def test_timeout_closes_the_stream(self):
+        stream = FakeStream(["a", "b", "c"], delay=0.2)
+
+        async def consume():
+            received = []
+            with self.assertRaises(TimeoutError):
+                async for text in llm.astream([{"role": "user", "content": "x"}], use_cache=False, timeout=0.3):
+                    received.append(text)
+            return received
+
+        with mock.patch.object(llm, "get_async_client", return_value=fake_async_client(stream)):
+            self.assertEqual(asyncio.run(consume()), ["a"])
+        self.assertTrue(stream.closed)
+
+    def test_disconnect_closes_the_stream_without_caching(self):
+        stream = FakeStream(["a", "b", "c"])
+
+        async def first_chunk():
+            gen = llm.astream([{"role": "user", "content": "y"}])
+            text = await anext(gen)
+            await gen.aclose()
+            return text
+
+        with mock.patch.object(llm, "get_async_client", return_value=fake_async_client(stream)):
+            self.assertEqual(asyncio.run(first_chunk()), "a")
+        self.assertTrue(stream.closed)
+        self.assertEqual(LLMCacheEntry.objects.count(), 0)
+
+
+class RestockPlanTests(TestCase):
+    def setUp(self):
+        today = timezone.localdate()
+        self.a = Product.objects.create(name="A", category="alimentos", price=1, quantity=10, min_stock=5)
+        self.b = Product.objects.create(name="B", category="alimentos", price=1, quantity=100, min_stock=5)
+        self.c = Product.objects.create(name="C", category="alimentos", price=1, quantity=3, min_stock=5)
+        for d in range(30):
+            day = today - timedelta(days=d)
+            SalesDaily.objects.create(product=self.a, day=day, units=2, revenue=2)
+            SalesDaily.objects.create(product=self.b, day=day, units=1 if d % 2 else 3, revenue=2)
+        SalesDaily.objects.create(product=self.a, day=today - timedelta(days=40), units=100, revenue=2)
+
+    def plan(self, **kwargs):
+        return {p["nombre"]: p for p in restock.restock_plan(**kwargs)}
+
+    def test_plan(self):
+        with self.assertNumQueries(3):
+            plan = self.plan()
+        a = plan["A"]
+        self.assertEqual((a["demanda_diaria"], a["punto_reorden"]), (2.0, 14))  # demanda constante: sin seguridad
+        self.assertTrue(a["reabastecer"])
+        self.assertEqual(a["cantidad_sugerida"], 14 + 28 - 10)
+        self.assertEqual((plan["C"]["cantidad_sugerida"], plan["C"]["dias_cobertura"], plan["C"]["plazo_dias"]),
+                         (2, None, 0))
+        self.assertFalse(plan["B"]["reabastecer"])
+        self.assertEqual([p["nombre"] for p in restock.restock_plan(only_restock=True)], ["A", "C"])
+
+    def test_ignores_sales_of_products_missing_from_the_first_query(self):
+        products, sales = restock._load(30)
+        # Un producto creado (y vendido) entre las dos consultas, con id intermedio y mayor a todos
+        sales = sorted(sales + [(self.b.pk + 1000, 50, 2500, timezone.localdate()), (0, 7, 49, None)])
+        with mock.patch.object(restock, "_load", return_value=(products, sales)):
+            plan = self.plan()
+        self.assertEqual(sorted(plan), ["A", "B", "C"])
+        self.assertEqual(plan["A"]["ventas_periodo"], 60)
+        self.assertEqual(plan["C"]["ventas_periodo"], 0)
+
+    def test_json_endpoint(self):
+        response = self.client.get("/analytics/restock-recommendations/data.json?solo=reabastecer")
+        self.assertEqual(len(response.json()["productos"]), 2)
+
+
+class ForecastingTests(TestCase):
+    def test_fit_picks_the_trend_only_when_there_is_one(self):
+        t = np.arange(90)
+        matrix = np.stack([np.full(90, 5.0), 1 + 0.2 * t, np.zeros(90)])
+        result = fit(matrix)
+        self.assertAlmostEqual(result["level"][0], 5.0)
+        self.assertEqual(result["beta"][0], 0)
+        self.assertGreater(result["beta"][1], 0)
+        self.assertAlmostEqual(result["trend"][1], 0.2, places=2)
+        np.testing.assert_allclose(expected_units(result["level"], result["trend"], 30)[[0, 2]], [150, 0])
+
+    def test_refresh_covers_every_product(self):
+        today = timezone.localdate()
+        a = Product.objects.create(name="A", category="alimentos", price=1, quantity=10)
+        b = Product.objects.create(name="B", category="alimentos", price=1, quantity=10)
+        for d in range(60):
+            SalesDaily.objects.create(product=a, day=today - timedelta(days=d), units=4, revenue=1)
+
+        out = StringIO()
+        call_command("refresh_forecasts", stdout=out)
+        self.assertIn("2 productos", out.getvalue())
+        self.assertAlmostEqual(DemandForecast.objects.get(product=a).units_30d, 120, delta=1)
+        self.assertEqual(DemandForecast.objects.get(product=b).units_30d, 0)
+
+        refresh_forecasts()
+        self.assertEqual(DemandForecast.objects.count(), 2)
+        self.assertEqual(restock.restock_plan()[0]["demanda_diaria"], 4.0)
+
+
+class FakeRecommender:
+    """Reemplaza llm.chat: responde el JSON que pide cada prompt de recommendations.py."""
+
+    def __init__(self, fail=(), bad=(), max_items=None):
+        self.fail = fail  # grupos cuyo primer producto lanza un error
+        self.bad = bad  # productos con una acción no válida
+        self.max_items = max_items  # más productos que esto se "cortan" por max_tokens
+        self.calls = []
+
+    def __call__(self, messages, **kwargs):
+        assert kwargs["response_format"] == {"type": "json_object"}
+        assert kwargs["use_cache"] is False and kwargs["allow_truncated"] is False
+        content = messages[-1]["content"]
+        rows = json.loads(content[content.index("Productos:") + len("Productos:"):])
+        names = [row["nombre"] for row in rows]
+        self.calls.append((names, kwargs["max_tokens"]))
+        if names[0] in self.fail:
+            raise RuntimeError("boom")
+        if self.max_items and len(names) > self.max_items:
+            raise llm.ResponseTruncated("cortada")
+        if "reabastecerse" in content:
+            items = [{"producto": n, "accion": "Reabastecer", "cantidad": 999, "plazo_dias": 1, "motivo": f"vende {n}"}
+                     for n in names]
+        else:
+            items = [{"producto": n, "estado": "Obsoleto" if row["ventas_ult_60d"] == 0 else "Normal",
+                      "accion": "Remate" if row["ventas_ult_60d"] == 0 else "Mantener", "motivo": "m"}
+                     for n, row in zip(names, rows)]
+        items = [{**item, "accion": "Quemar"} if item["producto"] in self.bad else item for item in items]
+        items.append({"producto": "Inventado", "accion": "Mantener"})
+        return json.dumps({"recomendaciones": items})
+
+    def names(self):
+        return [names for names, _ in self.calls]
+
+
+@override_settings(LLM_FANOUT_CHUNK_SIZE=3, LLM_FANOUT_CONCURRENCY=2)
+class RecommendationTests(TestCase):
+    def setUp(self):
+        today = timezone.localdate()
+        self.products = [Product.objects.create(name=f"P{i}", category="alimentos", price=1,
+                                                quantity=2 if i < 5 else 500) for i in range(8)]
+        for product in self.products[::2]:
+            SalesDaily.objects.create(product=product, day=today, units=3, revenue=3)
+
+    def refresh(self, kind, fake):
+        with mock.patch.object(llm, "chat", fake):
+            return recommendations.refresh(kind)
+
+    def test_refresh_validates_and_only_asks_for_changes(self):
+        out = StringIO()
+        with mock.patch.object(llm, "chat", FakeRecommender(bad={"P3"})):
+            call_command("refresh_recommendations", stdout=out)
+        self.assertIn("P3: acción no válida", out.getvalue())
+        self.assertIn("Inventado: producto que no estaba en la consulta", out.getvalue())
+        restock_recs = list(recommendations.latest(Recommendation.RESTOCK))
+        self.assertTrue(restock_recs)
+        self.assertTrue(all(r.quantity != 999 for r in restock_recs))  # las cifras son del motor local
+        self.assertEqual(Recommendation.objects.filter(kind=Recommendation.SLOW).count(), 7)
+
+        fake = FakeRecommender()
+        self.refresh(Recommendation.SLOW, fake)
+        self.refresh(Recommendation.RESTOCK, fake)
+        self.assertEqual(fake.names(), [["P3"], ["P3"]])  # solo el que no fue válido
+
+        Product.objects.filter(pk=self.products[7].pk).update(quantity=1)
+        self.refresh(Recommendation.RESTOCK, fake)
+        self.assertEqual(fake.names()[-1], ["P7"])
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/analytics/restock-recommendations/")
+        self.assertContains(response, "Última actualización")
+        self.assertContains(response, "vende P7")
+        with self.assertNumQueries(1):
+            response = self.client.get("/analytics/slow-inventory-alerts/")
+        self.assertContains(response, "Remate")
+        self.assertNotContains(response, ">Normal<")
+
+    def test_max_tokens_grow_with_the_group(self):
+        fake = FakeRecommender()
+        self.refresh(Recommendation.SLOW, fake)
+        tokens_per_item = recommendations.KINDS[Recommendation.SLOW][3]
+        self.assertEqual([(len(names), tokens) for names, tokens in fake.calls],
+                         [(n, recommendations.RESPONSE_BASE_TOKENS + n * tokens_per_item) for n in (3, 3, 2)])
+
+    def test_truncated_groups_are_split(self):
+        fake = FakeRecommender(max_items=1)
+        result = self.refresh(Recommendation.SLOW, fake)
+        self.assertEqual((result.generated, result.failed), (8, []))
+        self.assertEqual(sorted(len(names) for names in fake.names()), [1] * 8 + [2] * 3 + [3] * 2)
+
+    def test_failed_groups_are_reported(self):
+        result = self.refresh(Recommendation.SLOW, FakeRecommender(fail={"P0"}))
+        self.assertEqual((len(result.failed), result.generated), (1, 5))
+        result = self.refresh(Recommendation.SLOW, lambda *args, **kwargs: "no json")
+        self.assertEqual(len(result.failed), 1)  # solo quedaban P0 … P2
+        self.assertContains(self.client.get("/analytics/restock-recommendations/"), "refresh_recommendations")
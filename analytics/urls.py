@@ -3,7 +3,10 @@ from . import views
 
 urlpatterns = [
     path('graphics/', views.graphics, name='graphics'),
+    path('charts/<slug:name>.<slug:fmt>', views.chart, name='chart'),
     path('sellingsugg/', views.selling, name='selling_suggestions'),
+    path('sellingsugg/stream/', views.selling_stream, name='selling_stream'),
     path('restock-recommendations/', views.restock_recommendations, name='restock_recommendations'),
+    path('restock-recommendations/data.json', views.restock_data, name='restock_data'),
     path('slow-inventory-alerts/', views.slow_inventory_alerts, name='slow_inventory_alerts'),
 ]
@@ -1,100 +1,94 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
+from django.urls import reverse
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils import timezone
+from django.utils.http import http_date
 from inventory.models import Product
-from invoices.models import Venta, DetalleFactura
 
-import matplotlib.pyplot as plt
-import matplotlib
-import io
-import urllib, base64
-import os
-from openai import OpenAI
-from dotenv import load_dotenv
-import markdown
-from django.db.models import Sum
-from datetime import datetime, timedelta
-from django.db.models import Max
+from inventory.llm import astream
+from .charts import CHARTS, FORMATS, chart_fingerprint, chart_series, get_chart, get_charts
+from .models import Recommendation
+from .recommendations import latest
+from .restock import restock_params, restock_plan
+from .sales import sales_by_product, sales_filters
+from .streaming import sse_response, static_text
 
+CHART_MAX_AGE = 60  # segundos que el navegador usa la imagen sin revalidar
+CHART_RETRY_AFTER = 5  # segundos; la gráfica sigue dibujándose en el pool
+CHART_PENDING_SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="800" height="500" viewBox="0 0 800 500">
+<rect width="800" height="500" fill="#fffaf3"/>
+<text x="400" y="250" text-anchor="middle" font-family="Arial, sans-serif" font-size="24" fill="#6d4c41">Generando gráfica… recarga en unos segundos</text>
+</svg>"""
 
-matplotlib.use('Agg')
-_ = load_dotenv('openAI.env')
-client = OpenAI(api_key=os.environ.get('openAI_api_key'))
 
-def graphics(request):
-    """Genera gráficas de analítica de ventas basadas en las facturas."""
-    
-    # --- Recolección de datos de ventas ---
-    detalles = DetalleFactura.objects.select_related('producto').all()
-    
-    ventas_por_producto = {}
-    facturacion_por_producto = {}
-
-    for detalle in detalles:
-        nombre = detalle.producto.name
-        ventas_por_producto[nombre] = ventas_por_producto.get(nombre, 0) + detalle.cantidad
-        facturacion_por_producto[nombre] = facturacion_por_producto.get(nombre, 0) + float(detalle.subtotal)
+def _with_query(url, request):
+    query = request.GET.urlencode()
+    return f"{url}?{query}" if query else url
 
-    if not ventas_por_producto:
-        return render(request, 'graphics.html', {
-            'graphic': None,
-            'graphic2': None,
-            'message': "No hay datos de ventas para mostrar."
-        })
-
-    # --- Gráfico 1: Cantidades vendidas ---
-    plt.figure(figsize=(8, 5))
-    posiciones = range(len(ventas_por_producto))
-    plt.bar(posiciones, ventas_por_producto.values(), width=0.5, color="#a97155")
-    plt.title('Cantidad vendida por producto')
-    plt.xlabel('Producto')
-    plt.ylabel('Unidades vendidas')
-    plt.xticks(posiciones, ventas_por_producto.keys(), rotation=90)
-    plt.tight_layout()
-
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png')
-    buffer.seek(0)
-    plt.close()
-    graphic = base64.b64encode(buffer.getvalue()).decode('utf-8')
-
-    # --- Gráfico 2: Facturación total ---
-    plt.figure(figsize=(8, 5))
-    posiciones = range(len(facturacion_por_producto))
-    plt.bar(posiciones, facturacion_por_producto.values(), width=0.5, color="#6d4c41")
-    plt.title('Facturación total por producto')
-    plt.xlabel('Producto')
-    plt.ylabel('Total facturado ($)')
-    plt.xticks(posiciones, facturacion_por_producto.keys(), rotation=90)
-    plt.tight_layout()
-
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png')
-    buffer.seek(0)
-    plt.close()
-    graphic2 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+def graphics(request):
+    """Página de analítica de ventas; las gráficas se cargan desde ``chart``."""
+    filtros = sales_filters(request.GET)
+    ventas = sales_by_product(**filtros)
+    if ventas:
+        # Las gráficas del tablero que falten se dibujan en paralelo ahora, así
+        # las <img> salen de la caché
+        get_charts([(name, 'png', *chart_series(name, ventas)) for name in CHARTS])
 
     return render(request, 'graphics.html', {
-        'graphic': graphic,
-        'graphic2': graphic2,
-        'message': None
+        'message': None if ventas else "No hay datos de ventas para mostrar.",
+        'filtros': filtros,
+        'categorias': Product.CATEGORY_CHOICES,
     })
 
-def selling(request):
-    """Genera sugerencias de venta usando OpenAI según el desempeño de los productos."""
-
-    detalles = DetalleFactura.objects.select_related('producto').all()
-
-    ventas_por_producto = {}
-    facturacion_por_producto = {}
 
-    for detalle in detalles:
-        nombre = detalle.producto.name
-        ventas_por_producto[nombre] = ventas_por_producto.get(nombre, 0) + detalle.cantidad
-        facturacion_por_producto[nombre] = facturacion_por_producto.get(nombre, 0) + float(detalle.subtotal)
+def chart(request, name, fmt):
+    """
+    Imagen PNG/SVG de una gráfica de ventas. El ETag es la huella de los datos:
+    si el navegador ya la tiene responde 304, y si no, sale de la caché del
+    servidor; matplotlib solo se usa cuando cambian las ventas.
+    """
+    if name not in CHARTS or fmt not in FORMATS:
+        raise Http404("Gráfica no encontrada")
+    labels, values = chart_series(name, sales_by_product(**sales_filters(request.GET)))
+    if not labels:
+        raise Http404("No hay datos de ventas para mostrar.")
+
+    fingerprint = chart_fingerprint(name, fmt, labels, values)
+    etag = f'"{fingerprint}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified["ETag"] = etag
+        return not_modified
+
+    entry = get_chart(name, fmt, labels, values)
+    if entry is None:
+        # El pool está saturado: una imagen provisional en vez de dibujarla otra vez aquí
+        response = HttpResponse(CHART_PENDING_SVG, content_type=FORMATS["svg"], status=503)
+        response["Retry-After"] = CHART_RETRY_AFTER
+        patch_cache_control(response, no_store=True)
+        return response
+
+    content, rendered_at = entry
+    response = HttpResponse(content, content_type=FORMATS[fmt])
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(rendered_at.timestamp())
+    patch_cache_control(response, private=True, max_age=CHART_MAX_AGE)
+    return response
+
+
+def _selling_request(params):
+    """Argumentos de la consulta a OpenAI para ``selling`` (None si no hay ventas)."""
+    ventas = sales_by_product(**sales_filters(params))
+
+    ventas_por_producto = {v["nombre"]: v["unidades"] for v in ventas}
+    # str(): en el prompt se ve "1250.00" en lugar de Decimal('1250.00')
+    facturacion_por_producto = {v["nombre"]: str(v["facturado"]) for v in ventas}
 
     if not ventas_por_producto:
-        return render(request, 'selling.html', {
-            'suggestions': "<p>No hay datos suficientes para generar sugerencias.</p>"
-        })
+        return None
 
     # Determinar productos clave
     mas_vendido = max(ventas_por_producto, key=ventas_por_producto.get)
@@ -121,166 +115,55 @@ def selling(request):
     Devuelve un texto en formato claro y estructurado (usa títulos y listas) con estrategias concretas.
     """
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3,
-        max_tokens=900,
-    )
+    return {
+        "messages": [{"role": "user", "content": prompt}],
+        "model": "gpt-4o-mini",
+        "temperature": 0.3,
+        "max_tokens": 900,
+    }
 
-    suggestions_md = response.choices[0].message.content
-    suggestions_html = markdown.markdown(suggestions_md)
 
-    return render(request, 'selling.html', {'suggestions': suggestions_html})
+# Las sugerencias de venta se muestran al instante; el texto de la IA llega por
+# SSE desde selling_stream (ver streaming.py y el template llm_stream.html)
 
-def restock_recommendations(request):
-    """FR-15: Recomendaciones de reabastecimiento con IA (usa Venta + DetalleFactura)"""
-    hoy = datetime.now()
-    hace_30_dias = hoy - timedelta(days=30)
-
-    productos_info = []
-
-    for p in Product.objects.all():
-        # ventas desde el modelo Venta (si lo usas)
-        ventas_venta = Venta.objects.filter(
-            product=p, fecha__gte=hace_30_dias
-        ).aggregate(total=Sum('cantidad'))['total'] or 0
-
-        # ventas desde DetalleFactura (filtradas por la fecha de la factura)
-        ventas_detalle = DetalleFactura.objects.filter(
-            producto=p, factura__fecha__gte=hace_30_dias
-        ).aggregate(total=Sum('cantidad'))['total'] or 0
-
-        ventas_mes = int(ventas_venta or 0) + int(ventas_detalle or 0)
-
-        # última fecha de venta: max entre Venta.fecha y DetalleFactura.factura.fecha
-        ultima_venta_venta = Venta.objects.filter(product=p).aggregate(fecha=Max('fecha'))['fecha']
-        ultima_venta_detalle = DetalleFactura.objects.filter(producto=p).aggregate(fecha=Max('factura__fecha'))['fecha']
-
-        ultima_venta = None
-        if ultima_venta_venta and ultima_venta_detalle:
-            ultima_venta = max(ultima_venta_venta, ultima_venta_detalle)
-        else:
-            ultima_venta = ultima_venta_venta or ultima_venta_detalle
-
-        productos_info.append({
-            "nombre": p.name,
-            "categoria": p.category,
-            "stock": p.quantity,
-            "ventas_ult_30d": ventas_mes,
-            "ultima_venta": ultima_venta.isoformat() if ultima_venta else "Nunca",
-            "precio": float(p.price),
-        })
-
-    # Prompt claro en español (similar al de selling)
-    prompt = f"""
-Eres un asistente experto en gestión de inventario para comercios.
-
-A continuación tienes una lista de productos con su stock actual, ventas de los últimos 30 días y la última fecha de venta.
-Para cada producto, responde en español y genera:
-- Recomendación: "Reabastecer" o "No reabastecer".
-- Cantidad sugerida a comprar (número entero).
-- Plazo recomendado para realizar el pedido (en días).
-- Breve justificación basada en las ventas y el stock actual.
-
-Formato solicitado (por producto):
-Producto: <nombre>
-Recomendación: <Reabastecer / No reabastecer>
-Cantidad sugerida: <número>
-Plazo (días): <número>
-Justificación: <texto corto>
-
-Productos:
-{productos_info}
-
-Devuelve la respuesta en texto claro, con una sección por producto.
-    """
-
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "Eres un asistente de inventario inteligente."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.2,
-        max_tokens=700,
-    )
-
-    recomendaciones_md = response.choices[0].message.content.strip()
-    # convertimos markdown (si lo devuelve) a HTML para mostrarlo con seguridad
-    recomendaciones_html = markdown.markdown(recomendaciones_md)
-
-    return render(request, 'restock_recommendations.html', {
-        'recomendaciones': recomendaciones_html
+def selling(request):
+    """Genera sugerencias de venta usando OpenAI según el desempeño de los productos."""
+    return render(request, 'selling.html', {
+        'stream_url': _with_query(reverse('selling_stream'), request),
     })
 
 
-def slow_inventory_alerts(request):
-    """FR-17: Alertas de inventario lento u obsoleto con IA (usa Venta + DetalleFactura)"""
-    hoy = datetime.now()
-    hace_60_dias = hoy - timedelta(days=60)
-
-    productos_info = []
-
-    for p in Product.objects.all():
-        ventas_venta = Venta.objects.filter(
-            product=p, fecha__gte=hace_60_dias
-        ).aggregate(total=Sum('cantidad'))['total'] or 0
-
-        ventas_detalle = DetalleFactura.objects.filter(
-            producto=p, factura__fecha__gte=hace_60_dias
-        ).aggregate(total=Sum('cantidad'))['total'] or 0
-
-        ventas_60d = int(ventas_venta or 0) + int(ventas_detalle or 0)
-
-        ultima_venta_venta = Venta.objects.filter(product=p).aggregate(fecha=Max('fecha'))['fecha']
-        ultima_venta_detalle = DetalleFactura.objects.filter(producto=p).aggregate(fecha=Max('factura__fecha'))['fecha']
+async def selling_stream(request):
+    llm_request = await sync_to_async(_selling_request)(request.GET)
+    if llm_request is None:
+        return sse_response(static_text("No hay datos suficientes para generar sugerencias."))
+    return sse_response(astream(**llm_request))
 
-        ultima_venta = None
-        if ultima_venta_venta and ultima_venta_detalle:
-            ultima_venta = max(ultima_venta_venta, ultima_venta_detalle)
-        else:
-            ultima_venta = ultima_venta_venta or ultima_venta_detalle
 
-        productos_info.append({
-            "nombre": p.name,
-            "categoria": p.category,
-            "stock": p.quantity,
-            "ventas_ult_60d": ventas_60d,
-            "ultima_venta": ultima_venta.isoformat() if ultima_venta else "Nunca",
-        })
+def _recommendations_page(request, template, kind):
+    # Una sola lectura de la tabla Recommendation (la llena refresh_recommendations)
+    recommendations = list(latest(kind))
+    return render(request, template, {
+        'recommendations': recommendations,
+        'generated_at': max((r.generated_at for r in recommendations), default=None),
+    })
 
-    prompt = f"""
-Eres un analista de inventario experto.
 
-Tienes información de productos, su stock, ventas en los últimos 60 días y la última venta.
-Identifica qué productos parecen tener movimiento lento u obsolescencia.
+def restock_recommendations(request):
+    """FR-15: Recomendaciones de reabastecimiento (motor local + motivo de la IA, ver recommendations.py)"""
+    return _recommendations_page(request, 'restock_recommendations.html', Recommendation.RESTOCK)
 
-Para cada producto que esté lento u obsoleto, devuelve:
-- Producto: <nombre>
-- Estado: <Movimiento lento / Obsoleto>
-- Motivo: <breve justificación (por ejemplo: sin ventas en X días, stock muy alto respecto ventas)>
-- Acción sugerida: <Mantener / Promoción / Remate / Retirar>
 
-Productos:
-{productos_info}
+def restock_data(request):
+    """Plan de reabastecimiento de todos los productos en JSON (``?solo=reabastecer`` filtra)."""
+    only_restock = request.GET.get('solo') == 'reabastecer'
+    return JsonResponse({
+        'generado': timezone.now().isoformat(),
+        'parametros': restock_params(),
+        'productos': restock_plan(only_restock=only_restock),
+    })
 
-Devuélvelo en español con una lista clara por producto.
-    """
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "Eres un experto en análisis de inventario."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.25,
-        max_tokens=800,
-    )
-
-    analisis_md = response.choices[0].message.content.strip()
-    analisis_html = markdown.markdown(analisis_md)
-
-    return render(request, 'slow_inventory_alerts.html', {
-        'analisis': analisis_html
-    })
+def slow_inventory_alerts(request):
+    """FR-17: Alertas de inventario lento u obsoleto con IA (ver recommendations.py)"""
+    return _recommendations_page(request, 'slow_inventory_alerts.html', Recommendation.SLOW)
@@ -1,4 +1,10 @@
 from django.contrib import admin
-from .models import Product
+from .models import Product, EnrichmentTask
 
 admin.site.register(Product)
+
+
+@admin.register(EnrichmentTask)
+class EnrichmentTaskAdmin(admin.ModelAdmin):
+    list_display = ("product", "status", "attempts", "available_at", "updated_at")
+    list_filter = ("status",)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class KontagConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        import inventory.signals
@@ -0,0 +1,80 @@
+"""
+Utilidades para los comandos ``bench_*``: base de datos temporal y datos de prueba.
+
+Los benchmarks nunca tocan ``db.sqlite3``: crean una base de datos de pruebas
+(igual que ``manage.py test``), la llenan y la destruyen al terminar.
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import connection
+
+from .models import Product
+
+WORDS = [
+    "shampoo", "acondicionador", "tijeras", "peluquería", "cuaderno", "útiles",
+    "lápiz", "borrador", "jabón", "detergente", "blanqueador", "rubor", "gloss",
+    "tostadas", "jamón", "café", "arroz", "cepillo", "pinzas", "morral",
+    "cartuchera", "esmalte", "crema", "desinfectante", "galletas", "azúcar",
+]
+SUPPLIERS = ["Norma", "Colgate", "Alpina", "Familia", "Unilever", "Nutresa", "Éxito", "Ñapa Ltda"]
+
+
+@contextmanager
+def temporary_database(verbosity=0, on_disk=False):
+    """
+    Crea (y al final destruye) una base de datos de pruebas con todas las
+    migraciones. Con ``on_disk`` la base SQLite de pruebas es un archivo en vez
+    de memoria compartida, para que varios hilos escriban a la vez con los
+    bloqueos normales de SQLite.
+    """
+    test_settings = connection.settings_dict["TEST"]
+    old_test_name = test_settings.get("NAME")
+    if on_disk and connection.vendor == "sqlite":
+        test_settings["NAME"] = os.path.join(tempfile.gettempdir(), f"kontago_bench_{os.getpid()}.sqlite3")
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        test_settings["NAME"] = old_test_name
+
+
+def seed_products(count, batch_size=5000, seed=42):
+    """Inserta ``count`` productos sintéticos con ``bulk_create``."""
+    rng = random.Random(seed)
+    categories = [code for code, _ in Product.CATEGORY_CHOICES]
+    created = 0
+    while created < count:
+        batch = []
+        for i in range(created, min(created + batch_size, count)):
+            words = rng.sample(WORDS, 3)
+            batch.append(Product(
+                name=f"{words[0].capitalize()} {words[1]} {i:06d}",
+                category=rng.choice(categories),
+                description=" ".join(rng.choices(WORDS, k=12)),
+                price=Decimal(rng.randint(500, 200000)),
+                supplier=rng.choice(SUPPLIERS),
+                quantity=rng.choice([0, 0, 1, 5, 10, 25, 100]),
+                price_suggestion=Decimal("1000.00"),
+                product_assigned_suggestions="-",
+            ))
+        Product.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def timed(func, repeat=5):
+    """Ejecuta ``func`` ``repeat`` veces y devuelve (mediana en ms, último resultado)."""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
@@ -0,0 +1,188 @@
+"""
+Cola de enriquecimiento con IA para los productos.
+
+Los productos nuevos o con nombre/categoría/descripción modificados se encolan
+desde ``signals.py`` y el comando ``manage.py enrichment_worker`` consume la
+cola fuera del ciclo de request (concurrencia acotada y reintentos).
+
+El mismo worker genera las versiones redimensionadas de las imágenes
+(productos con imagen y ``image_hash`` vacío, ver images.py).
+"""
+import logging
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image
+
+from .images import process_product_image
+from .models import Product, EnrichmentTask
+from .suggestions import suggest_price, assign_suggestions
+
+logger = logging.getLogger(__name__)
+
+# Campos que alimentan los prompts: si cambian, las sugerencias quedan obsoletas
+SOURCE_FIELDS = ("name", "category", "description")
+BLANK_SUGGESTIONS = (None, "", "Blank")
+
+RETRY_BASE_SECONDS = 30
+STALE_AFTER = timedelta(minutes=15)  # tareas "running" de un worker caído
+IMAGE_INVALID = "invalid"  # image_hash de imágenes que no se pudieron procesar
+
+
+def needs_enrichment(product):
+    return not product.price_suggestion or product.product_assigned_suggestions in BLANK_SUGGESTIONS
+
+
+def enqueue_product(product_id):
+    """Encola (o reinicia) la tarea de enriquecimiento de un producto."""
+    EnrichmentTask.objects.update_or_create(
+        product_id=product_id,
+        defaults={
+            "status": EnrichmentTask.PENDING,
+            "attempts": 0,
+            "last_error": "",
+            "available_at": timezone.now(),
+        },
+    )
+
+
+def enqueue_products(product_ids):
+    """
+    Versión por lotes de ``enqueue_product`` (importaciones masivas): un UPDATE
+    para las tareas existentes y un INSERT para las que faltan.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return 0
+    now = timezone.now()
+    existing = set(EnrichmentTask.objects
+                   .filter(product_id__in=product_ids)
+                   .values_list("product_id", flat=True))
+    EnrichmentTask.objects.filter(product_id__in=existing).update(
+        status=EnrichmentTask.PENDING, attempts=0, last_error="", available_at=now, updated_at=now,
+    )
+    EnrichmentTask.objects.bulk_create(
+        [EnrichmentTask(product_id=pk, available_at=now) for pk in product_ids if pk not in existing],
+        ignore_conflicts=True,
+    )
+    return len(product_ids)
+
+
+def enqueue_missing():
+    """Encola los productos sin sugerencias que no estén ya en la cola. Devuelve cuántos."""
+    missing = (Product.objects
+               .filter(Q(price_suggestion=0) | Q(price_suggestion__isnull=True) |
+                       Q(product_assigned_suggestions__isnull=True) |
+                       Q(product_assigned_suggestions__in=["", "Blank"]))
+               .exclude(enrichment_task__status__in=[EnrichmentTask.PENDING, EnrichmentTask.RUNNING])
+               .values_list("id", flat=True))
+    return enqueue_products(missing)
+
+
+def parse_price(raw):
+    """Convierte la respuesta del modelo ("25000", "25.000", "$ 25,000") en Decimal."""
+    match = re.search(r"\d[\d.,]*", raw or "")
+    if not match:
+        raise ValueError(f"Respuesta de precio no válida: {raw!r}")
+    number = match.group().rstrip(".,")
+    # En COP los puntos/comas agrupando de a tres dígitos son separadores de miles
+    if re.fullmatch(r"\d{1,3}([.,]\d{3})+", number):
+        number = re.sub(r"[.,]", "", number)
+    else:
+        number = number.replace(",", ".")
+    return Decimal(number).quantize(Decimal("0.01"))
+
+
+def claim_tasks(limit):
+    """Marca como "running" hasta ``limit`` tareas disponibles y devuelve sus ids."""
+    now = timezone.now()
+    EnrichmentTask.objects.filter(
+        status=EnrichmentTask.RUNNING, updated_at__lt=now - STALE_AFTER
+    ).update(status=EnrichmentTask.PENDING, updated_at=now)
+
+    candidates = (EnrichmentTask.objects
+                  .filter(status=EnrichmentTask.PENDING, available_at__lte=now)
+                  .order_by("available_at")
+                  .values_list("id", flat=True)[:limit])
+    claimed = []
+    for task_id in list(candidates):
+        # compare-and-set: si otro worker la tomó primero, update() devuelve 0
+        if EnrichmentTask.objects.filter(pk=task_id, status=EnrichmentTask.PENDING).update(
+            status=EnrichmentTask.RUNNING, updated_at=now
+        ):
+            claimed.append(task_id)
+    return claimed
+
+
+def process_task(task_id, max_attempts=5):
+    """Ejecuta una tarea reclamada. Devuelve el estado final de la tarea."""
+    task = EnrichmentTask.objects.select_related("product").get(pk=task_id)
+    product = task.product
+    running = EnrichmentTask.objects.filter(pk=task.pk, status=EnrichmentTask.RUNNING)
+
+    try:
+        updates = {}
+        if not product.price_suggestion:
+            updates["price_suggestion"] = parse_price(suggest_price(
+                product_name=product.name,
+                product_category=product.category,
+                product_description=product.description,
+            ))
+        if product.product_assigned_suggestions in BLANK_SUGGESTIONS:
+            updates["product_assigned_suggestions"] = assign_suggestions(
+                product_name=product.name,
+                product_category=product.category,
+                product_description=product.description,
+            )
+        if updates:
+            # Solo se guarda si el producto no cambió mientras se consultaba la IA
+            Product.objects.filter(
+                pk=product.pk, **{field: getattr(product, field) for field in SOURCE_FIELDS}
+            ).update(**updates, updated_at=timezone.now())
+    except Exception as exc:
+        attempts = task.attempts + 1
+        now = timezone.now()
+        if attempts >= max_attempts:
+            status, available_at = EnrichmentTask.FAILED, now
+        else:
+            status = EnrichmentTask.PENDING
+            available_at = now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+        running.update(status=status, attempts=attempts, last_error=str(exc)[:2000],
+                       available_at=available_at, updated_at=now)
+        return status
+
+    # Si se volvió a encolar mientras corría, queda pendiente y se reprocesa
+    running.update(status=EnrichmentTask.DONE, last_error="", updated_at=timezone.now())
+    return EnrichmentTask.DONE
+
+
+def pending_images(limit):
+    """Ids de productos con imagen cuyas versiones aún no se generaron."""
+    return list(Product.objects
+                .filter(image_hash="")
+                .exclude(image="").exclude(image__isnull=True)
+                .values_list("id", flat=True)[:limit])
+
+
+def process_image(product_id):
+    product = Product.objects.filter(pk=product_id).first()
+    if product is None or not product.image:
+        return False
+    try:
+        fields = process_product_image(product)
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        logger.warning("No se pudo procesar la imagen de %s: %s", product, exc)
+        fields = {"image_hash": IMAGE_INVALID}
+    # Si la imagen cambió mientras tanto, se deja pendiente para la próxima vuelta.
+    # update() no pasa por auto_now: updated_at se fija a mano para que cambie la
+    # huella de las exportaciones (exports.py).
+    legacy_name = product.image.name
+    if not Product.objects.filter(pk=product.pk, image=legacy_name).update(**fields, updated_at=timezone.now()):
+        return False
+    if fields.get("image", legacy_name) != legacy_name and not Product.objects.filter(image=legacy_name).exists():
+        # Archivo antiguo ya copiado a su ruta por contenido y sin otro producto que lo use
+        product.image.storage.delete(legacy_name)
+    return True
@@ -0,0 +1,151 @@
+"""
+Exportaciones en segundo plano con caché por huella.
+
+La huella combina el tipo de exportación, los parámetros de filtro y la marca
+de última modificación de la tabla de productos: mientras nada cambie, pedir
+la misma vista filtrada devuelve el archivo ya generado.
+
+El CSV no pasa por la cola: se genera en streaming mientras se lee la consulta
+(ver ``iter_inventory_csv``).
+"""
+import csv
+import hashlib
+import json
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .filters import filter_products
+from .models import ExportJob, Product
+from .pdf import render_pdf
+
+INVENTORY_PDF = "inventory_pdf"
+FILTER_PARAMS = ("q", "category", "supplier", "min_price", "max_price", "in_stock", "order_by")
+STALE_AFTER = timedelta(minutes=10)  # trabajos "running" de un worker caído
+
+
+def catalog_marker():
+    """Cambia con cualquier alta, baja o modificación de productos."""
+    stats = Product.objects.aggregate(last=Max("updated_at"), count=Count("id"))
+    last = stats["last"].isoformat() if stats["last"] else ""
+    return f"{last}|{stats['count']}"
+
+
+def inventory_params(querydict):
+    return {key: querydict.get(key, "").strip() for key in FILTER_PARAMS if querydict.get(key, "").strip()}
+
+
+def fingerprint(kind, params):
+    raw = json.dumps([kind, params, catalog_marker()], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def request_export(kind, params):
+    """
+    Devuelve el trabajo para esos parámetros: uno ya listo o en curso con la
+    misma huella, o uno nuevo en estado pendiente.
+    """
+    digest = fingerprint(kind, params)
+    job = (ExportJob.objects
+           .filter(fingerprint=digest, status__in=[ExportJob.DONE, ExportJob.RUNNING, ExportJob.PENDING])
+           .order_by("-created_at")
+           .first())
+    if job is not None and (job.status != ExportJob.DONE or job.file.storage.exists(job.file.name)):
+        return job
+    return ExportJob.objects.create(kind=kind, fingerprint=digest, params=params)
+
+
+def render_inventory_pdf(params):
+    context = {
+        "products": filter_products(params),  # SIN paginar
+        "filters": params,
+    }
+    return render_pdf("inventory_pdf.html", context), "inventario.pdf"
+
+
+# Columnas de la exportación CSV: (campo, encabezado)
+CSV_COLUMNS = [
+    ("name", "Producto"),
+    ("category", "Categoría"),
+    ("supplier", "Proveedor"),
+    ("price", "Precio"),
+    ("quantity", "Stock"),
+    ("min_stock", "Stock mínimo"),
+    ("expiration_date", "Vencimiento"),
+    ("description", "Descripción"),
+]
+CSV_DELIMITERS = {"comma": ",", "semicolon": ";", "tab": "\t"}
+CSV_CHUNK_SIZE = 2000
+# Excel/LibreOffice interpretan como fórmula las celdas que empiezan así
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def csv_safe(value):
+    """Antepone ' al texto que una hoja de cálculo ejecutaría como fórmula (inyección CSV)."""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def iter_inventory_csv(params, delimiter=",", chunk_size=CSV_CHUNK_SIZE):
+    """
+    Genera el CSV línea por línea leyendo tuplas (no instancias de Product) por
+    bloques de ``chunk_size``, así la memoria no crece con el tamaño del catálogo.
+    """
+    writer = csv.writer(_Echo(), delimiter=delimiter)
+    fields = [field for field, _ in CSV_COLUMNS]
+    rows = filter_products(params).values_list(*fields).iterator(chunk_size=chunk_size)
+    yield "\ufeff"  # BOM: Excel abre el UTF-8 con tildes correctamente
+    yield writer.writerow([header for _, header in CSV_COLUMNS])
+    for row in rows:
+        yield writer.writerow([csv_safe(value) for value in row])
+
+
+RENDERERS = {
+    INVENTORY_PDF: render_inventory_pdf,
+}
+
+
+def claim_job():
+    """Toma el trabajo pendiente más antiguo (compare-and-set). Devuelve None si no hay."""
+    now = timezone.now()
+    ExportJob.objects.filter(status=ExportJob.RUNNING, started_at__lt=now - STALE_AFTER).update(status=ExportJob.PENDING)
+    pending = ExportJob.objects.filter(status=ExportJob.PENDING).order_by("created_at").values_list("id", flat=True)
+    for job_id in list(pending[:5]):
+        if ExportJob.objects.filter(pk=job_id, status=ExportJob.PENDING).update(status=ExportJob.RUNNING, started_at=now):
+            return ExportJob.objects.get(pk=job_id)
+    return None
+
+
+def run_job(job):
+    try:
+        content, filename = RENDERERS[job.kind](job.params)
+    except Exception as exc:
+        job.status, job.error = ExportJob.FAILED, str(exc)[:2000]
+    else:
+        job.file.save(f"{job.id}/{filename}", ContentFile(content), save=False)
+        job.status, job.error = ExportJob.DONE, ""
+    job.finished_at = timezone.now()
+    job.save(update_fields=["file", "status", "error", "finished_at"])
+    return job
+
+
+def purge_jobs(older_than):
+    """Borra los trabajos (y sus archivos) creados antes de ``older_than``."""
+    old = ExportJob.objects.filter(created_at__lt=timezone.now() - older_than)
+    count = 0
+    for job in old:
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
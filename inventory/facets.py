@@ -0,0 +1,53 @@
+"""
+Valores de los filtros de categoría y proveedor con sus conteos.
+
+Se cachean en el alias ``facets`` de ``CACHES`` y se invalidan con
+post_save/post_delete de Product (ver signals.py). Con la caché caliente llenar
+los <select> no hace ninguna consulta SQL: con LocMemCache (la configuración por
+defecto) es una lectura en memoria del proceso; con Redis o Memcached es una ida
+y vuelta al servidor de caché. LocMemCache es por proceso: si hay varios
+procesos de servidor, una venta invalida los conteos solo en el que la registró
+y los demás los sirven viejos hasta ``FACETS_CACHE_TIMEOUT``. Para ese despliegue
+hay que apuntar el alias a un backend compartido.
+"""
+from django.core.cache import caches
+from django.db.models import Count, Q
+
+from .models import Product
+
+FACETS_CACHE = "facets"
+FACETS_CACHE_KEY = "inventory:facets"
+FACETS_CACHE_TIMEOUT = 60 * 60  # respaldo por si algo escribe sin pasar por las señales
+
+
+def _facet(field, labels=None):
+    rows = (Product.objects
+            .order_by(field)
+            .values(field)
+            .annotate(count=Count("id"), in_stock=Count("id", filter=Q(quantity__gt=0))))
+    labels = labels or {}
+    return [
+        {
+            "value": row[field],
+            "label": labels.get(row[field], row[field]),
+            "count": row["count"],
+            "in_stock": row["in_stock"],
+        }
+        for row in rows
+    ]
+
+
+def compute_facets():
+    return {
+        "categories": _facet("category", dict(Product.CATEGORY_CHOICES)),
+        "suppliers": _facet("supplier"),
+    }
+
+
+def get_facets():
+    """{"categories": [...], "suppliers": [...]} con value, label, count e in_stock."""
+    return caches[FACETS_CACHE].get_or_set(FACETS_CACHE_KEY, compute_facets, FACETS_CACHE_TIMEOUT)
+
+
+def invalidate_facets():
+    caches[FACETS_CACHE].delete(FACETS_CACHE_KEY)
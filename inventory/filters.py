@@ -0,0 +1,66 @@
+"""
+Filtros del buscador de inventario, compartidos por la vista HTML y las exportaciones.
+"""
+from django.db.models import Value
+from django.db.models.functions import Lower
+
+from .models import Product
+from .search import search_products
+
+# Orden: usar 'supplier' como texto (no supplier__name)
+ALLOWED_ORDER = {
+    "name", "-name", "price", "-price", "quantity", "-quantity",
+    "supplier", "-supplier", "category", "-category",
+}
+
+
+def get_order_by(params):
+    """
+    Orden pedido por GET. Con texto de búsqueda y sin orden explícito se
+    ordena por relevancia.
+    """
+    order_by = params.get("order_by", "").strip()
+    if order_by in ALLOWED_ORDER:
+        return order_by
+    if params.get("q", "").strip() and order_by in ("", "relevance"):
+        return "relevance"
+    return "name"
+
+
+def filter_products(params):
+    """Aplica los parámetros GET del buscador (q, category, supplier, ...) a Product."""
+    q          = params.get("q", "").strip()
+    category   = params.get("category", "").strip()
+    supplier   = params.get("supplier", "").strip()   # NOMBRE del proveedor (texto)
+    min_price  = params.get("min_price", "").strip()
+    max_price  = params.get("max_price", "").strip()
+    in_stock   = params.get("in_stock", "").strip()   # "" | "yes" | "no"
+    order_by   = get_order_by(params)
+
+    # SIN select_related, porque supplier no es FK
+    qs = Product.objects.all()
+
+    # Texto libre (índice FTS5, ver search.py)
+    if q:
+        qs = search_products(qs, q)
+
+    # Filtros específicos
+    if category:
+        qs = qs.filter(category=category)
+    if supplier:
+        # ← texto exacto del proveedor sin distinguir mayúsculas (usa product_supplier_ci_idx)
+        qs = qs.alias(supplier_ci=Lower("supplier")).filter(supplier_ci=Lower(Value(supplier)))
+    if min_price:
+        try: qs = qs.filter(price__gte=float(min_price))
+        except ValueError: pass
+    if max_price:
+        try: qs = qs.filter(price__lte=float(max_price))
+        except ValueError: pass
+    if in_stock == "yes":
+        qs = qs.filter(quantity__gt=0)
+    elif in_stock == "no":
+        qs = qs.filter(quantity__lte=0)
+
+    if order_by == "relevance":
+        return qs.order_by("search_rank", "name")
+    return qs.order_by(order_by)
@@ -62,6 +62,34 @@ class SupplierForm(forms.ModelForm):
             self.save_m2m()  # 👈 guarda la relación ManyToMany
         return supplier
 
+class ProductImportRowForm(ProductEntryForm):
+    """Valida una fila de la importación masiva con las mismas reglas del formulario."""
+    image = None
+    # Sin el límite de 100 caracteres del formulario: el modelo es un TextField y
+    # la exportación CSV devuelve las descripciones completas
+    description = forms.CharField(label="Description", required=False)
+    # Opcional: vacío conserva el valor actual (o el predeterminado en productos nuevos)
+    min_stock = forms.IntegerField(label="Minimum Stock", min_value=0, required=False)
+
+    # El nombre repetido no es error: la importación actualiza ese producto
+    # (la consulta de existencia se hace una vez por lote en importer.py)
+    def clean_name(self):
+        return self.cleaned_data["name"]
+
+
+class ProductImportForm(forms.Form):
+    file = forms.FileField(label="Archivo CSV o JSON")
+    update_existing = forms.BooleanField(
+        label="Actualizar los productos que ya existen", required=False, initial=True
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data["file"]
+        if not file.name.lower().endswith((".csv", ".json")):
+            raise forms.ValidationError("⚠️ El archivo debe ser .csv o .json")
+        return file
+
+
 class ProductTakeoutForm(forms.Form):
     name = forms.CharField(label="Nombre del Producto", max_length=100)
     quantity = forms.IntegerField(label="Cantidad a Eliminar", min_value=1)
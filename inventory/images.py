@@ -0,0 +1,96 @@
+"""
+Imágenes de productos: almacenamiento por contenido y versiones redimensionadas.
+
+Cada archivo se guarda como ``products/<sha256[:2]>/<sha256>.<ext>``, así que
+dos subidas idénticas comparten un único archivo. En segundo plano
+(``manage.py enrichment_worker``) se generan las versiones fijas de RENDITIONS
+sin metadatos EXIF, que son las que usan la grilla, el PDF y el detalle.
+"""
+import hashlib
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from PIL import Image, ImageOps
+
+# nombre -> (tamaño máximo, formato)
+RENDITIONS = {
+    "card": ((400, 400), "WEBP"),
+    "pdf": ((200, 200), "JPEG"),  # xhtml2pdf/reportlab se llevan mejor con JPEG
+    "detail": ((1024, 1024), "WEBP"),
+}
+EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Si el archivo ya existe no se duplica con sufijo: el nombre es el hash del contenido."""
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+def content_hash(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(64 * 1024), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def content_name(digest, filename):
+    ext = os.path.splitext(filename)[1].lower() or ".img"
+    return f"products/{digest[:2]}/{digest}{ext}"
+
+
+def product_image_path(instance, filename):
+    """upload_to de Product.image: ruta según el hash del archivo subido."""
+    return content_name(content_hash(instance.image.file), filename)
+
+
+def _render(image, size, fmt):
+    copy = image.copy()
+    copy.thumbnail(size, Image.Resampling.LANCZOS)
+    if fmt == "JPEG" and copy.mode != "RGB":
+        background = Image.new("RGB", copy.size, "white")
+        rgba = copy.convert("RGBA")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        copy = background
+    elif copy.mode not in ("RGB", "RGBA"):
+        copy = copy.convert("RGBA")
+    buffer = io.BytesIO()
+    # Sin exif=...: Pillow no copia los metadatos al volver a codificar
+    copy.save(buffer, fmt, quality=82, optimize=True)
+    return buffer.getvalue()
+
+
+def process_product_image(product):
+    """
+    Mueve la imagen original a su ruta por contenido (si era un archivo antiguo)
+    y genera las versiones que falten. Devuelve los campos a actualizar.
+    """
+    storage = product.image.storage
+    with product.image.open("rb") as original:
+        digest = content_hash(original)
+        name = content_name(digest, product.image.name)
+        if product.image.name != name:
+            name = storage.save(name, original)
+
+        image = Image.open(original)
+        image = ImageOps.exif_transpose(image)  # respeta la orientación antes de descartar EXIF
+        renditions = {}
+        for key, (size, fmt) in RENDITIONS.items():
+            path = f"products/renditions/{digest}/{key}.{EXTENSIONS[fmt]}"
+            if not storage.exists(path):
+                storage.save(path, ContentFile(_render(image, size, fmt)))
+            renditions[key] = path
+
+    return {"image": name, "image_hash": digest, "image_renditions": renditions}
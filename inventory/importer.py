@@ -0,0 +1,173 @@
+"""
+Importación masiva de productos desde CSV o JSON.
+
+Cada fila se valida con las reglas de ``ProductEntryForm`` y se procesa por
+lotes: una sola consulta por lote para saber qué nombres ya existen,
+``bulk_create`` para los nuevos e INSERT ... ON CONFLICT(name) DO UPDATE para
+los existentes que cambiaron (el nombre es la clave, así que reimportar el
+mismo archivo actualiza en vez de duplicar). Las filas con errores se reportan sin abortar el lote, y el
+enriquecimiento con IA se encola para ``manage.py enrichment_worker``.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import transaction
+
+from .enrichment import SOURCE_FIELDS, enqueue_products
+from .exports import CSV_COLUMNS, CSV_FORMULA_PREFIXES
+from .facets import invalidate_facets
+from .forms import ProductImportRowForm
+from .models import Product
+
+BATCH_SIZE = 1000
+IMPORT_FIELDS = ("name", "category", "description", "price", "quantity", "min_stock", "supplier", "expiration_date")
+# Campos que, vacíos en el archivo, no se tocan en vez de vaciarse
+OPTIONAL_FIELDS = ("min_stock",)
+CATEGORIES_WITH_EXPIRATION = ("alimentos", "cosmetica", "limpieza")
+
+# Los encabezados de la exportación CSV también sirven para importar
+HEADER_ALIASES = {header.lower(): field for field, header in CSV_COLUMNS}
+HEADER_ALIASES["stock inicial"] = "quantity"
+HEADER_ALIASES["stock minimo"] = "min_stock"
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.errors = []  # [(número de fila, mensaje)]
+
+    @property
+    def total(self):
+        return self.created + self.updated + self.unchanged + self.skipped + len(self.errors)
+
+    def add_error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+
+def _normalize(row):
+    data = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        key = key.strip().lower()
+        field = HEADER_ALIASES.get(key, key)
+        if field in IMPORT_FIELDS:
+            value = "" if value is None else str(value).strip()
+            # Deshace el ' que la exportación antepone a lo que parece una fórmula
+            if value.startswith("'") and value[1:].startswith(CSV_FORMULA_PREFIXES):
+                value = value[1:]
+            data[field] = value
+    return data
+
+
+def read_rows(file, filename):
+    """
+    Devuelve las filas de ``file`` (abierto en binario) como diccionarios. El CSV
+    se lee en streaming (separador autodetectado); el JSON debe ser una lista de
+    objetos o ``{"products": [...]}``.
+    """
+    if filename.lower().endswith(".json"):
+        data = json.load(file)
+        if isinstance(data, dict):
+            data = data.get("products", [])
+        if not isinstance(data, list):
+            raise ValueError("El JSON debe ser una lista de productos.")
+        return data
+
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return csv.DictReader(text, dialect=dialect)
+
+
+def _error_message(form):
+    return "; ".join(
+        f"{field}: {' '.join(errors)}" if field != "__all__" else " ".join(errors)
+        for field, errors in form.errors.items()
+    )
+
+
+def _import_batch(batch, result, update_existing):
+    valid = {}
+    for row_number, row in batch:
+        if not isinstance(row, dict):
+            result.add_error(row_number, "La fila no es un objeto.")
+            continue
+        form = ProductImportRowForm(_normalize(row))
+        if not form.is_valid():
+            result.add_error(row_number, _error_message(form))
+            continue
+        data = form.cleaned_data
+        if data["category"] not in CATEGORIES_WITH_EXPIRATION:
+            data["expiration_date"] = None  # igual que product_entry
+        if data["name"] in valid:
+            result.add_error(row_number, f"Nombre repetido en el archivo (fila {valid[data['name']][0]}).")
+            continue
+        for field in OPTIONAL_FIELDS:
+            if data[field] is None:
+                del data[field]
+        valid[data["name"]] = (row_number, data)
+
+    if not valid:
+        return
+
+    with transaction.atomic():
+        existing = Product.objects.in_bulk(list(valid), field_name="name")
+        new, changed, dirty_ids = [], [], []
+        for name, (row_number, data) in valid.items():
+            product = existing.get(name)
+            if product is None:
+                new.append(Product(**data))
+                continue
+            if not update_existing:
+                result.skipped += 1
+                continue
+            if all(getattr(product, field) == value for field, value in data.items()):
+                result.unchanged += 1
+                continue
+            # Mismas reglas que signals.detectar_cambios_producto (aquí no hay señales)
+            if any((getattr(product, field) or "") != (data[field] or "") for field in SOURCE_FIELDS):
+                product.price_suggestion = 0
+                product.product_assigned_suggestions = "Blank"
+                dirty_ids.append(product.pk)
+            for field, value in data.items():
+                setattr(product, field, value)
+            changed.append(product)
+
+        created = Product.objects.bulk_create(new)
+        if changed:
+            # Upsert en vez de bulk_update: su UPDATE ... CASE WHEN por fila es
+            # mucho más lento. updated_at lo asigna auto_now.
+            Product.objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=["name"],
+                update_fields=[*IMPORT_FIELDS, "price_suggestion", "product_assigned_suggestions", "updated_at"],
+            )
+        enqueue_products([product.pk for product in created] + dirty_ids)
+        transaction.on_commit(invalidate_facets)
+
+    result.created += len(created)
+    result.updated += len(changed)
+
+
+def import_products(rows, batch_size=BATCH_SIZE, update_existing=True):
+    """Importa ``rows`` (diccionarios) por lotes de ``batch_size``. Devuelve un ``ImportResult``."""
+    result = ImportResult()
+    # La fila 1 del CSV es el encabezado
+    numbered = enumerate(rows, start=2 if isinstance(rows, csv.DictReader) else 1)
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            break
+        _import_batch(batch, result, update_existing)
+    return result
@@ -0,0 +1,252 @@
+"""
+Cliente único de OpenAI para KontaGo con caché de respuestas.
+
+Las respuestas se guardan en la base de datos (``LLMCacheEntry``) indexadas por
+un hash SHA-256 de modelo, mensajes, temperatura y max_tokens, con expiración
+(``LLM_CACHE_TTL``) y desalojo LRU al superar ``LLM_CACHE_MAX_ENTRIES``; la
+limpieza corre cada ``LLM_CACHE_PRUNE_EVERY`` escrituras y no en cada miss. Los
+hits y misses se cuentan en ``LLMCacheCounter`` para que ``manage.py llm_cache``
+vea los de todos los procesos (servidor, worker de enriquecimiento, comandos).
+
+``chat_many`` reparte una consulta grande en varias concurrentes (como máximo
+``LLM_FANOUT_CONCURRENCY`` a la vez, ver analytics/recommendations.py), y
+``astream`` es la variante asíncrona en streaming para las vistas que envían
+la respuesta al navegador a medida que llega (ver analytics/streaming.py).
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, OpenAI
+
+from .models import LLMCacheCounter, LLMCacheEntry
+
+logger = logging.getLogger(__name__)
+
+_ = load_dotenv('openAI.env')
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+_client = None
+_async_client = None
+_lock = threading.Lock()
+_writes = itertools.count(1)  # escrituras de este proceso, para espaciar prune_cache
+
+
+def get_client():
+    """Crea el cliente de OpenAI la primera vez que se necesita."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = OpenAI(api_key=os.environ.get('openAI_api_key'))
+        return _client
+
+
+def get_async_client():
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            _async_client = AsyncOpenAI(api_key=os.environ.get('openAI_api_key'))
+        return _async_client
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, "LLM_CACHE_TTL", 7 * 24 * 3600))
+
+
+def _max_entries():
+    return getattr(settings, "LLM_CACHE_MAX_ENTRIES", 5000)
+
+
+def _prune_every():
+    return max(getattr(settings, "LLM_CACHE_PRUNE_EVERY", 100), 1)
+
+
+def cache_key(model, messages, temperature, max_tokens, **extra):
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        **extra,
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _count(kind):
+    if not LLMCacheCounter.objects.filter(name=kind).update(value=F("value") + 1):
+        counter, created = LLMCacheCounter.objects.get_or_create(name=kind, defaults={"value": 1})
+        if not created:
+            LLMCacheCounter.objects.filter(pk=counter.pk).update(value=F("value") + 1)
+
+
+def reset_stats():
+    LLMCacheCounter.objects.all().delete()
+
+
+def cache_stats():
+    """Hits y misses acumulados (de todos los procesos) y cantidad de entradas guardadas."""
+    counters = dict(LLMCacheCounter.objects.values_list("name", "value"))
+    stats = {"hits": counters.get("hits", 0), "misses": counters.get("misses", 0)}
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else None
+    stats["entries"] = LLMCacheEntry.objects.count()
+    return stats
+
+
+def get_cached(key):
+    """Devuelve la respuesta guardada para ``key`` (o None) y registra el hit/miss."""
+    now = timezone.now()
+    entry = LLMCacheEntry.objects.filter(key=key, created_at__gte=now - _ttl()).only("id", "response").first()
+    if entry is None:
+        _count("misses")
+        return None
+    LLMCacheEntry.objects.filter(pk=entry.pk).update(hits=F("hits") + 1, last_used_at=now)
+    _count("hits")
+    return entry.response
+
+
+def store(key, model, response):
+    now = timezone.now()
+    LLMCacheEntry.objects.update_or_create(
+        key=key,
+        defaults={"model": model, "response": response, "created_at": now, "last_used_at": now},
+    )
+    if next(_writes) % _prune_every() == 0:
+        prune_cache()
+
+
+def prune_cache():
+    """Elimina las entradas vencidas y, si sobran, las menos usadas recientemente."""
+    LLMCacheEntry.objects.filter(created_at__lt=timezone.now() - _ttl()).delete()
+    limit = _max_entries()
+    if LLMCacheEntry.objects.count() > limit:
+        stale = list(LLMCacheEntry.objects.order_by("-last_used_at").values_list("id", flat=True)[limit:])
+        LLMCacheEntry.objects.filter(id__in=stale).delete()
+
+
+class ResponseTruncated(Exception):
+    """La respuesta se cortó al llegar a ``max_tokens`` (finish_reason "length")."""
+
+
+def chat(messages, model=DEFAULT_MODEL, temperature=0, max_tokens=500, use_cache=True,
+         allow_truncated=True, **extra):
+    """
+    Equivalente a ``client.chat.completions.create(...)`` que devuelve solo el
+    texto de la respuesta. Las peticiones idénticas se sirven desde la caché.
+    Con ``allow_truncated=False`` una respuesta cortada por ``max_tokens`` lanza
+    ResponseTruncated en vez de devolverse (p. ej. JSON que quedaría incompleto).
+    """
+    key = cache_key(model, messages, temperature, max_tokens, **extra)
+    if use_cache:
+        cached = get_cached(key)
+        if cached is not None:
+            return cached
+
+    response = get_client().chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        **extra,
+    )
+    choice = response.choices[0]
+    content = choice.message.content
+    if choice.finish_reason == "length" and not allow_truncated:
+        raise ResponseTruncated(f"La respuesta superó {max_tokens} tokens.")
+    if use_cache and content is not None:
+        store(key, model, content)
+    logger.debug("LLM %s: %s", "miss" if use_cache else "sin caché", key[:12])
+    return content
+
+
+def chat_many(requests, concurrency=None):
+    """
+    Ejecuta varias llamadas a ``chat`` (``requests``: lista de kwargs) a la vez,
+    como máximo ``concurrency`` al mismo tiempo (``LLM_FANOUT_CONCURRENCY``), y
+    devuelve los textos en el orden de ``requests``. Si una parte falla, en su
+    lugar queda la excepción y las demás siguen.
+    """
+    if concurrency is None:
+        concurrency = getattr(settings, "LLM_FANOUT_CONCURRENCY", 4)
+
+    def run(request):
+        try:
+            return chat(**request)
+        except Exception as exc:  # una parte fallida no detiene a las demás
+            return exc
+
+    if concurrency <= 1 or len(requests) <= 1:
+        return [run(request) for request in requests]
+
+    def run_in_thread(request):
+        try:
+            return run(request)
+        finally:
+            connections.close_all()  # cada hilo abre su propia conexión (caché)
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(requests))) as pool:
+        return list(pool.map(run_in_thread, requests))
+
+
+async def astream(messages, model=DEFAULT_MODEL, temperature=0, max_tokens=500, use_cache=True,
+                  timeout=None, **extra):
+    """
+    Igual que ``chat`` pero va entregando los fragmentos de texto a medida que
+    llegan. Si la respuesta está en caché se entrega completa de una vez. Lanza
+    TimeoutError si la respuesta no termina en ``timeout`` segundos
+    (``LLM_STREAM_TIMEOUT``). Si quien consume el generador lo cierra (el
+    cliente se desconectó), se cierra también la conexión con OpenAI y no se
+    guarda nada en la caché.
+    """
+    key = cache_key(model, messages, temperature, max_tokens, **extra)
+    if use_cache:
+        cached = await sync_to_async(get_cached)(key)
+        if cached is not None:
+            yield cached
+            return
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (getattr(settings, "LLM_STREAM_TIMEOUT", 90) if timeout is None else timeout)
+    stream = await asyncio.wait_for(
+        get_async_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            **extra,
+        ),
+        max(deadline - loop.time(), 0),
+    )
+    parts = []
+    try:
+        chunks = aiter(stream)
+        while True:
+            try:
+                chunk = await asyncio.wait_for(anext(chunks), max(deadline - loop.time(), 0))
+            except StopAsyncIteration:
+                break
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+    finally:
+        await stream.close()
+
+    if use_cache and parts:
+        await sync_to_async(store)(key, model, "".join(parts))
+    logger.debug("LLM stream %s: %s", "miss" if use_cache else "sin caché", key[:12])
@@ -0,0 +1,61 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from inventory.benchmarking import temporary_database, seed_products
+from inventory.filters import filter_products
+from inventory.pdf import render_pdf
+from inventory.views import inventory_csv
+
+
+def _measure(func):
+    """Ejecuta ``func`` y devuelve (primer byte ms, total ms, pico de memoria MB, bytes)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    first_byte, size = func(start)
+    total = (time.perf_counter() - start) * 1000
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return first_byte, total, peak, size
+
+
+class Command(BaseCommand):
+    help = "Compara memoria y latencia de la exportación CSV en streaming contra el PDF."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=20_000)
+        parser.add_argument("--pdf-products", type=int, default=500,
+                            help="Filas del PDF: xhtml2pdf tarda minutos con miles de filas (0 = omitir).")
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            self.stdout.write(f"Creando {options['products']} productos…")
+            seed_products(options["products"])
+            request = RequestFactory().get("/inventory/csv/")
+
+            def csv_export(start):
+                first_byte, size = None, 0
+                for chunk in inventory_csv(request).streaming_content:
+                    # El BOM sale antes de consultar; el primer byte útil es el encabezado
+                    if first_byte is None and size:
+                        first_byte = (time.perf_counter() - start) * 1000
+                    size += len(chunk)
+                return first_byte, size
+
+            def pdf_export(start):
+                # Mismo template que render_inventory_pdf, limitado a --pdf-products filas
+                products = filter_products({})[:options["pdf_products"]]
+                content = render_pdf("inventory_pdf.html", {"products": products, "filters": {}})
+                # El PDF no se puede enviar hasta terminar de generarlo
+                return (time.perf_counter() - start) * 1000, len(content)
+
+            cases = [(f"CSV ({options['products']})", csv_export)]
+            if options["pdf_products"]:
+                cases.append((f"PDF ({options['pdf_products']})", pdf_export))
+
+            self.stdout.write(f"{'formato':<16}{'1er byte ms':>14}{'total ms':>12}{'pico MB':>10}{'tamaño MB':>12}")
+            for label, func in cases:
+                first_byte, total, peak, size = _measure(func)
+                self.stdout.write(f"{label:<16}{first_byte:>14.1f}{total:>12.1f}{peak:>10.1f}{size / 2**20:>12.2f}")
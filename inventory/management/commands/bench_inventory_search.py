@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from inventory.benchmarking import temporary_database, seed_products, timed
+from inventory.models import Product
+from inventory.search import search_products
+
+QUERIES = ["peluquería", "utiles", "jab", "shampoo crema", "ñapa", "zzz"]
+
+
+class Command(BaseCommand):
+    help = "Compara la búsqueda FTS5 con el filtro LIKE (icontains) sobre un catálogo sintético."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--per-page", type=int, default=9)
+
+    def handle(self, *args, **options):
+        per_page = options["per_page"]
+        with temporary_database():
+            self.stdout.write(f"Creando {options['products']} productos…")
+            seed_products(options["products"])
+
+            self.stdout.write(f"{'consulta':<16}{'filas':>8}{'LIKE ms':>12}{'FTS5 ms':>12}{'x':>8}")
+            for q in QUERIES:
+                def run(use_fts):
+                    qs = search_products(Product.objects.all(), q, use_fts=use_fts)
+                    # lo mismo que hace la vista: COUNT(*) del paginador + primera página
+                    return qs.count(), list(qs.order_by("name")[:per_page])
+
+                like_ms, (like_rows, _) = timed(lambda: run(False), options["repeat"])
+                fts_ms, (fts_rows, _) = timed(lambda: run(True), options["repeat"])
+                self.stdout.write(
+                    f"{q:<16}{fts_rows:>8}{like_ms:>12.1f}{fts_ms:>12.1f}{like_ms / max(fts_ms, 0.001):>8.1f}"
+                )
+                if like_rows != fts_rows:
+                    self.stdout.write(self.style.WARNING(
+                        f"  LIKE devuelve {like_rows} filas (coincidencias a mitad de palabra o con tildes distintas)"
+                    ))
@@ -0,0 +1,64 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from inventory.enrichment import claim_tasks, enqueue_missing, pending_images, process_image, process_task
+from inventory.models import EnrichmentTask
+
+
+class Command(BaseCommand):
+    help = ("Consume la cola de enriquecimiento con IA (precio sugerido y sugerencias de manejo) "
+            "y genera las versiones redimensionadas de las imágenes de productos.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=4,
+                            help="Llamadas simultáneas a OpenAI (por defecto 4).")
+        parser.add_argument("--max-attempts", type=int, default=5,
+                            help="Intentos antes de marcar la tarea como fallida.")
+        parser.add_argument("--poll-interval", type=float, default=5.0,
+                            help="Segundos de espera cuando la cola está vacía.")
+        parser.add_argument("--once", action="store_true",
+                            help="Vaciar la cola disponible y terminar.")
+        parser.add_argument("--enqueue-missing", action="store_true",
+                            help="Encolar antes los productos que aún no tienen sugerencias.")
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options["concurrency"])
+        max_attempts = options["max_attempts"]
+
+        if options["enqueue_missing"]:
+            self.stdout.write(f"{enqueue_missing()} productos encolados.")
+
+        def in_thread(func):
+            def wrapper(item):
+                try:
+                    return item, func(item)
+                finally:
+                    if concurrency > 1:
+                        connection.close()  # cada hilo abre su propia conexión
+            return wrapper
+
+        run = in_thread(lambda task_id: process_task(task_id, max_attempts=max_attempts))
+        run_image = in_thread(process_image)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            # Con concurrencia 1 se procesa en el hilo principal (útil para depurar)
+            run_all = pool.map if concurrency > 1 else map
+            try:
+                while True:
+                    task_ids = claim_tasks(concurrency)
+                    image_ids = pending_images(concurrency)
+                    if not task_ids and not image_ids:
+                        if options["once"]:
+                            break
+                        time.sleep(options["poll_interval"])
+                        continue
+                    for task_id, status in run_all(run, task_ids):
+                        style = self.style.SUCCESS if status == EnrichmentTask.DONE else self.style.WARNING
+                        self.stdout.write(style(f"Tarea {task_id}: {status}"))
+                    for product_id, _ in run_all(run_image, image_ids):
+                        self.stdout.write(f"Imagen del producto {product_id} procesada.")
+            except KeyboardInterrupt:
+                self.stdout.write("Worker detenido.")
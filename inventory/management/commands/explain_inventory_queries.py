@@ -0,0 +1,57 @@
+from itertools import combinations
+
+from django.core.management.base import BaseCommand
+
+from inventory.filters import ALLOWED_ORDER, filter_products
+from inventory.models import Product
+
+# Un valor de ejemplo por filtro del buscador (mismos nombres que los parámetros GET)
+SAMPLE_FILTERS = {
+    "category": {"category": "limpieza"},
+    "supplier": {"supplier": "Norma"},
+    "price": {"min_price": "1000", "max_price": "50000"},
+    "in_stock": {"in_stock": "yes"},
+}
+
+
+class Command(BaseCommand):
+    help = "Imprime EXPLAIN QUERY PLAN de las consultas del buscador de inventario y marca los full scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all-orders", action="store_true",
+                            help="Combinar cada conjunto de filtros con todos los órdenes (por defecto solo 'name').")
+
+    def handle(self, *args, **options):
+        orders = sorted(ALLOWED_ORDER) if options["all_orders"] else ["name"]
+        cases = []
+        for size in range(len(SAMPLE_FILTERS) + 1):
+            for names in combinations(SAMPLE_FILTERS, size):
+                params = {}
+                for name in names:
+                    params.update(SAMPLE_FILTERS[name])
+                for order_by in orders:
+                    label = f"{'+'.join(names) or 'sin filtros'} / {order_by}"
+                    cases.append((label, filter_products({**params, "order_by": order_by})))
+        if not options["all_orders"]:
+            for order_by in sorted(ALLOWED_ORDER - {"name"}):
+                cases.append((f"sin filtros / {order_by}", filter_products({"order_by": order_by})))
+
+        # Las opciones de los <select> del formulario
+        cases.append(("DISTINCT category", Product.objects.order_by("category").values_list("category").distinct()))
+        cases.append(("DISTINCT supplier", Product.objects.order_by("supplier").values_list("supplier").distinct()))
+
+        full_scans = 0
+        for label, qs in cases:
+            plan = qs.explain()
+            scan = any(
+                line.strip().lstrip("-`| ").startswith("SCAN inventory_product") and "USING" not in line
+                for line in plan.splitlines()
+            )
+            full_scans += scan
+            header = self.style.WARNING(f"{label}  ← FULL SCAN") if scan else self.style.SUCCESS(label)
+            self.stdout.write(header)
+            self.stdout.write(plan)
+            self.stdout.write("")
+
+        summary = f"{len(cases)} consultas, {full_scans} con full scan."
+        self.stdout.write(self.style.WARNING(summary) if full_scans else self.style.SUCCESS(summary))
@@ -0,0 +1,50 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from inventory.exports import claim_job, purge_jobs, run_job
+from inventory.models import ExportJob
+from invoices.pdf import render_pending
+
+
+class Command(BaseCommand):
+    help = "Genera en segundo plano las exportaciones solicitadas (PDF de inventario, ...) y los PDFs de las facturas nuevas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll-interval", type=float, default=2.0,
+                            help="Segundos de espera cuando no hay trabajos.")
+        parser.add_argument("--purge-after", type=float, default=24,
+                            help="Horas que se conservan los archivos generados.")
+        parser.add_argument("--once", action="store_true",
+                            help="Procesar los trabajos pendientes y terminar.")
+
+    def handle(self, *args, **options):
+        keep = timedelta(hours=options["purge_after"])
+        last_purge = 0.0
+        try:
+            while True:
+                if time.monotonic() - last_purge > 600:
+                    purged = purge_jobs(keep)
+                    if purged:
+                        self.stdout.write(f"{purged} exportaciones antiguas eliminadas.")
+                    last_purge = time.monotonic()
+
+                job = claim_job()
+                if job is None:
+                    # sin exportaciones en espera: PDFs de facturas emitidas que aún no lo tienen
+                    stored = render_pending()
+                    if stored:
+                        self.stdout.write(f"{stored} PDFs de facturas generados.")
+                        continue
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+                job = run_job(job)
+                if job.status == ExportJob.DONE:
+                    self.stdout.write(self.style.SUCCESS(f"{job.kind} {job.id}: listo"))
+                else:
+                    self.stdout.write(self.style.WARNING(f"{job.kind} {job.id}: {job.error}"))
+        except KeyboardInterrupt:
+            self.stdout.write("Worker detenido.")
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.importer import BATCH_SIZE, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = "Importa productos desde un archivo CSV o JSON (el nombre identifica al producto)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Archivo .csv o .json")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--no-update", action="store_true",
+                            help="No modificar los productos que ya existen.")
+        parser.add_argument("--max-errors", type=int, default=50,
+                            help="Errores por fila que se imprimen.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            with open(path, "rb") as file:
+                result = import_products(
+                    read_rows(file, path),
+                    batch_size=max(1, options["batch_size"]),
+                    update_existing=not options["no_update"],
+                )
+        except (OSError, ValueError, UnicodeDecodeError) as exc:
+            raise CommandError(f"No se pudo leer {path}: {exc}")
+
+        for row_number, message in result.errors[:options["max_errors"]]:
+            self.stdout.write(self.style.WARNING(f"Fila {row_number}: {message}"))
+        if len(result.errors) > options["max_errors"]:
+            self.stdout.write(f"… y {len(result.errors) - options['max_errors']} errores más.")
+        summary = (f"{result.created} creados, {result.updated} actualizados, "
+                   f"{result.skipped} omitidos, {len(result.errors)} con errores.")
+        self.stdout.write(self.style.WARNING(summary) if result.errors else self.style.SUCCESS(summary))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from inventory.llm import cache_stats, prune_cache, reset_stats
+from inventory.models import LLMCacheEntry
+
+
+class Command(BaseCommand):
+    help = "Muestra el estado de la caché de respuestas de OpenAI y permite limpiarla."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prune", action="store_true",
+                            help="Eliminar entradas vencidas y aplicar el límite LRU.")
+        parser.add_argument("--clear", action="store_true",
+                            help="Vaciar la caché por completo y reiniciar los contadores.")
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            deleted, _ = LLMCacheEntry.objects.all().delete()
+            reset_stats()
+            self.stdout.write(f"{deleted} entradas eliminadas.")
+        elif options["prune"]:
+            prune_cache()
+
+        stats = cache_stats()
+        self.stdout.write(f"Entradas: {stats['entries']}")
+        self.stdout.write(f"Hits: {stats['hits']}  Misses: {stats['misses']}")
+        if stats["hit_rate"] is not None:
+            self.stdout.write(f"Tasa de aciertos: {stats['hit_rate']:.1%}")
@@ -0,0 +1,37 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+from inventory.search import install_fts, uninstall_fts
+
+
+def forwards(apps, schema_editor):
+    install_fts(schema_editor.connection)
+
+
+def backwards(apps, schema_editor):
+    uninstall_fts(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_llmcacheentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='inventory.product')),
+                ('name', models.TextField()),
+                ('description', models.TextField()),
+                ('category', models.TextField()),
+                ('supplier', models.TextField()),
+            ],
+            options={
+                'db_table': 'inventory_product_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,4 +1,10 @@
+import uuid
+
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .images import ContentAddressedStorage, product_image_path
 
 class Product(models.Model):
 
@@ -17,13 +23,51 @@ class Product(models.Model):
     min_stock = models.PositiveIntegerField(default=5)
     supplier = models.CharField(max_length=200, blank=True, null=True)
     quantity = models.PositiveIntegerField(default=0)
-    image = models.ImageField(upload_to='products/', blank=True, null=True)
+    image = models.ImageField(upload_to=product_image_path, storage=ContentAddressedStorage(), blank=True, null=True)
+    image_hash = models.CharField(max_length=64, blank=True, default="")   # "" = versiones pendientes
+    image_renditions = models.JSONField(blank=True, default=dict)           # {"card": ruta, "pdf": ..., "detail": ...}
+    # Marca de última modificación (huella de las exportaciones en caché). Los
+    # update() masivos que cambian datos visibles deben actualizarla a mano.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     expiration_date = models.DateField(blank=True, null=True)
     price_suggestion = models.DecimalField(max_digits=10, blank=True, null=True, decimal_places=2, default=0.00)
     product_assigned_suggestions = models.CharField(max_length=5000,default="Blank", null = True, blank=True)
 
+    class Meta:
+        # Caminos de acceso del buscador de inventario (ver inventory/filters.py y
+        # manage.py explain_inventory_queries)
+        indexes = [
+            models.Index(fields=["category", "name"], name="product_category_name_idx"),
+            models.Index(fields=["category", "price"], name="product_category_price_idx"),
+            models.Index(fields=["price"], name="product_price_idx"),
+            models.Index(fields=["quantity"], name="product_quantity_idx"),
+            models.Index(fields=["supplier"], name="product_supplier_idx"),
+            # filtro de proveedor sin distinguir mayúsculas: LOWER(supplier) = LOWER(%s)
+            models.Index(Lower("supplier"), name="product_supplier_ci_idx"),
+        ]
+
     def __str__(self):
         return self.name
+
+    def rendition_url(self, key):
+        """
+        URL de la versión redimensionada ``key``, o "" mientras no exista. La
+        original no se enlaza nunca: conserva los metadatos EXIF (p. ej. GPS).
+        """
+        path = (self.image_renditions or {}).get(key) if self.image else None
+        return self.image.storage.url(path) if path else ""
+
+    @property
+    def card_image_url(self):
+        return self.rendition_url("card")
+
+    @property
+    def pdf_image_url(self):
+        return self.rendition_url("pdf")
+
+    @property
+    def detail_image_url(self):
+        return self.rendition_url("detail")
     
 class Supplier(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -41,3 +85,115 @@ class Supplier(models.Model):
     def __str__(self):
         return self.name  
 
+
+
+class EnrichmentTask(models.Model):
+    """Cola persistente de enriquecimiento con IA (precio sugerido y sugerencias de manejo)."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pendiente"),
+        (RUNNING, "En proceso"),
+        (DONE, "Completada"),
+        (FAILED, "Fallida"),
+    ]
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name="enrichment_task")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product} ({self.status})"
+
+
+class LLMCacheEntry(models.Model):
+    """Respuesta de OpenAI guardada por hash de (modelo, mensajes, temperatura, max_tokens)."""
+
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=50)
+    response = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.model} {self.key[:12]} ({self.hits} hits)"
+
+
+class LLMCacheCounter(models.Model):
+    """
+    Contadores globales de la caché de OpenAI ("hits" y "misses"). Se guardan en
+    la base de datos para que ``manage.py llm_cache`` vea los de todos los procesos.
+    """
+
+    name = models.CharField(max_length=20, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class ProductSearchIndex(models.Model):
+    """
+    Tabla FTS5 ``inventory_product_fts`` (ver search.py). La crean la migración
+    y los triggers, no Django: el modelo existe para que search_products pueda
+    cruzarla con Product por rowid desde el ORM.
+    """
+
+    product = models.OneToOneField(Product, on_delete=models.DO_NOTHING, primary_key=True,
+                                   db_column="rowid", db_constraint=False, related_name="search_index")
+    name = models.TextField()
+    description = models.TextField()
+    category = models.TextField()
+    supplier = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = "inventory_product_fts"
+
+
+class ExportJob(models.Model):
+    """Exportación generada en segundo plano (manage.py export_worker) y cacheada por huella."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pendiente"),
+        (RUNNING, "En proceso"),
+        (DONE, "Lista"),
+        (FAILED, "Fallida"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=30)
+    fingerprint = models.CharField(max_length=64)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    file = models.FileField(upload_to="exports/", blank=True)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["fingerprint", "status"]),
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.id} ({self.status})"
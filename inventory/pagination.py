@@ -0,0 +1,155 @@
+"""
+Paginación del inventario.
+
+Además del ``Paginator`` de Django (COUNT(*) + OFFSET en cada página) hay un
+modo opcional por cursor (keyset): cada página continúa desde el último
+(valor de orden, id) visto, así que cuesta lo mismo la página 1 que la 500.
+Los cursores van firmados con ``django.core.signing`` y son opacos para el cliente.
+"""
+import hashlib
+from datetime import datetime
+from decimal import Decimal
+
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+
+DEFAULT_PER_PAGE = 9
+MAX_PER_PAGE = 60
+
+COUNT_CACHE_TIMEOUT = 60  # segundos
+_CURSOR_SALT = "inventory.pagination.cursor"
+
+# Campos de orden soportados en modo cursor; los que admiten NULL se comparan como ""
+KEYSET_FIELDS = {
+    "name": str,
+    "price": Decimal,
+    "quantity": int,
+    "supplier": str,
+    "category": str,
+}
+NULLABLE_FIELDS = {"supplier", "category"}
+
+# Parámetros GET que no cambian el conjunto de resultados
+_NON_FILTER_PARAMS = {"page", "per_page", "cursor", "pagination", "order_by"}
+
+
+def parse_per_page(value, default=DEFAULT_PER_PAGE):
+    """``per_page`` llega del GET: se valida y se limita a MAX_PER_PAGE."""
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+def cached_count(qs, params, timeout=COUNT_CACHE_TIMEOUT):
+    """
+    Total aproximado: COUNT(*) cacheado por combinación de filtros durante
+    ``timeout`` segundos en lugar de recontarlo en cada página.
+    """
+    filters = sorted((k, v) for k, v in params.items() if k not in _NON_FILTER_PARAMS)
+    digest = hashlib.md5(repr(filters).encode("utf-8")).hexdigest()
+    return cache.get_or_set(f"inventory:count:{digest}", qs.count, timeout)
+
+
+class KeysetPage:
+    def __init__(self, object_list, per_page, next_cursor=None, previous_cursor=None, approximate_count=None):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.approximate_count = approximate_count
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _encode_cursor(order_by, obj, direction):
+    value = getattr(obj, "keyset_value")
+    if isinstance(value, Decimal):
+        value = str(value)
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    payload = {"o": order_by, "v": value, "id": obj.pk, "d": direction}
+    return signing.dumps(payload, salt=_CURSOR_SALT, compress=True)
+
+
+def _decode_cursor(cursor, order_by, fields):
+    if not cursor:
+        return None
+    try:
+        payload = signing.loads(cursor, salt=_CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+    # Un cursor de otro orden no sirve: se vuelve a la primera página
+    if payload.get("o") != order_by or payload.get("d") not in ("next", "prev"):
+        return None
+    try:
+        payload["v"] = fields[order_by.lstrip("-")](payload["v"])
+    except (TypeError, ValueError, ArithmeticError):
+        return None
+    return payload
+
+
+def keyset_paginate(qs, order_by, cursor=None, per_page=DEFAULT_PER_PAGE,
+                    fields=KEYSET_FIELDS, nullable=NULLABLE_FIELDS):
+    """
+    Devuelve un ``KeysetPage`` de ``qs`` ordenado por ``order_by`` (con ``id``
+    como desempate). ``order_by`` debe ser una clave de ``fields`` (campo ->
+    conversión del valor guardado en el cursor), con o sin "-"; si no lo es se
+    usa la primera. Por defecto, los campos del inventario.
+    """
+    field = order_by.lstrip("-")
+    if field not in fields:
+        field = order_by = next(iter(fields))
+    descending = order_by.startswith("-")
+    expr = Coalesce(field, Value("")) if field in nullable else F(field)
+    qs = qs.annotate(keyset_value=expr)
+
+    position = _decode_cursor(cursor, order_by, fields)
+    backwards = position is not None and position["d"] == "prev"
+    # Hacia atrás se recorre en el orden inverso y luego se da vuelta la página
+    scan_desc = descending != backwards
+
+    if position is not None:
+        value, pk = position["v"], position["id"]
+        # El primer término (<= / >=) deja que la base de datos empiece a leer el
+        # índice (campo, id) justo en el cursor en vez de recorrerlo desde el inicio
+        if scan_desc:
+            qs = qs.filter(Q(keyset_value__lte=value), Q(keyset_value__lt=value) | Q(id__lt=pk))
+        else:
+            qs = qs.filter(Q(keyset_value__gte=value), Q(keyset_value__gt=value) | Q(id__gt=pk))
+
+    ordering = ("-keyset_value", "-id") if scan_desc else ("keyset_value", "id")
+    rows = list(qs.order_by(*ordering)[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if backwards:
+        rows.reverse()
+        has_previous, has_next = has_more, True
+    else:
+        has_previous, has_next = position is not None, has_more
+
+    return KeysetPage(
+        rows,
+        per_page,
+        next_cursor=_encode_cursor(order_by, rows[-1], "next") if rows and has_next else None,
+        previous_cursor=_encode_cursor(order_by, rows[0], "prev") if rows and has_previous else None,
+    )
@@ -0,0 +1,34 @@
+"""
+Generación de PDFs con xhtml2pdf, compartida por las exportaciones.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.template.loader import get_template
+from xhtml2pdf import pisa
+
+
+def link_callback(uri, rel):
+    """
+    Permite a xhtml2pdf resolver rutas de STATIC y MEDIA.
+    """
+    if uri.startswith(settings.MEDIA_URL):
+        path = os.path.join(settings.MEDIA_ROOT, uri.replace(settings.MEDIA_URL, ""))
+    elif uri.startswith(settings.STATIC_URL):
+        path = os.path.join(getattr(settings, "STATIC_ROOT", ""), uri.replace(settings.STATIC_URL, ""))
+    else:
+        return uri  # URL absoluta
+    if not os.path.isfile(path):
+        return uri
+    return path
+
+
+def render_pdf(template_name, context):
+    """Renderiza la plantilla a PDF y devuelve los bytes."""
+    html = get_template(template_name).render(context)
+    buffer = io.BytesIO()
+    result = pisa.CreatePDF(html, dest=buffer, link_callback=link_callback)
+    if result.err:
+        raise ValueError(f"xhtml2pdf no pudo generar {template_name} ({result.err} errores)")
+    return buffer.getvalue()
@@ -0,0 +1,164 @@
+"""
+Búsqueda de texto libre del inventario con SQLite FTS5.
+
+La tabla virtual ``inventory_product_fts`` replica name/description/category/
+supplier de ``inventory_product`` (tabla de contenido externo) y se mantiene
+sincronizada con triggers. El tokenizador ``unicode61 remove_diacritics 2``
+hace que "peluqueria" encuentre "Peluquería" y viceversa.
+
+Si la base de datos no es SQLite o no tiene FTS5 se usa el filtro ``icontains``
+de siempre.
+"""
+import logging
+import re
+
+from django.db import connections, OperationalError
+from django.db.models import BooleanField, F, FloatField, Func, Q, Value
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "inventory_product_fts"
+FTS_COLUMNS = ("name", "description", "category", "supplier")
+# Peso de cada columna en el ranking bm25 (mismo orden que FTS_COLUMNS)
+FTS_WEIGHTS = (10.0, 1.0, 2.0, 2.0)
+
+_COLS = ", ".join(FTS_COLUMNS)
+_NEW = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+_OLD = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+
+CREATE_TABLE_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    {_COLS},
+    content='inventory_product', content_rowid='id',
+    tokenize="unicode61 remove_diacritics 2",
+    prefix='2 3'
+)"""
+
+TRIGGERS_SQL = {
+    f"{FTS_TABLE}_ai": f"""
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON inventory_product BEGIN
+    INSERT INTO {FTS_TABLE}(rowid, {_COLS}) VALUES (new.id, {_NEW});
+END""",
+    f"{FTS_TABLE}_ad": f"""
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON inventory_product BEGIN
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_COLS}) VALUES ('delete', old.id, {_OLD});
+END""",
+    f"{FTS_TABLE}_au": f"""
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {_COLS} ON inventory_product BEGIN
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_COLS}) VALUES ('delete', old.id, {_OLD});
+    INSERT INTO {FTS_TABLE}(rowid, {_COLS}) VALUES (new.id, {_NEW});
+END""",
+}
+
+_available = set()  # alias de bases de datos donde ya se verificó el índice
+
+
+def install_fts(connection):
+    """
+    Crea la tabla FTS y sus triggers si faltan, y reconstruye el índice cuando
+    hubo que crearlos. Es idempotente: Django recrea ``inventory_product`` en
+    algunas migraciones de SQLite y eso borra los triggers, por eso también se
+    llama tras cada ``migrate`` (ver signals.py).
+    """
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+                       [f"{FTS_TABLE}%"])
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [name for name in TRIGGERS_SQL if name not in existing]
+        if FTS_TABLE in existing and not missing:
+            return True
+        try:
+            cursor.execute(CREATE_TABLE_SQL)
+        except OperationalError as exc:  # SQLite compilado sin FTS5
+            logger.warning("No se pudo crear el índice FTS5 de productos: %s", exc)
+            return False
+        for name in TRIGGERS_SQL:
+            cursor.execute(TRIGGERS_SQL[name])
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def uninstall_fts(connection):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name in TRIGGERS_SQL:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _available.discard(connection.alias)
+
+
+def fts_available(alias="default"):
+    if alias in _available:
+        return True
+    connection = connections[alias]
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        if cursor.fetchone() is None:
+            return False
+    _available.add(alias)
+    return True
+
+
+def build_match_query(q):
+    """
+    "útiles jab" -> '"útiles"* "jab"*': cada palabra como prefijo y todas
+    obligatorias. Las comillas evitan que el texto se interprete como sintaxis FTS.
+    """
+    terms = re.findall(r"\w+", q or "")
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+class _FTSExpression(Func):
+    """
+    Expresión sobre la fila de ``inventory_product_fts`` que el ORM cruza con el
+    producto (``Product.search_index``). FTS5 exige el nombre de la tabla, no una
+    columna, en MATCH y bm25(), así que se usa el alias del JOIN.
+    """
+
+    def __init__(self, *expressions):
+        super().__init__(F("search_index__name"), *expressions)
+
+    def fts_table(self, connection):
+        return connection.ops.quote_name(self.get_source_expressions()[0].alias)
+
+
+class FTSMatch(_FTSExpression):
+    output_field = BooleanField()
+
+    def __init__(self, match):
+        super().__init__(Value(match))
+
+    def as_sql(self, compiler, connection):
+        match_sql, params = compiler.compile(self.get_source_expressions()[1])
+        return f"{self.fts_table(connection)} MATCH {match_sql}", params
+
+
+class FTSRank(_FTSExpression):
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection):
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        return f"bm25({self.fts_table(connection)}, {weights})", []
+
+
+def search_products(qs, q, use_fts=True):
+    """
+    Filtra ``qs`` por el texto ``q`` y anota ``search_rank`` (menor = más relevante).
+    """
+    match = build_match_query(q)
+    if use_fts and match and fts_available(qs.db):
+        # JOIN por rowid: SQLite resuelve el MATCH una sola vez y cruza por clave
+        # primaria. isnull=False hace el JOIN interno, que MATCH necesita.
+        return qs.filter(FTSMatch(match), search_index__isnull=False).annotate(search_rank=FTSRank())
+
+    return qs.filter(
+        Q(name__icontains=q) |
+        Q(description__icontains=q) |
+        Q(category__icontains=q) |
+        Q(supplier__icontains=q)
+    ).annotate(search_rank=Value(0.0, output_field=FloatField()))
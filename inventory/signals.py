@@ -0,0 +1,57 @@
+from django.db import connections, transaction
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
+from django.dispatch import receiver
+from .models import Product
+from .enrichment import SOURCE_FIELDS, enqueue_product
+from .facets import invalidate_facets
+from .search import install_fts
+
+
+@receiver(pre_save, sender=Product)
+def detectar_cambios_producto(sender, instance, update_fields=None, **kwargs):
+    """
+    Si cambian los datos que usa la IA, las sugerencias guardadas dejan de valer;
+    si cambia la imagen, hay que volver a generar sus versiones.
+    """
+    instance._enrichment_dirty = False
+    if instance._state.adding or instance.pk is None:
+        return
+    watched = set(SOURCE_FIELDS) | {"image"}
+    if update_fields is not None and not set(update_fields) & watched:
+        return
+
+    previous = Product.objects.filter(pk=instance.pk).values(*watched).first()
+    if previous is None:
+        return
+    if any(previous[field] != getattr(instance, field) for field in SOURCE_FIELDS):
+        instance._enrichment_dirty = True
+        instance.price_suggestion = 0
+        instance.product_assigned_suggestions = "Blank"
+    if (previous["image"] or "") != (instance.image.name or ""):
+        instance.image_hash = ""
+        instance.image_renditions = {}
+
+
+@receiver(post_save, sender=Product)
+def encolar_enriquecimiento(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created or getattr(instance, "_enrichment_dirty", False):
+        enqueue_product(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidar_facetas(sender, **kwargs):
+    # Después del commit, para que otra request no vuelva a cachear el estado anterior
+    transaction.on_commit(invalidate_facets)
+
+
+@receiver(post_migrate)
+def reparar_indice_busqueda(sender, using="default", **kwargs):
+    """SQLite recrea inventory_product en algunas migraciones y se pierden los triggers FTS."""
+    if sender.name != "inventory":
+        return
+    connection = connections[using]
+    if Product._meta.db_table in connection.introspection.table_names():
+        install_fts(connection)
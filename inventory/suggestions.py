@@ -1,13 +1,4 @@
-import os
-from openai import OpenAI
-import json
-from dotenv import load_dotenv, find_dotenv
-
-_ = load_dotenv('openAI.env')
-client = OpenAI(
-    # This is the default and can be omitted
-    api_key=os.environ.get('openAI_api_key'),
-)
+from .llm import chat
 
 def assign_suggestions(product_name, product_category, product_description, model="gpt-4o-mini"):
     
@@ -20,13 +11,12 @@ def assign_suggestions(product_name, product_category, product_description, mode
     Please focus on ensuring product integrity during handling, complying with relevant safety standards, and optimizing efficiency in logistics and storage. The answer must not have more than 300 words."""
     
     messages = [{"role": "user", "content": prompt}]
-    response = client.chat.completions.create(
+    return chat(
+        messages,
         model=model,
-        messages=messages,
         temperature = 0,
         max_tokens = 500,
     )
-    return response.choices[0].message.content
     
 def suggest_price(product_name, product_category, product_description, model="gpt-4o-mini"):
     
@@ -39,10 +29,9 @@ def suggest_price(product_name, product_category, product_description, model="gp
         Please consider factors such as brand reputation, quality, and product features when suggesting a price. The answer must be just the price suggested without symbols or another information."""
     
     messages = [{"role": "user", "content": prompt}]
-    response = client.chat.completions.create(
+    return chat(
+        messages,
         model=model,
-        messages=messages,
         temperature = 0.6,
         max_tokens = 500,
-    )
-    return response.choices[0].message.content
\ No newline at end of file
+    )
\ No newline at end of file
@@ -1,3 +1,462 @@
-from django.test import TestCase
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from . import enrichment, exports, llm
+from .facets import get_facets, invalidate_facets
+from .exports import CSV_COLUMNS
+from .filters import filter_products
+from .pagination import keyset_paginate, parse_per_page
+from .search import fts_available
+from .models import EnrichmentTask, ExportJob, LLMCacheEntry, Product
+
+
+class EnrichmentQueueTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="Jabón", category="limpieza", description="x")
+
+    def run_worker(self, **patches):
+        with mock.patch.multiple(enrichment, **patches):
+            call_command("enrichment_worker", "--once", "--concurrency", "1", stdout=StringIO())
+
+    def test_new_product_is_queued_and_shown_as_pending(self):
+        self.assertEqual(EnrichmentTask.objects.get(product=self.product).status, EnrichmentTask.PENDING)
+        self.assertContains(self.client.get("/inventory/"), "Pendiente")
+
+    def test_worker_saves_suggestions(self):
+        self.run_worker(suggest_price=mock.Mock(return_value="12.500"),
+                        assign_suggestions=mock.Mock(return_value="Guardar seco"))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price_suggestion, Decimal("12500.00"))
+        self.assertEqual(self.product.product_assigned_suggestions, "Guardar seco")
+        self.assertEqual(EnrichmentTask.objects.get(product=self.product).status, EnrichmentTask.DONE)
+
+    def test_only_relevant_changes_requeue(self):
+        self.run_worker(suggest_price=mock.Mock(return_value="1"), assign_suggestions=mock.Mock(return_value="-"))
+        self.product.quantity += 1
+        self.product.save()
+        self.assertEqual(EnrichmentTask.objects.get(product=self.product).status, EnrichmentTask.DONE)
+
+        self.product.description = "y"
+        self.product.save()
+        self.assertEqual(EnrichmentTask.objects.get(product=self.product).status, EnrichmentTask.PENDING)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.product_assigned_suggestions, "Blank")
+
+    def test_failure_is_retried(self):
+        self.run_worker(suggest_price=mock.Mock(side_effect=RuntimeError("boom")))
+        task = EnrichmentTask.objects.get(product=self.product)
+        self.assertEqual((task.status, task.attempts), (EnrichmentTask.PENDING, 1))
+
+    def test_parse_price(self):
+        self.assertEqual(enrichment.parse_price("$ 25,000"), enrichment.parse_price("25000"))
+        self.assertEqual(enrichment.parse_price("1999.5"), Decimal("1999.50"))
+
+
+def fake_openai(content, finish_reason="stop"):
+    client = mock.MagicMock()
+    client.chat.completions.create.return_value = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)]
+    )
+    return client
+
+
+class LLMCacheTests(TestCase):
+    @override_settings(LLM_CACHE_MAX_ENTRIES=2, LLM_CACHE_PRUNE_EVERY=1)
+    def test_identical_requests_hit_the_cache(self):
+        client = fake_openai("hola")
+        with mock.patch.object(llm, "get_client", return_value=client):
+            for _ in range(3):
+                self.assertEqual(llm.chat([{"role": "user", "content": "a"}]), "hola")
+            self.assertEqual(client.chat.completions.create.call_count, 1)
+
+            llm.chat([{"role": "user", "content": "a"}], temperature=0.5)
+            llm.chat([{"role": "user", "content": "b"}])
+            self.assertEqual(client.chat.completions.create.call_count, 3)
+
+        self.assertEqual(LLMCacheEntry.objects.count(), 2)
+        stats = llm.cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 3))
+        self.assertAlmostEqual(stats["hit_rate"], 0.4)
+
+    @override_settings(LLM_CACHE_MAX_ENTRIES=1, LLM_CACHE_PRUNE_EVERY=3)
+    def test_prune_runs_every_n_writes(self):
+        with mock.patch.object(llm, "_writes", itertools.count(1)), \
+                mock.patch.object(llm, "get_client", return_value=fake_openai("hola")):
+            llm.chat([{"role": "user", "content": "a"}])
+            llm.chat([{"role": "user", "content": "b"}])
+            self.assertEqual(LLMCacheEntry.objects.count(), 2)
+            llm.chat([{"role": "user", "content": "c"}])
+        self.assertEqual(LLMCacheEntry.objects.count(), 1)
+
+    def test_truncated_responses(self):
+        with mock.patch.object(llm, "get_client", return_value=fake_openai('{"a": [1,', "length")):
+            self.assertEqual(llm.chat([{"role": "user", "content": "a"}]), '{"a": [1,')
+            with self.assertRaises(llm.ResponseTruncated):
+                llm.chat([{"role": "user", "content": "b"}], allow_truncated=False)
+        self.assertEqual(LLMCacheEntry.objects.count(), 1)  # la cortada no se guardó
+
+    def test_command_reports_persisted_counters(self):
+        with mock.patch.object(llm, "get_client", return_value=fake_openai("hola")):
+            llm.chat([{"role": "user", "content": "a"}])
+            llm.chat([{"role": "user", "content": "a"}])
+        out = StringIO()
+        call_command("llm_cache", stdout=out)
+        self.assertIn("Hits: 1  Misses: 1", out.getvalue())
+        self.assertIn("50.0%", out.getvalue())
+
+        call_command("llm_cache", "--clear", stdout=StringIO())
+        self.assertEqual(llm.cache_stats()["misses"], 0)
+
+
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        Product.objects.create(name="Tijeras Peluquería", category="peluqueria", description="acero")
+        Product.objects.create(name="Cuaderno", category="utiles", description="útiles rayado peluqueria",
+                               supplier="Norma")
+        self.soap = Product.objects.create(name="Jabón", category="limpieza", supplier="Áxion")
+
+    def names(self, q, **params):
+        return [p.name for p in filter_products({"q": q, **params})]
+
+    def test_search_is_ranked_and_accent_insensitive(self):
+        self.assertTrue(fts_available())
+        self.assertEqual(self.names("peluqueria"), ["Tijeras Peluquería", "Cuaderno"])
+        self.assertEqual(self.names("peluqueria", order_by="name"), ["Cuaderno", "Tijeras Peluquería"])
+        self.assertEqual(self.names("útiles"), ["Cuaderno"])
+        self.assertEqual(self.names("jab"), ["Jabón"])
+        self.assertEqual(self.names("axion"), ["Jabón"])
+        self.assertEqual(self.names('"; DROP'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.soap.name = "Detergente"
+        self.soap.save()
+        self.assertEqual(self.names("jab"), [])
+        self.assertEqual(self.names("deter"), ["Detergente"])
+        self.soap.delete()
+        self.assertEqual(self.names("axion"), [])
+
+    def test_inventory_page_uses_the_search(self):
+        self.assertContains(self.client.get("/inventory/?q=cuad"), "Cuaderno")
+
+
+class KeysetPaginationTests(TestCase):
+    ORDERS = ["name", "-name", "price", "-price", "quantity", "-quantity",
+              "supplier", "-supplier", "category", "-category"]
+
+    def setUp(self):
+        for i in range(23):
+            Product.objects.create(name=f"P{i:02d}", price=i % 5, quantity=i % 3,
+                                   supplier=None if i % 4 == 0 else f"S{i % 3}",
+                                   category=["utiles", None][i % 2])
+
+    def page(self, order, cursor):
+        return keyset_paginate(filter_products({"order_by": order}), order, cursor, 5)
+
+    def test_walks_every_order_forwards_and_back(self):
+        for order in self.ORDERS:
+            with self.subTest(order=order):
+                pages = [self.page(order, None)]
+                while pages[-1].has_next:
+                    pages.append(self.page(order, pages[-1].next_cursor))
+                seen = [p.id for page in pages for p in page]
+                self.assertEqual(len(seen), 23)
+                self.assertEqual(len(set(seen)), 23)
+
+                back, page = [], pages[-1]
+                while page.has_previous:
+                    page = self.page(order, page.previous_cursor)
+                    back = [p.id for p in page] + back
+                self.assertEqual(back, seen[:20])
+
+    def test_parse_per_page(self):
+        self.assertEqual(parse_per_page("100000"), 60)
+        self.assertEqual(parse_per_page("x"), 9)
+
+    def test_view(self):
+        response = self.client.get("/inventory/?pagination=cursor&per_page=5&order_by=-price")
+        self.assertContains(response, "≈ 23 productos")
+        self.assertContains(response, "cursor=")
+        self.assertEqual(self.client.get("/inventory/?pagination=cursor&cursor=garbage&page=abc").status_code, 200)
+        self.assertEqual(self.client.get("/inventory/?per_page=abc&page=abc").status_code, 200)
+
+
+class SupplierFilterTests(TestCase):
+    def test_supplier_filter_is_case_insensitive(self):
+        Product.objects.create(name="a", supplier="Norma")
+        Product.objects.create(name="b", supplier="NORMA")
+        Product.objects.create(name="c", supplier="Otro")
+        self.assertEqual([p.name for p in filter_products({"supplier": "norma"})], ["a", "b"])
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        invalidate_facets()  # la caché en memoria sobrevive entre pruebas
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="a", category="limpieza", supplier="N", quantity=0)
+            Product.objects.create(name="b", category="limpieza", supplier="N", quantity=3)
+
+    def test_counts(self):
+        facets = get_facets()
+        self.assertEqual([(c["label"], c["count"], c["in_stock"]) for c in facets["categories"]],
+                         [("Limpieza", 2, 1)])
+        self.assertEqual([(s["value"], s["count"]) for s in facets["suppliers"]], [("N", 2)])
+
+    def test_warm_read_makes_no_queries(self):
+        get_facets()
+        with self.assertNumQueries(0):
+            get_facets()
+
+    def test_writes_invalidate(self):
+        get_facets()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="c", category="utiles", supplier="M", quantity=3)
+        self.assertEqual(len(get_facets()["categories"]), 2)
+        self.assertContains(self.client.get("/inventory/"), "Limpieza (2)")
+
+
+def png_bytes(color="red"):
+    buffer = BytesIO()
+    Image.new("RGBA", (1200, 800), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, name, data):
+        return self.client.post("/product-entry/", {
+            "name": name, "category": "utiles", "price": "1", "quantity": "1",
+            "image": SimpleUploadedFile("foto.png", data, content_type="image/png"),
+        })
+
+    def run_worker(self):
+        with mock.patch.multiple(enrichment, suggest_price=mock.Mock(return_value="1"),
+                                 assign_suggestions=mock.Mock(return_value="-")):
+            call_command("enrichment_worker", "--once", "--concurrency", "1", stdout=StringIO())
+
+    def test_identical_uploads_share_one_file(self):
+        data = png_bytes()
+        for name in ("a", "b"):
+            self.assertEqual(self.upload(name, data).status_code, 200)
+        a, b = Product.objects.order_by("name")
+        self.assertEqual(a.image.name, b.image.name)
+        self.assertEqual(a.image_hash, "")
+        self.assertEqual(a.card_image_url, "")  # la original (con EXIF) no se enlaza
+
+    def test_worker_generates_renditions(self):
+        self.upload("a", png_bytes())
+        self.run_worker()
+        product = Product.objects.get()
+        self.assertEqual(set(product.image_renditions), {"card", "pdf", "detail"})
+        self.assertTrue(product.card_image_url.endswith("card.webp"))
+
+        card = Image.open(os.path.join(self.media, product.image_renditions["card"]))
+        self.assertEqual((card.size, card.format, dict(card.getexif())), ((400, 267), "WEBP", {}))
+        pdf = Image.open(os.path.join(self.media, product.image_renditions["pdf"]))
+        self.assertEqual((pdf.size, pdf.format), ((200, 133), "JPEG"))
+
+        product.image = SimpleUploadedFile("x.png", png_bytes("green"))
+        product.save()
+        product.refresh_from_db()
+        self.assertEqual(product.image_hash, "")
+
+    def test_legacy_and_missing_files(self):
+        os.makedirs(os.path.join(self.media, "products"))
+        with open(os.path.join(self.media, "products", "old.png"), "wb") as f:
+            f.write(png_bytes("blue"))
+        legacy = Product.objects.create(name="c", image="products/old.png")
+        shared = Product.objects.create(name="c2", image="products/old.png")
+        Product.objects.create(name="d", image="products/missing.png")
+
+        enrichment.process_image(legacy.pk)
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.image.name, f"products/{legacy.image_hash[:2]}/{legacy.image_hash}.png")
+        self.assertTrue(os.path.exists(os.path.join(self.media, "products", "old.png")))  # c2 aún la usa
+
+        with self.assertLogs("inventory.enrichment", "WARNING"):
+            self.run_worker()
+        shared.refresh_from_db()
+        self.assertEqual(shared.image.name, legacy.image.name)
+        self.assertFalse(os.path.exists(os.path.join(self.media, "products", "old.png")))
+
+        missing = Product.objects.get(name="d")
+        self.assertEqual((missing.image_hash, missing.image_renditions), (enrichment.IMAGE_INVALID, {}))
+        self.assertEqual(self.client.get("/inventory/").status_code, 200)
+
+
+class InventoryExportTests(TestCase):
+    def setUp(self):
+        media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media.enable()
+        self.addCleanup(shutil.rmtree, media.options["MEDIA_ROOT"], ignore_errors=True)
+        self.addCleanup(media.disable)
+        self.product = Product.objects.create(name="Jabón, azul", category="limpieza", price=10, quantity=1,
+                                              description='dice "hola"')
+
+    def test_pdf_is_rendered_once_by_the_worker(self):
+        response = self.client.get("/inventory/pdf/?q=jab")
+        self.assertEqual(response.status_code, 302)
+        self.client.get("/inventory/pdf/?q=jab")
+        job = ExportJob.objects.get()
+        self.assertEqual(self.client.get(f"/exports/{job.id}/?format=json").json()["status"], ExportJob.PENDING)
+        self.assertContains(self.client.get(f"/exports/{job.id}/"), "Generando")
+
+        call_command("export_worker", "--once", stdout=StringIO())
+        status = self.client.get(f"/exports/{job.id}/?format=json").json()
+        self.assertEqual((status["status"], status["download_url"]),
+                         (ExportJob.DONE, f"/exports/{job.id}/download/"))
+
+        response = self.client.get("/inventory/pdf/?q=jab")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="inventario.pdf"')
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+    def test_changes_invalidate_the_pdf(self):
+        self.client.get("/inventory/pdf/?q=jab")
+        call_command("export_worker", "--once", stdout=StringIO())
+        self.product.quantity = 5
+        self.product.save()
+        self.assertEqual(self.client.get("/inventory/pdf/?q=jab").status_code, 302)
+        self.assertEqual(ExportJob.objects.count(), 2)
+
+    def test_worker_updates_move_the_catalog_marker(self):
+        self.product.image = SimpleUploadedFile("x.png", png_bytes())
+        self.product.save()
+        Product.objects.filter(pk=self.product.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        before = exports.catalog_marker()
+        self.assertTrue(enrichment.process_image(self.product.pk))
+        self.assertNotEqual(exports.catalog_marker(), before)
+
+class CsvExportTests(TestCase):
+    HEADER = "Producto{0}Categoría{0}Proveedor{0}Precio{0}Stock{0}Stock mínimo{0}Vencimiento{0}Descripción\r\n"
+
+    def setUp(self):
+        Product.objects.create(name="Jabón, azul", category="limpieza", price=10, quantity=1,
+                               description='dice "hola"')
+        Product.objects.create(name="Cuaderno", category="utiles", price=3, quantity=0)
+
+    def get(self, query):
+        return b"".join(self.client.get(f"/inventory/csv/?{query}").streaming_content).decode()
+
+    def test_filtered_export_with_semicolons(self):
+        self.assertEqual(self.get("q=jab&sep=semicolon"),
+                         "\ufeff" + self.HEADER.format(";") + 'Jabón, azul;limpieza;;10.00;1;5;;"dice ""hola"""\r\n')
+
+    def test_sorted_export_quotes_commas(self):
+        self.assertEqual(self.get("order_by=-price"),
+                         "\ufeff" + self.HEADER.format(",")
+                         + '"Jabón, azul",limpieza,,10.00,1,5,,"dice ""hola"""\r\n'
+                         + "Cuaderno,utiles,,3.00,0,5,,\r\n")
+
+    def test_formulas_are_neutralized(self):
+        Product.objects.create(name="=HYPERLINK(\"http://x\")", category="utiles", supplier="@proveedor",
+                               price=1, quantity=2, description="-2+3")
+        self.assertEqual(self.get("q=hyperlink").splitlines()[1],
+                         '"\'=HYPERLINK(""http://x"")",utiles,\'@proveedor,1.00,2,5,,\'-2+3')
+
+IMPORT_CSV = """Producto;Categoría;Proveedor;Precio;Stock;Stock mínimo;Vencimiento;Descripción
+Jabón;limpieza;Familia;10.00;3;2;2030-01-01;barra
+Lápiz;utiles;Norma;2;1;;;
+Malo;xx;;abc;1;5;;
+Lápiz;utiles;Norma;3;1;5;;
+Leche;alimentos;;2;1;5;;
+Borrador;utiles;;1;1;-1;;
+""".encode("utf-8-sig")
+
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        self.pencil = Product.objects.create(name="Lápiz", category="utiles", price=1, quantity=0, min_stock=8,
+                                             price_suggestion=5, product_assigned_suggestions="x")
+        EnrichmentTask.objects.update(status=EnrichmentTask.DONE)
+
+    def import_json(self, rows, *args):
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            f.write(json.dumps(rows).encode())
+        self.addCleanup(os.unlink, f.name)
+        call_command("import_products", f.name, *args, stdout=StringIO())
+
+    def test_csv_upload(self):
+        with self.assertNumQueries(7):
+            response = self.client.post("/product-import/", {
+                "file": SimpleUploadedFile("a.csv", IMPORT_CSV), "update_existing": "on",
+            })
+        result = response.context["result"]
+        self.assertEqual((result.created, result.updated), (1, 1))
+        self.assertEqual([row for row, _ in result.errors], [4, 5, 6, 7])
+        self.assertIn("min_stock", dict(result.errors)[7])
+
+        self.pencil.refresh_from_db()
+        # Sin cambios en los campos de origen se conservan las sugerencias; el
+        # stock mínimo vacío no se toca
+        self.assertEqual((self.pencil.price, self.pencil.price_suggestion, self.pencil.supplier,
+                          self.pencil.min_stock), (2, 5, "Norma", 8))
+        soap = Product.objects.get(name="Jabón")
+        self.assertEqual(soap.min_stock, 2)
+        self.assertEqual(EnrichmentTask.objects.get(product=soap).status, EnrichmentTask.PENDING)
+        self.assertContains(self.client.get("/inventory/?q=jabon"), "Jabón")
+
+    def test_json_command_resets_suggestions_on_source_changes(self):
+        self.import_json([{"name": "Lápiz", "category": "utiles", "price": "4", "quantity": 2,
+                           "min_stock": 3, "description": "HB"}, "x"])
+        self.pencil.refresh_from_db()
+        self.assertEqual((self.pencil.price, self.pencil.price_suggestion, self.pencil.description,
+                          self.pencil.min_stock), (4, 0, "HB", 3))
+        self.assertEqual(EnrichmentTask.objects.get(product=self.pencil).status, EnrichmentTask.PENDING)
+
+    def test_csv_export_round_trip(self):
+        Product.objects.create(name="=SUMA(1;2)", category="limpieza", supplier="@Familia", price=Decimal("10.50"),
+                               quantity=3, min_stock=2, expiration_date=date(2030, 1, 1),
+                               description="Larga " * 30 + 'con "comillas", y comas')
+        # Vacíos en el archivo se importan como "" (igual que en product_entry), no como NULL
+        Product.objects.filter(pk=self.pencil.pk).update(supplier="Norma", description="HB")
+        fields = [field for field, _ in CSV_COLUMNS]
+        before = list(Product.objects.order_by("name").values_list(*fields))
+        exported = b"".join(self.client.get("/inventory/csv/?sep=semicolon").streaming_content)
+
+        Product.objects.all().delete()
+        response = self.client.post("/product-import/", {"file": SimpleUploadedFile("inventario.csv", exported)})
+        self.assertEqual((response.context["result"].created, response.context["result"].errors), (2, []))
+        self.assertEqual(list(Product.objects.order_by("name").values_list(*fields)), before)
+
+    def test_no_update(self):
+        self.import_json([{"name": "Lápiz", "category": "utiles", "price": "4", "quantity": 2}], "--no-update")
+        self.pencil.refresh_from_db()
+        self.assertEqual(self.pencil.price, 1)
+
+
+class ChatManyTests(TestCase):
+    def fake_chat(self, messages, **kwargs):
+        text = messages[0]["content"]
+        if text == "falla":
+            raise RuntimeError(text)
+        return text.upper()
+
+    @override_settings(LLM_FANOUT_CONCURRENCY=3)
+    def test_results_keep_request_order_and_failures_stay_in_place(self):
+        requests = [{"messages": [{"role": "user", "content": text}]} for text in ("a", "falla", "b", "c")]
+        with mock.patch.object(llm, "chat", side_effect=self.fake_chat) as chat:
+            for concurrency in (None, 1):
+                results = llm.chat_many(requests, concurrency=concurrency)
+                self.assertEqual([results[0], results[2], results[3]], ["A", "B", "C"])
+                self.assertIsInstance(results[1], RuntimeError)
+        self.assertEqual(chat.call_count, 8)
@@ -5,6 +5,7 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('inventory/', views.inventory_display, name='inventory_display'),
     path('product-entry/', views.product_entry, name='product_entry'),
+    path('product-import/', views.product_import, name='product_import'),
     path('product-takeout/', views.product_takeout, name='product_takeout'),
     path('suppliers/', views.supplier_list, name='supplier_list'),
     path('suppliers/new/', views.supplier_entry, name='supplier_entry'),
@@ -12,4 +13,7 @@ urlpatterns = [
     path('delete-product/<int:product_id>/', views.delete_product, name='delete_product'),
     path('add-unit/<int:product_id>/', views.add_unit, name='add_unit'),
     path('inventory/pdf/', views.inventory_pdf, name='inventory_pdf'),
+    path('inventory/csv/', views.inventory_csv, name='inventory_csv'),
+    path('exports/<uuid:job_id>/', views.export_status, name='export_status'),
+    path('exports/<uuid:job_id>/download/', views.export_download, name='export_download'),
 ]
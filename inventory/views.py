@@ -1,21 +1,23 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
+from django.urls import reverse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 import os
 from django.db import transaction
 from django.db.models import Max
 import json
-from .forms import ProductEntryForm, ProductTakeoutForm, SupplierForm
-from .models import Product, Supplier
+from .forms import ProductEntryForm, ProductImportForm, ProductTakeoutForm, SupplierForm
+from .models import ExportJob, Product, Supplier
+from .exports import CSV_DELIMITERS, INVENTORY_PDF, inventory_params, iter_inventory_csv, request_export
+from .facets import get_facets
+from .importer import import_products, read_rows
+from .filters import filter_products, get_order_by
+from .pagination import KEYSET_FIELDS, cached_count, keyset_paginate, parse_per_page
 from django.contrib import messages
 from django.db.models import Q
 from django.core.paginator import Paginator
-from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from invoices.models import Factura, DetalleFactura, Venta
 from invoices.forms import FacturaForm, DetalleFacturaFormSet
-from .suggestions import suggest_price, assign_suggestions
 
 @login_required
 def home(request):
@@ -41,78 +43,45 @@ def inventory_display(request):
     min_price  = request.GET.get("min_price", "").strip()
     max_price  = request.GET.get("max_price", "").strip()
     in_stock   = request.GET.get("in_stock", "").strip()   # "" | "yes" | "no"
-    order_by   = request.GET.get("order_by", "name").strip()
-    per_page   = int(request.GET.get("per_page", 9))
-    page       = int(request.GET.get("page", 1))
+    order_by   = get_order_by(request.GET)
+    per_page   = parse_per_page(request.GET.get("per_page"))   # ← con tope en el servidor
+    page       = request.GET.get("page", 1)
+    pagination = request.GET.get("pagination", "").strip()   # "" | "cursor"
 
-    # SIN select_related, porque supplier no es FK
-    qs = Product.objects.all()
-
-    # Texto libre
-    if q:
-        qs = qs.filter(
-            Q(name__icontains=q) |
-            Q(description__icontains=q) |
-            Q(category__icontains=q) |
-            Q(supplier__icontains=q)   # ← busca por texto en supplier
-        )
-
-    for product in qs:
-        if product.price_suggestion == 0:
-            product.price_suggestion = suggest_price(product_name=product.name, product_category=product.category, product_description=product.description)
-            product.save()
-        if product.product_assigned_suggestions == "Blank" or product.product_assigned_suggestions is None:
-            product.product_assigned_suggestions = assign_suggestions(product_name=product.name, product_category=product.category, product_description=product.description)
-            product.save()
-
-    # Filtros específicos
-    if category:
-        qs = qs.filter(category=category)
-    if supplier:
-        qs = qs.filter(supplier__iexact=supplier)  # ← filtra por el texto exacto del proveedor
-    if min_price:
-        try: qs = qs.filter(price__gte=float(min_price))
-        except ValueError: pass
-    if max_price:
-        try: qs = qs.filter(price__lte=float(max_price))
-        except ValueError: pass
-    if in_stock == "yes":
-        qs = qs.filter(quantity__gt=0)
-    elif in_stock == "no":
-        qs = qs.filter(quantity__lte=0)
-
-    # Orden: usar 'supplier' como texto (no supplier__name)
-    allowed_order = {
-        "name","-name","price","-price","quantity","-quantity",
-        "supplier","-supplier","category","-category"
-    }
-    if order_by not in allowed_order:
-        order_by = "name"
-    qs = qs.order_by(order_by)
+    # Las sugerencias de IA las calcula el worker (manage.py enrichment_worker);
+    # aquí solo se leen los valores guardados.
+    qs = filter_products(request.GET)
 
     # Paginación
-    paginator = Paginator(qs, per_page)
-    page_obj = paginator.get_page(page)
+    cursor_page = None
+    if pagination == "cursor":
+        # Keyset: sin COUNT(*) ni OFFSET por página; el total es aproximado (cacheado)
+        keyset_order = order_by if order_by.lstrip("-") in KEYSET_FIELDS else "name"
+        cursor_page = keyset_paginate(qs, keyset_order, request.GET.get("cursor"), per_page)
+        cursor_page.approximate_count = cached_count(qs, request.GET)
+        paginator, page_obj = None, None
+        products = cursor_page.object_list
+    else:
+        paginator = Paginator(qs, per_page)
+        page_obj = paginator.get_page(page)
+        products = page_obj.object_list
 
-    # Opciones para los <select>
-    categories = (Product.objects
-                  .order_by("category")
-                  .values_list("category", flat=True).distinct())
-    suppliers  = (Product.objects
-                  .order_by("supplier")
-                  .values_list("supplier", flat=True).distinct())  # ← nombres de proveedor (texto)
+    # Opciones para los <select> con conteos, cacheadas (ver facets.py)
+    facets = get_facets()
 
     context = {
-        "products": page_obj.object_list,
+        "products": products,
         "page_obj": page_obj,
         "paginator": paginator,
+        "cursor_page": cursor_page,
         "filters": {
             "q": q, "category": category, "supplier": supplier,
             "min_price": min_price, "max_price": max_price,
             "in_stock": in_stock, "order_by": order_by, "per_page": per_page,
+            "pagination": pagination,
         },
-        "categories": categories,
-        "suppliers": suppliers,
+        "categories": facets["categories"],
+        "suppliers": facets["suppliers"],   # ← nombres de proveedor (texto)
     }
     return render(request, "inventory_display.html", context)
 
@@ -146,6 +115,33 @@ def product_entry(request):
     return render(request, 'product_entry.html', {'form': form, 'message': message})
 
 
+MAX_IMPORT_ERRORS_SHOWN = 100
+
+def product_import(request):
+    """Importación masiva (CSV/JSON); el enriquecimiento con IA queda encolado."""
+    result = None
+    error = ""
+    if request.method == 'POST':
+        form = ProductImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = import_products(
+                    read_rows(upload, upload.name),
+                    update_existing=form.cleaned_data['update_existing'],
+                )
+            except (ValueError, UnicodeDecodeError) as exc:
+                error = f"⚠️ No se pudo leer el archivo: {exc}"
+    else:
+        form = ProductImportForm()
+    return render(request, 'product_import.html', {
+        'form': form,
+        'result': result,
+        'errors_shown': result.errors[:MAX_IMPORT_ERRORS_SHOWN] if result else [],
+        'error': error,
+    })
+
+
 def supplier_list(request):
     suppliers = Supplier.objects.all()
     return render(request, 'supplier_list.html', {'suppliers': suppliers})
@@ -191,81 +187,46 @@ def product_takeout(request):
     return render(request, 'product_takeout.html', {'form': form, 'message': message})
 
 
-def _filtered_products(request):
-    q          = request.GET.get("q", "").strip()
-    category   = request.GET.get("category", "").strip()
-    supplier   = request.GET.get("supplier", "").strip()
-    min_price  = request.GET.get("min_price", "").strip()
-    max_price  = request.GET.get("max_price", "").strip()
-    in_stock   = request.GET.get("in_stock", "").strip()  # "" | "yes" | "no"
-    order_by   = request.GET.get("order_by", "name").strip()
-
-    qs = Product.objects.all()
-
-    if q:
-        qs = qs.filter(
-            Q(name__icontains=q) |
-            Q(description__icontains=q) |
-            Q(category__icontains=q) |
-            Q(supplier__icontains=q)
-        )
-    if category:
-        qs = qs.filter(category=category)
-    if supplier:
-        qs = qs.filter(supplier__iexact=supplier)
-    if min_price:
-        try: qs = qs.filter(price__gte=float(min_price))
-        except ValueError: pass
-    if max_price:
-        try: qs = qs.filter(price__lte=float(max_price))
-        except ValueError: pass
-    if in_stock == "yes":
-        qs = qs.filter(quantity__gt=0)
-    elif in_stock == "no":
-        qs = qs.filter(quantity__lte=0)
-
-    allowed_order = {
-        "name","-name","price","-price","quantity","-quantity",
-        "supplier","-supplier","category","-category"
-    }
-    if order_by not in allowed_order:
-        order_by = "name"
-
-    return qs.order_by(order_by)
-
-def _link_callback(uri, rel):
+def inventory_pdf(request):
     """
-    Permite a xhtml2pdf resolver rutas de STATIC y MEDIA.
+    Pide la exportación a PDF de la vista filtrada. Si ya existe un PDF para
+    esos filtros y el catálogo no cambió, se descarga al instante; si no, se
+    encola para export_worker y se muestra el estado del trabajo.
     """
-    if uri.startswith(settings.MEDIA_URL):
-        path = os.path.join(settings.MEDIA_ROOT, uri.replace(settings.MEDIA_URL, ""))
-    elif uri.startswith(settings.STATIC_URL):
-        path = os.path.join(getattr(settings, "STATIC_ROOT", ""), uri.replace(settings.STATIC_URL, ""))
-    else:
-        return uri  # URL absoluta
-    if not os.path.isfile(path):
-        return uri
-    return path
-
-def inventory_pdf(request):
-    products = _filtered_products(request)  # SIN paginar
-
-    context = {
-        "products": products,
-        "filters": {
-            "q": request.GET.get("q",""),
-            "category": request.GET.get("category",""),
-            "supplier": request.GET.get("supplier",""),
-            "min_price": request.GET.get("min_price",""),
-            "max_price": request.GET.get("max_price",""),
-        }
-    }
-
-    template = get_template("inventory_pdf.html")
-    html = template.render(context)
+    job = request_export(INVENTORY_PDF, inventory_params(request.GET))
+    if job.status == ExportJob.DONE:
+        return export_download(request, job.id)
+    return redirect("export_status", job_id=job.id)
+
+
+def inventory_csv(request):
+    """Exportación CSV (compatible con Excel) de la vista filtrada, en streaming."""
+    delimiter = CSV_DELIMITERS.get(request.GET.get("sep", ""), ",")
+    response = StreamingHttpResponse(
+        iter_inventory_csv(request.GET, delimiter=delimiter),
+        content_type="text/csv; charset=utf-8",
+    )
+    response["Content-Disposition"] = 'attachment; filename="inventario.csv"'
+    return response
 
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = 'attachment; filename="inventario.pdf"'
 
-    pisa.CreatePDF(html, dest=response, link_callback=_link_callback)
-    return response
+def export_status(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id)
+    download_url = reverse("export_download", args=[job.id]) if job.status == ExportJob.DONE else None
+    if request.GET.get("format") == "json":
+        return JsonResponse({
+            "job_id": str(job.id),
+            "status": job.status,
+            "download_url": download_url,
+            "error": job.error or None,
+        })
+    return render(request, "export_status.html", {"job": job, "download_url": download_url})
+
+
+def export_download(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id, status=ExportJob.DONE)
+    try:
+        file = job.file.open("rb")
+    except FileNotFoundError:
+        raise Http404("La exportación ya no está disponible.")
+    return FileResponse(file, as_attachment=True, filename=os.path.basename(job.file.name))
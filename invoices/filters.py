@@ -0,0 +1,70 @@
+"""
+Filtros del listado de ventas (sales_list).
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import DetalleFactura, Factura
+
+# Campos para la paginación por cursor (inventory/pagination.py)
+SALES_KEYSET_FIELDS = {"fecha": datetime.fromisoformat}
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _parse_day(value):
+    try:
+        return parse_date(value.strip())
+    except ValueError:
+        return None
+
+
+def filter_facturas(params):
+    """
+    Aplica los parámetros GET del listado (desde, hasta, cliente, total_min) a
+    Factura. Las fechas se comparan como rangos de fecha/hora, no con
+    ``fecha__date``, para que la consulta use factura_fecha_id_idx.
+    """
+    desde     = _parse_day(params.get("desde", ""))
+    hasta     = _parse_day(params.get("hasta", ""))
+    cliente   = params.get("cliente", "").strip()
+    total_min = params.get("total_min", "").strip()
+
+    qs = Factura.objects.all()
+    if desde:
+        qs = qs.filter(fecha__gte=_start_of(desde))
+    if hasta:
+        qs = qs.filter(fecha__lt=_start_of(hasta + timedelta(days=1)))
+    if cliente:
+        qs = qs.filter(cliente__icontains=cliente)
+    if total_min:
+        try:
+            minimo = Decimal(total_min)
+        except InvalidOperation:
+            minimo = None
+        # NaN e Infinity son Decimal válidos pero el ORM los rechaza al filtrar
+        if minimo is not None and minimo.is_finite():
+            qs = qs.filter(total__gte=minimo)
+    return qs
+
+
+def with_line_counts(qs):
+    """
+    Anota ``num_lineas`` con una subconsulta por fila en la misma consulta: a
+    diferencia de Count("detalles") no agrupa, así que la página se sigue
+    leyendo en el orden del índice y solo se cuentan sus facturas.
+    """
+    lineas = (DetalleFactura.objects
+              .filter(factura=OuterRef("pk"))
+              .order_by()
+              .values("factura")
+              .annotate(n=Count("id"))
+              .values("n"))
+    return qs.annotate(num_lineas=Coalesce(Subquery(lineas, output_field=IntegerField()), Value(0)))
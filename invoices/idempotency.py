@@ -0,0 +1,69 @@
+"""
+Claves de idempotencia para registrar facturas.
+
+La página de nueva factura incluye una clave única en el formulario; si la red
+falla y el navegador reenvía el mismo formulario, ``register_invoice`` encuentra
+la clave ya usada y devuelve la factura original sin bloquear productos ni
+tocar el stock.
+
+La clave se reserva al inicio de la transacción de la factura, antes de
+bloquear productos: un reenvío simultáneo espera en el índice único de la clave
+(no en las filas de productos) y, cuando la primera transacción termina,
+encuentra la factura ya registrada. Si la factura se revierte (p. ej. stock
+insuficiente) la reserva también, y la misma clave puede volver a usarse.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import InvoiceSubmission
+
+MAX_KEY_LENGTH = 64
+PURGE_BATCH_SIZE = 5000
+
+
+def request_hash(cliente, cart_json):
+    return hashlib.sha256(f"{cliente}\n{cart_json}".encode("utf-8")).hexdigest()
+
+
+def find(key):
+    """Envío ya registrado con ``key`` (con su factura), o None."""
+    return InvoiceSubmission.objects.select_related("factura").filter(key=key).first()
+
+
+def claim(key, digest):
+    """
+    Reserva ``key`` para este envío dentro de la transacción actual. Devuelve
+    None si quedó reservada, o el envío que ya la usaba.
+    """
+    try:
+        with transaction.atomic():
+            InvoiceSubmission.objects.create(key=key, request_hash=digest)
+    except IntegrityError:
+        return find(key)
+    return None
+
+
+def retention():
+    return timedelta(hours=getattr(settings, "INVOICE_IDEMPOTENCY_TTL_HOURS", 48))
+
+
+def purge(older_than=None, batch_size=PURGE_BATCH_SIZE):
+    """
+    Borra por lotes las claves creadas antes de ``older_than`` (por defecto
+    INVOICE_IDEMPOTENCY_TTL_HOURS). Las facturas no se tocan. Devuelve cuántas se borraron.
+    """
+    cutoff = timezone.now() - (retention() if older_than is None else older_than)
+    old = InvoiceSubmission.objects.filter(created_at__lt=cutoff).order_by("created_at")
+    deleted = 0
+    while True:
+        ids = list(old.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        # nada apunta a InvoiceSubmission: Django lo borra con un solo DELETE por lote
+        deleted += InvoiceSubmission.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            return deleted
@@ -0,0 +1,62 @@
+import json
+import statistics
+import time
+
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from inventory.benchmarking import seed_products, temporary_database
+from inventory.models import Product
+from invoices.views import register_invoice
+
+
+class Command(BaseCommand):
+    help = "Mide la latencia de register_invoice (POST de una factura) según la cantidad de líneas del carrito."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1,5,10,20,40,80",
+                            help="Líneas por factura, separadas por comas.")
+        parser.add_argument("--repeat", type=int, default=20, help="Facturas por tamaño.")
+        parser.add_argument("--products", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+        factory = RequestFactory()
+
+        with temporary_database():
+            seed_products(options["products"])
+            Product.objects.update(quantity=1_000_000)  # que ninguna factura falle por stock
+            product_ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+
+            def post(cart):
+                request = factory.post("/invoices/nueva/", {
+                    "cliente": "Benchmark",
+                    "cart_data": json.dumps(cart),
+                })
+                request._messages = CookieStorage(request)
+                return register_invoice(request)
+
+            self.stdout.write(f"{'líneas':>8}{'mediana ms':>12}{'p95 ms':>10}{'ms/línea':>10}{'sentencias':>12}")
+            offset = 0
+            for size in sizes:
+                samples = []
+                statements = 0
+                for _ in range(options["repeat"]):
+                    ids = [product_ids[(offset + i) % len(product_ids)] for i in range(size)]
+                    offset += size
+                    cart = [{"product_id": pk, "quantity": 1} for pk in ids]
+                    connection.queries_log.clear()  # el registro guarda como máximo 9000 sentencias
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        response = post(cart)
+                        samples.append((time.perf_counter() - start) * 1000)
+                    if response.status_code != 302:
+                        self.stderr.write(f"La factura de {size} líneas no se registró.")
+                    statements = len(queries)
+                samples.sort()
+                median = statistics.median(samples)
+                p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+                self.stdout.write(f"{size:>8}{median:>12.2f}{p95:>10.2f}{median / size:>10.2f}{statements:>12}")
@@ -0,0 +1,93 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from inventory.benchmarking import seed_products, temporary_database, timed
+from inventory.models import Product
+from inventory.pagination import keyset_paginate
+from invoices.filters import SALES_KEYSET_FIELDS, filter_facturas
+from invoices.models import DetalleFactura, Factura
+from invoices.views import SALES_PER_PAGE, sales_list
+
+
+def seed_invoices(start, count, product_ids, batch_size=10_000):
+    """Facturas sintéticas (una por minuto hacia atrás) con una línea cada una."""
+    fecha = Factura._meta.get_field("fecha")
+    fecha.auto_now_add = False  # bulk_create pondría la hora actual a todas
+    now = timezone.now()
+    try:
+        for first in range(start, start + count, batch_size):
+            numbers = range(first, min(first + batch_size, start + count))
+            facturas = Factura.objects.bulk_create([
+                Factura(codigo=f"B{n:07d}", fecha=now - timedelta(minutes=n), cliente=f"Cliente {n % 500}",
+                        total=Decimal(n % 1000))
+                for n in numbers
+            ])
+            DetalleFactura.objects.bulk_create([
+                DetalleFactura(factura=factura, producto_id=product_ids[n % len(product_ids)], cantidad=1,
+                               precio_unitario=factura.total, subtotal=factura.total)
+                for n, factura in zip(numbers, facturas)
+            ])
+    finally:
+        fecha.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = "Mide el listado de ventas (primera página y páginas profundas) a medida que crece la cantidad de facturas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100,10000,100000,1000000",
+                            help="Cantidades de facturas a medir, separadas por comas (crecientes).")
+        parser.add_argument("--depth", type=int, default=40, help="Página profunda (siguiendo cursores).")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options["sizes"].split(","))
+        factory = RequestFactory()
+
+        def get(query=""):
+            return sales_list(factory.get(f"/invoices/?{query}"))
+
+        with temporary_database():
+            seed_products(200)
+            product_ids = list(Product.objects.values_list("pk", flat=True))
+            today = timezone.localdate()
+            cases = [
+                ("primera página", ""),
+                ("última semana", f"desde={today - timedelta(days=7)}&hasta={today}"),
+                ("total ≥ 900", "total_min=900"),
+            ]
+
+            self.stdout.write(f"{'facturas':>10}  {'consulta':<16}{'ms':>9}{'sentencias':>12}")
+            seeded = 0
+            for size in sizes:
+                seed_invoices(seeded, size - seeded, product_ids)
+                seeded = size
+                for label, query in cases:
+                    ms, _ = timed(lambda: get(query), options["repeat"])
+                    connection.queries_log.clear()  # el registro guarda como máximo 9000 sentencias
+                    with CaptureQueriesContext(connection) as queries:
+                        get(query)
+                    self.stdout.write(f"{size:>10}  {label:<16}{ms:>9.2f}{len(queries):>12}")
+                cursor = self._cursor_at(options["depth"])
+                if cursor:
+                    ms, _ = timed(lambda: get(f"cursor={cursor}"), options["repeat"])
+                    connection.queries_log.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        get(f"cursor={cursor}")
+                    self.stdout.write(f"{size:>10}  {'página ' + str(options['depth']):<16}{ms:>9.2f}{len(queries):>12}")
+
+    def _cursor_at(self, depth):
+        """Cursor de la página ``depth``, siguiendo los cursores como lo haría un usuario."""
+        qs = filter_facturas({})
+        cursor = None
+        for _ in range(depth - 1):
+            cursor = keyset_paginate(qs, "-fecha", cursor, SALES_PER_PAGE, fields=SALES_KEYSET_FIELDS).next_cursor
+            if cursor is None:
+                break
+        return cursor
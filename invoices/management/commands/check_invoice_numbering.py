@@ -0,0 +1,80 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import RequestFactory, override_settings
+
+from inventory.benchmarking import seed_products, temporary_database
+from inventory.models import Product
+from invoices.models import Factura
+from invoices.views import register_invoice
+
+
+class Command(BaseCommand):
+    help = (
+        "Registra facturas en paralelo desde varios hilos sobre una base de datos temporal y "
+        "verifica que los códigos no se repitan ni dejen huecos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Ventas simultáneas.")
+        parser.add_argument("--invoices", type=int, default=200)
+        parser.add_argument("--block-size", type=int, default=1,
+                            help="INVOICE_NUMBER_BLOCK_SIZE para la prueba (con bloques se admiten huecos).")
+
+    def handle(self, *args, **options):
+        series = getattr(settings, "INVOICE_SERIES", "F")
+        block = options["block_size"]
+        factory = RequestFactory()
+
+        def post(i):
+            request = factory.post("/invoices/nueva/", {
+                "cliente": f"Cliente {i}",
+                "cart_data": json.dumps([{"product_id": product_ids[i % len(product_ids)], "quantity": 1}]),
+            })
+            request._messages = CookieStorage(request)
+            try:
+                return register_invoice(request).status_code == 302
+            except Exception as exc:
+                self.stderr.write(f"Venta {i}: {exc}")
+                return False
+            finally:
+                connections.close_all()  # cada hilo abre su propia conexión
+
+        # Archivo SQLite en vez de memoria compartida y transacciones IMMEDIATE: los
+        # escritores esperan el bloqueo en vez de fallar al pasar de lectura a escritura
+        options_dict = settings.DATABASES["default"].setdefault("OPTIONS", {})
+        old_options = dict(options_dict)
+        if connection.vendor == "sqlite":
+            options_dict.update({"transaction_mode": "IMMEDIATE", "timeout": 30})
+        try:
+            with temporary_database(on_disk=True), override_settings(INVOICE_NUMBER_BLOCK_SIZE=block):
+                seed_products(50)
+                Product.objects.update(quantity=1_000_000)
+                product_ids = list(Product.objects.values_list("pk", flat=True))
+
+                with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                    ok = sum(pool.map(post, range(options["invoices"])))
+
+                codes = list(Factura.objects.values_list("codigo", flat=True))
+        finally:
+            options_dict.clear()
+            options_dict.update(old_options)
+
+        numbers = sorted(int(code[len(series):]) for code in codes if code.startswith(series))
+        duplicates = len(codes) - len(set(codes))
+        gaps = sorted(set(range(1, numbers[-1] + 1)) - set(numbers)) if numbers else []
+
+        self.stdout.write(
+            f"{ok} de {options['invoices']} facturas registradas con {options['workers']} hilos "
+            f"(bloques de {block}): {duplicates} códigos repetidos, {len(gaps)} huecos."
+        )
+        if ok != options["invoices"]:
+            raise CommandError("Algunas ventas fallaron.")
+        if duplicates:
+            raise CommandError("Hay códigos de factura repetidos.")
+        if gaps and block == 1:
+            raise CommandError(f"La numeración tiene huecos: {gaps[:10]}")
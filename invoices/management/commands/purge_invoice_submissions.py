@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from invoices.idempotency import purge
+
+
+class Command(BaseCommand):
+    help = "Borra por lotes las claves de idempotencia de facturas más antiguas que el plazo de retención."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=float, default=None,
+                            help="Horas que se conservan las claves (por defecto INVOICE_IDEMPOTENCY_TTL_HOURS).")
+
+    def handle(self, *args, **options):
+        older_than = timedelta(hours=options["hours"]) if options["hours"] is not None else None
+        deleted = purge(older_than)
+        self.stdout.write(self.style.SUCCESS(f"{deleted} claves de idempotencia eliminadas."))
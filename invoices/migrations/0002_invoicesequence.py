@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:34
+
+from django.db import migrations, models
+
+
+def seed_default_series(apps, schema_editor):
+    """La serie "F" sigue donde quedó la numeración anterior (Max("id") + 1)."""
+    Factura = apps.get_model("invoices", "Factura")
+    InvoiceSequence = apps.get_model("invoices", "InvoiceSequence")
+    last = max(Factura.objects.order_by("-id").values_list("id", flat=True)[:1], default=0)
+    for codigo in Factura.objects.filter(codigo__regex=r"^F[0-9]+$").values_list("codigo", flat=True).iterator():
+        last = max(last, int(codigo[1:]))
+    InvoiceSequence.objects.create(series="F", next_number=last + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('series', models.CharField(max_length=10, unique=True)),
+                ('next_number', models.PositiveBigIntegerField(default=1)),
+                ('padding', models.PositiveSmallIntegerField(default=4)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_default_series, migrations.RunPython.noop),
+    ]
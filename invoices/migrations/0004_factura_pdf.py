@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0003_factura_fecha_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='pdf',
+            field=models.FileField(blank=True, upload_to='invoices/%Y/%m/'),
+        ),
+        migrations.AddField(
+            model_name='factura',
+            name='pdf_etag',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(condition=models.Q(('pdf', '')), fields=['id'], name='factura_pdf_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0004_factura_pdf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSubmission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('request_hash', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('factura', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='submissions', to='invoices.factura')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='invoicesubmission_created_idx')],
+            },
+        ),
+    ]
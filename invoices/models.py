@@ -21,10 +21,40 @@ class Factura(models.Model):
     fecha = models.DateTimeField(auto_now_add=True)
     cliente = models.CharField(max_length=100, blank=True, null=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # PDF generado una sola vez (la factura no cambia después de emitida); ver pdf.py
+    pdf = models.FileField(upload_to="invoices/%Y/%m/", blank=True)
+    pdf_etag = models.CharField(max_length=64, blank=True)  # sha256 del archivo
+
+    class Meta:
+        indexes = [
+            # orden y paginación por cursor del listado de ventas (más recientes primero)
+            models.Index(fields=["fecha", "id"], name="factura_fecha_id_idx"),
+            # solo las facturas cuyo PDF falta generar: el worker las encuentra sin recorrer la tabla
+            models.Index(fields=["id"], condition=models.Q(pdf=""), name="factura_pdf_pending_idx"),
+        ]
 
     def __str__(self):
         return f"Factura {self.codigo} - {self.fecha.strftime('%Y-%m-%d')}"
 
+class InvoiceSubmission(models.Model):
+    """
+    Clave de idempotencia de un envío del formulario de factura. Un reintento
+    con la misma clave devuelve la factura ya registrada en vez de crear otra.
+    Las claves viejas se borran con ``manage.py purge_invoice_submissions``.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    request_hash = models.CharField(max_length=64)  # sha256 de cliente + carrito
+    factura = models.ForeignKey(Factura, on_delete=models.CASCADE, related_name="submissions", null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="invoicesubmission_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} → {self.factura_id}"
+
 class DetalleFactura(models.Model):
     factura = models.ForeignKey(Factura, related_name="detalles", on_delete=models.CASCADE)
     producto = models.ForeignKey("inventory.Product", on_delete=models.CASCADE)
@@ -35,3 +65,19 @@ class DetalleFactura(models.Model):
     def __str__(self):
         return f"{self.producto.name} x {self.cantidad}"
     
+
+class InvoiceSequence(models.Model):
+    """
+    Contador de la numeración de facturas de una serie (p. ej. una por tienda o
+    caja). Los códigos se asignan con numbering.py, nunca con Max("id").
+    """
+    series = models.CharField(max_length=10, unique=True)  # prefijo del código: "F", "T2-", ...
+    next_number = models.PositiveBigIntegerField(default=1)
+    padding = models.PositiveSmallIntegerField(default=4)  # F0001
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def code(self, number):
+        return f"{self.series}{number:0{self.padding}d}"
+
+    def __str__(self):
+        return f"{self.series} → {self.code(self.next_number)}"
@@ -0,0 +1,81 @@
+"""
+Numeración de facturas sin Max("id") ni carreras entre ventas simultáneas.
+
+Cada serie (prefijo del código) tiene un contador en InvoiceSequence que se
+incrementa con un único UPDATE atómico (next_number = next_number + n): dos
+ventas a la vez esperan el bloqueo de esa fila en lugar de calcular el mismo
+código y chocar con ``unique=True``.
+
+Con ``INVOICE_NUMBER_BLOCK_SIZE = 1`` (por defecto) el número se toma dentro
+de la transacción de la factura: si la factura se revierte, el número también,
+así que la serie no tiene huecos. Con bloques mayores cada proceso reserva
+varios números con una sola escritura y los reparte en memoria (útil para una
+caja con mucho movimiento); a cambio, los números de facturas revertidas o de
+un proceso que se reinicia quedan sin usar y, entre procesos, el orden de los
+códigos ya no sigue el de las fechas.
+"""
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import InvoiceSequence
+
+_blocks = {}  # serie -> [siguiente número, último número, secuencia] reservados por este proceso
+_blocks_lock = threading.Lock()
+
+
+def _default_series():
+    return getattr(settings, "INVOICE_SERIES", "F")
+
+
+def _block_size():
+    return max(1, getattr(settings, "INVOICE_NUMBER_BLOCK_SIZE", 1))
+
+
+def reserve(series, count=1):
+    """
+    Reserva ``count`` números consecutivos de ``series`` y devuelve
+    (secuencia, primer número). La serie se crea en su primer uso.
+    """
+    with transaction.atomic(savepoint=False):
+        updated = InvoiceSequence.objects.filter(series=series).update(next_number=F("next_number") + count)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    sequence = InvoiceSequence.objects.create(series=series, next_number=1 + count)
+                return sequence, 1
+            except IntegrityError:
+                # otra venta creó la serie al mismo tiempo
+                InvoiceSequence.objects.filter(series=series).update(next_number=F("next_number") + count)
+        # la fila sigue bloqueada por el UPDATE: nadie más la cambió entre medio
+        sequence = InvoiceSequence.objects.get(series=series)
+        return sequence, sequence.next_number - count
+
+
+def next_code(series=None):
+    """Código de la siguiente factura de ``series`` (la de settings si no se indica)."""
+    series = series or _default_series()
+    block = _block_size()
+    if block == 1:
+        sequence, number = reserve(series)
+        return sequence.code(number)
+
+    with _blocks_lock:
+        cached = _blocks.get(series)
+        if cached and cached[0] <= cached[1]:
+            number = cached[0]
+            cached[0] += 1
+            return cached[2].code(number)
+
+    sequence, number = reserve(series, block)
+
+    def keep_rest():
+        # solo cuando la reserva quedó guardada: si la transacción se revierte,
+        # el contador vuelve atrás y estos números no deben repartirse
+        with _blocks_lock:
+            _blocks[series] = [number + 1, number + block - 1, sequence]
+
+    transaction.on_commit(keep_rest)
+    return sequence.code(number)
@@ -0,0 +1,107 @@
+"""
+PDF de cada factura, generado una sola vez y guardado en disco.
+
+Una factura emitida no cambia: su PDF lo genera ``manage.py export_worker``
+después del commit y queda en ``Factura.pdf`` junto con su sha256, que sirve
+de ETag. Las descargas leen ese archivo (con ETag y rangos, ver
+views.invoice_pdf) y la exportación mensual en ZIP empaqueta los mismos
+archivos sin volver a generarlos.
+"""
+import hashlib
+import logging
+import zipfile
+from datetime import datetime
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from inventory.pdf import render_pdf
+
+from .models import Factura
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def render_invoice_pdf(factura):
+    detalles = factura.detalles.select_related("producto").only(
+        "factura_id", "cantidad", "precio_unitario", "subtotal", "producto__name",
+    )
+    return render_pdf("invoice_pdf.html", {"factura": factura, "detalles": detalles})
+
+
+def store_pdf(factura):
+    """
+    Genera y guarda el PDF de ``factura`` si todavía no lo tiene. Si otro
+    proceso lo guarda al mismo tiempo se conserva el primero.
+    """
+    if factura.pdf:
+        return factura
+    content = render_invoice_pdf(factura)
+    etag = hashlib.sha256(content).hexdigest()
+    factura.pdf.save(f"{factura.codigo}.pdf", ContentFile(content), save=False)
+    if Factura.objects.filter(pk=factura.pk, pdf="").update(pdf=factura.pdf.name, pdf_etag=etag):
+        factura.pdf_etag = etag
+    else:
+        factura.pdf.storage.delete(factura.pdf.name)
+        factura.refresh_from_db(fields=["pdf", "pdf_etag"])
+    return factura
+
+
+def render_pending(limit=20):
+    """Genera los PDFs que faltan (los más antiguos primero). Devuelve cuántos se guardaron."""
+    pending = Factura.objects.filter(pdf="").order_by("id")[:limit]
+    stored = 0
+    for factura in pending:
+        try:
+            store_pdf(factura)
+        except Exception as exc:  # una factura que falla no detiene a las demás
+            logger.warning("PDF de la factura %s: %s", factura.codigo, exc)
+            continue
+        stored += 1
+    return stored
+
+
+def month_invoices(year, month):
+    """Facturas del mes (hora local) en orden, usando factura_fecha_id_idx."""
+    start = timezone.make_aware(datetime(year, month, 1))
+    end = timezone.make_aware(datetime(year + month // 12, month % 12 + 1, 1))
+    return Factura.objects.filter(fecha__gte=start, fecha__lt=end).order_by("fecha", "id")
+
+
+class _ZipStream:
+    """Pseudo-archivo para zipfile: guarda lo escrito hasta que se entrega al cliente."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_zip(facturas):
+    """
+    Genera un ZIP con el PDF guardado de cada factura, por partes, sin armarlo
+    en memoria. Los PDFs ya van comprimidos, así que se guardan sin comprimir.
+    Si alguna factura aún no tiene PDF se genera (y se guarda) en ese momento.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_STORED) as archive:
+        for factura in facturas.iterator(chunk_size=500):
+            store_pdf(factura)
+            info = zipfile.ZipInfo(f"{factura.codigo}.pdf", date_time=timezone.localtime(factura.fecha).timetuple()[:6])
+            with factura.pdf.open("rb") as source, archive.open(info, "w") as dest:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                    dest.write(chunk)
+                    yield stream.pop()
+    yield stream.pop()  # directorio central del ZIP
@@ -1,3 +1,453 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages import get_messages
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import QuerySet
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from analytics.models import SalesDaily
+from analytics.rollup import rebuild
+from inventory.models import Product
+
+from . import idempotency, numbering, pdf
+from .filters import filter_facturas, with_line_counts
+from .models import DetalleFactura, Factura, InvoiceSequence, InvoiceSubmission
+from .views import register_invoice
+
+
+def messages_text(response):
+    return " | ".join(str(message) for message in get_messages(response.wsgi_request))
+
+
+class InvoiceTestCase(TestCase):
+    def post_cart(self, cart, **data):
+        return self.client.post("/invoices/nueva/", {"cliente": "c", "cart_data": json.dumps(cart), **data})
+
+
+class RegisterInvoiceTests(InvoiceTestCase):
+    def setUp(self):
+        self.a = Product.objects.create(name="A", category="alimentos", price=Decimal("1.10"), quantity=10)
+        self.b = Product.objects.create(name="B", category="alimentos", price=Decimal("2.35"), quantity=3)
+
+    def test_set_based_commit(self):
+        before = self.a.updated_at
+        with mock.patch("invoices.views.invalidate_facets") as invalidate, \
+                self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(12):
+            response = self.post_cart([{"product_id": self.a.pk, "quantity": 2},
+                                       {"product_id": self.b.pk, "quantity": 1},
+                                       {"product_id": self.a.pk, "quantity": 3}])
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(invalidate.called)
+        self.assertEqual(Factura.objects.get().total, Decimal("7.85"))
+        self.assertEqual(DetalleFactura.objects.count(), 3)
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.quantity, self.b.quantity), (5, 2))
+        self.assertGreater(self.a.updated_at, before)
+
+    def test_rollup_matches_a_rebuild(self):
+        self.post_cart([{"product_id": self.a.pk, "quantity": 2}, {"product_id": self.b.pk, "quantity": 1}])
+        self.post_cart([{"product_id": self.a.pk, "quantity": 1}])
+        rows = SalesDaily.objects.order_by("product_id").values_list("product_id", "units", "revenue", "invoice_count")
+        incremental = list(rows)
+        rebuild()
+        self.assertEqual(list(rows), incremental)
+
+    def test_errors_write_nothing(self):
+        cases = [
+            ([{"product_id": self.a.pk, "quantity": 6}, {"product_id": self.a.pk, "quantity": 5}],
+             "Stock insuficiente para A"),
+            ([{"product_id": 9999, "quantity": 1}], "Formato de producto incorrecto"),
+            ([{"product_id": self.a.pk, "quantity": 0}], "debe ser mayor que 0"),
+            ([{"product_id": "x", "quantity": 1}], "Formato de producto incorrecto"),
+        ]
+        for cart, message in cases:
+            with self.subTest(message=message):
+                self.assertIn(message, messages_text(self.post_cart(cart)))
+        self.assertFalse(Factura.objects.exists())
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.quantity, 10)
+
+    def test_concurrent_sale_between_read_and_update(self):
+        real_in_bulk = QuerySet.in_bulk
+
+        # Simula otra venta entre la lectura y el UPDATE condicional (SQLite no bloquea filas)
+        def in_bulk(queryset, *args, **kwargs):
+            result = real_in_bulk(queryset, *args, **kwargs)
+            if queryset.model is Product:
+                Product.objects.filter(pk=self.a.pk).update(quantity=1)
+            return result
+
+        with mock.patch.object(QuerySet, "in_bulk", in_bulk):
+            response = self.post_cart([{"product_id": self.a.pk, "quantity": 3}])
+        self.assertIn("Otra venta lo modificó", messages_text(response))
+        self.assertFalse(Factura.objects.exists())
+        self.assertFalse(DetalleFactura.objects.exists())
+
+
+class Rollback(Exception):
+    pass
+
+
+class NumberingTests(TestCase):
+    def setUp(self):
+        numbering._blocks.clear()
+
+    def test_rolled_back_numbers_are_reused(self):
+        self.assertEqual(InvoiceSequence.objects.get(series="F").next_number, 1)
+        self.assertEqual(numbering.next_code(), "F0001")
+        with self.assertRaises(Rollback), transaction.atomic():
+            self.assertEqual(numbering.next_code(), "F0002")
+            raise Rollback
+        self.assertEqual(numbering.next_code(), "F0002")
+        self.assertEqual(numbering.next_code("T2-"), "T2-0001")
+        with self.assertNumQueries(2):  # UPDATE y SELECT
+            numbering.next_code()
+
+    @override_settings(INVOICE_NUMBER_BLOCK_SIZE=5)
+    def test_blocks(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(numbering.next_code(), "F0001")
+        with self.assertNumQueries(0):
+            codes = [numbering.next_code() for _ in range(4)]
+        self.assertEqual(codes, ["F0002", "F0003", "F0004", "F0005"])
+
+        # Un bloque reservado en una transacción revertida no se reparte
+        with self.assertRaises(Rollback), transaction.atomic():
+            self.assertEqual(numbering.next_code(), "F0006")
+            raise Rollback
+        self.assertEqual(numbering._blocks["F"][0], 6)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(numbering.next_code(), "F0006")
+
+
+class ConcurrentNumberingTests(TransactionTestCase):
+    THREADS = 8
+    PER_THREAD = 25
+
+    def setUp(self):
+        numbering._blocks.clear()
+
+    def run_concurrently(self, sale):
+        """Llama a ``sale(intento)`` PER_THREAD veces desde cada uno de THREADS hilos a la vez."""
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker():
+            try:
+                barrier.wait()
+                for attempt in range(1, self.PER_THREAD + 1):
+                    while True:
+                        try:
+                            sale(attempt)
+                        except Rollback:
+                            pass
+                        except OperationalError as exc:
+                            # La base de pruebas SQLite en memoria compartida no espera
+                            # los bloqueos: avisa "table is locked" y se reintenta
+                            if "locked" not in str(exc):
+                                raise
+                            time.sleep(0.001)
+                            continue
+                        break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def allocate(self, rollback_every=0):
+        """Pide códigos desde varios hilos a la vez; devuelve los de transacciones confirmadas."""
+        codes = []
+
+        def sale(attempt):
+            with transaction.atomic():
+                code = numbering.next_code()
+                if rollback_every and attempt % rollback_every == 0:
+                    raise Rollback
+            codes.append(code)
+
+        self.run_concurrently(sale)
+        return codes
+
+    def assertGapFree(self, codes):
+        numbers = sorted(int(code[1:]) for code in codes)
+        self.assertEqual(numbers, list(range(1, len(codes) + 1)))
+
+    def test_codes_are_unique_and_gap_free(self):
+        codes = self.allocate()
+        self.assertEqual(len(codes), self.THREADS * self.PER_THREAD)
+        self.assertGapFree(codes)
+
+    def test_rolled_back_sales_leave_no_gaps(self):
+        codes = self.allocate(rollback_every=5)
+        self.assertEqual(len(codes), self.THREADS * (self.PER_THREAD - self.PER_THREAD // 5))
+        self.assertGapFree(codes)
+
+    @override_settings(INVOICE_NUMBER_BLOCK_SIZE=10)
+    def test_blocks_are_unique(self):
+        codes = self.allocate()
+        self.assertEqual(len(set(codes)), len(codes))
+
+    def test_register_invoice_from_threads(self):
+        a = Product.objects.create(name="A", category="alimentos", price=Decimal("1.00"), quantity=1000)
+        b = Product.objects.create(name="B", category="alimentos", price=Decimal("2.00"), quantity=150)
+        cart = json.dumps([{"product_id": a.pk, "quantity": 1}, {"product_id": b.pk, "quantity": 1}])
+        factory = RequestFactory()
+        statuses = []
+
+        def sale(attempt):
+            # la vista directamente: el Client de pruebas comparte entre hilos la señal
+            # got_request_exception y relanzaría en un hilo el bloqueo de otro
+            request = factory.post("/invoices/nueva/", {"cliente": "c", "cart_data": cart})
+            request.user = AnonymousUser()
+            request._messages = CookieStorage(request)
+            statuses.append(register_invoice(request).status_code)
+
+        self.run_concurrently(sale)
+
+        # 200 ventas para 150 unidades de B: las 50 rechazadas no consumen código
+        self.assertEqual((statuses.count(302), statuses.count(200)), (150, 50))
+        codes = list(Factura.objects.values_list("codigo", flat=True))
+        self.assertEqual(len(set(codes)), 150)
+        self.assertGapFree(codes)
+        self.assertEqual(DetalleFactura.objects.count(), 300)
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual((a.quantity, b.quantity), (850, 0))
+
+
+class SalesListTests(TestCase):
+    def setUp(self):
+        product = Product.objects.create(name="Pan", category="alimentos", price=1, quantity=1)
+        now = timezone.now()
+        facturas = Factura.objects.bulk_create([
+            Factura(codigo=f"F{i:04d}", cliente=f"Cliente {i % 3}", total=Decimal(i)) for i in range(1, 61)
+        ])
+        for i, factura in enumerate(facturas):
+            # Dos facturas por día con la misma fecha exacta, para probar el desempate por id
+            Factura.objects.filter(pk=factura.pk).update(fecha=now - timedelta(days=30 - i // 2))
+        DetalleFactura.objects.bulk_create([
+            DetalleFactura(factura=factura, producto=product, cantidad=1, precio_unitario=1, subtotal=1)
+            for factura in facturas for _ in range(factura.pk % 3)
+        ])
+        self.expected = list(Factura.objects.order_by("-fecha", "-id").values_list("pk", flat=True))
+
+    def page(self, query):
+        return self.client.get(f"/invoices/?per_page=7{query}").context["page"]
+
+    def test_walks_every_page_in_two_queries_each(self):
+        seen, query = [], ""
+        while query is not None:
+            with self.assertNumQueries(2):
+                page = self.page(query)
+            for factura in page:
+                self.assertEqual(factura.num_lineas, factura.pk % 3)
+                self.assertEqual(len(factura.detalles.all()), factura.pk % 3)
+            seen += [factura.pk for factura in page]
+            query = f"&cursor={page.next_cursor}" if page.has_next else None
+        self.assertEqual(seen, self.expected)
+
+    def test_previous_page(self):
+        second = self.client.get(f"/invoices/?per_page=7&cursor={self.page('').next_cursor}")
+        self.assertContains(second, "Más recientes")
+        self.assertContains(second, "Más antiguas")
+        first = self.page(f"&cursor={second.context['page'].previous_cursor}")
+        self.assertEqual([factura.pk for factura in first], self.expected[:7])
+        self.assertFalse(first.has_previous)
+
+    def test_filters(self):
+        today = timezone.localdate()
+        since = today - timedelta(days=10)
+        response = self.client.get(f"/invoices/?cliente=cliente 1&total_min=30&desde={since}&hasta={today}")
+        expected = {f.pk for f in Factura.objects.all()
+                    if f.cliente == "Cliente 1" and f.total >= 30 and since <= timezone.localdate(f.fecha) <= today}
+        self.assertTrue(expected)
+        self.assertEqual({f.pk for f in response.context["facturas"]}, expected)
+        response = self.client.get("/invoices/?cliente=nadie&total_min=abc&desde=xx")
+        self.assertContains(response, "No hay facturas que coincidan")
+
+    def test_non_finite_total_min_is_ignored(self):
+        for value in ("NaN", "sNaN", "Infinity", "-Infinity"):
+            with self.subTest(value=value):
+                response = self.client.get(f"/invoices/?total_min={value}")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context["facturas"]), 25)
+
+    def test_page_query_uses_the_index(self):
+        sql, params = with_line_counts(filter_facturas({})).order_by("-fecha", "-id")[:25].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("factura_fecha_id_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class InvoicePdfTests(InvoiceTestCase):
+    def setUp(self):
+        media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media.enable()
+        self.addCleanup(shutil.rmtree, media.options["MEDIA_ROOT"], ignore_errors=True)
+        self.addCleanup(media.disable)
+        product = Product.objects.create(name="Pan ñ", category="alimentos", price=Decimal("1.50"), quantity=100)
+        for _ in range(3):
+            self.client.post("/invoices/nueva/", {"cliente": "Ana",
+                                                  "cart_data": json.dumps([{"product_id": product.pk, "quantity": 2}])})
+        self.factura = Factura.objects.order_by("id").first()
+        self.url = f"/invoices/pdf/{self.factura.pk}/"
+
+    def stored_pdf(self, factura):
+        with factura.pdf.open("rb") as file:
+            return file.read()
+
+    def test_worker_renders_pending_invoices(self):
+        self.assertEqual(Factura.objects.filter(pdf="").count(), 3)
+        call_command("export_worker", "--once", stdout=io.StringIO())
+        self.assertFalse(Factura.objects.filter(pdf="").exists())
+        self.assertTrue(self.stored_pdf(Factura.objects.get(pk=self.factura.pk)).startswith(b"%PDF"))
+
+    def test_download_is_served_from_disk(self):
+        pdf.render_pending()
+        data = self.stored_pdf(Factura.objects.get(pk=self.factura.pk))
+        with mock.patch("invoices.pdf.render_pdf") as render:
+            response = self.client.get(self.url)
+        self.assertFalse(render.called)
+        self.assertEqual(b"".join(response.streaming_content), data)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_ranges(self):
+        pdf.render_pending()
+        data = self.stored_pdf(Factura.objects.get(pk=self.factura.pk))
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9")
+        self.assertEqual((response.status_code, response.content, response["Content-Range"]),
+                         (206, data[:10], f"bytes 0-9/{len(data)}"))
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=-5").content, data[-5:])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=10-").content, data[10:])
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(data)}-")
+        self.assertEqual((response.status_code, response["Content-Range"]), (416, f"bytes */{len(data)}"))
+        # If-Range de otra versión y varios rangos: archivo completo
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"otro"').status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=0-1,5-6").status_code, 200)
+
+    def test_missing_pdf_is_rendered_on_demand(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        b"".join(response.streaming_content)
+        self.assertTrue(Factura.objects.get(pk=self.factura.pk).pdf)
+
+    def test_month_zip(self):
+        pdf.render_pending()
+        with mock.patch("invoices.pdf.render_pdf") as render:
+            response = self.client.get(f"/invoices/pdf/mes/?mes={timezone.localdate():%Y-%m}")
+            archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertFalse(render.called)
+        self.assertEqual(len(archive.namelist()), 3)
+        for factura in Factura.objects.all():
+            self.assertEqual(archive.read(f"{factura.codigo}.pdf"), self.stored_pdf(factura))
+
+        response = self.client.get("/invoices/pdf/mes/?mes=1999-01")
+        self.assertEqual(zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))).namelist(), [])
+
+    def test_month_zip_rejects_months_out_of_range(self):
+        for mes in ("2024-13", "2024-00", "0000-01", "9999-12"):
+            with self.subTest(mes=mes):
+                self.assertEqual(self.client.get(f"/invoices/pdf/mes/?mes={mes}").status_code, 404)
+        self.assertEqual(self.client.get("/invoices/pdf/mes/?mes=9998-12").status_code, 200)
+
+    def test_concurrent_store_keeps_one_file(self):
+        first = Factura.objects.get(pk=self.factura.pk)
+        second = Factura.objects.get(pk=self.factura.pk)
+        pdf.store_pdf(first)
+        pdf.store_pdf(second)  # second todavía no sabe que first ya lo guardó
+        self.assertEqual(second.pdf.name, first.pdf.name)
+        self.assertEqual(Factura.objects.get(pk=self.factura.pk).pdf_etag, first.pdf_etag)
+
+    def test_sales_list_links(self):
+        response = self.client.get("/invoices/")
+        self.assertContains(response, self.url)
+        self.assertContains(response, "ZIP del mes")
+
+
+class IdempotentSubmissionTests(InvoiceTestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="Pan", category="alimentos", price=2, quantity=10)
+        self.cart = [{"product_id": self.product.pk, "quantity": 3}]
+
+    def submit(self, key, cart=None):
+        return self.post_cart(cart or self.cart, cliente="Ana", idempotency_key=key)
+
+    def test_form_carries_a_fresh_key(self):
+        response = self.client.get("/invoices/nueva/")
+        key = response.context["idempotency_key"]
+        self.assertEqual(len(key), 32)
+        self.assertContains(response, f'name="idempotency_key" value="{key}"')
+
+    def test_resubmission_returns_the_same_invoice(self):
+        self.assertEqual(self.submit("k0").status_code, 302)
+        with self.assertNumQueries(3) as queries:  # savepoint, SELECT clave y factura, release
+            replay = self.submit("k0")
+        self.assertFalse(any("inventory_product" in query["sql"] for query in queries))
+        self.assertEqual(replay.status_code, 302)
+        self.assertIn("registrada correctamente", messages_text(replay))
+        self.assertEqual(InvoiceSubmission.objects.get().factura, Factura.objects.get())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 7)
+
+    def test_same_key_with_another_cart_is_rejected(self):
+        self.submit("k0")
+        response = self.submit("k0", cart=[{"product_id": self.product.pk, "quantity": 1}])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("otro carrito", messages_text(response))
+        self.assertEqual(Factura.objects.count(), 1)
+
+    def test_submissions_without_key_still_work(self):
+        self.assertEqual(self.post_cart(self.cart).status_code, 302)
+        self.assertEqual(self.post_cart(self.cart).status_code, 302)
+        self.assertEqual(Factura.objects.count(), 2)
+
+    def test_failed_submission_frees_the_key(self):
+        response = self.submit("k1", cart=[{"product_id": self.product.pk, "quantity": 99}])
+        self.assertIn("Stock insuficiente", messages_text(response))
+        self.assertFalse(InvoiceSubmission.objects.exists())
+        self.assertEqual(self.submit("k1").status_code, 302)
+        self.assertEqual(Factura.objects.count(), 1)
+
+    def test_key_claimed_after_the_fast_check(self):
+        self.submit("k2")
+        claimed = InvoiceSubmission.objects.select_related("factura").get(key="k2")
+        # El reenvío simultáneo: la clave aparece justo después de la primera búsqueda
+        with mock.patch.object(idempotency, "find", side_effect=[None, claimed]):
+            response = self.submit("k2")
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Factura.objects.count(), 1)
+
+    def test_purge(self):
+        for i in range(7):
+            self.submit(f"p{i}", cart=[{"product_id": self.product.pk, "quantity": 1}])
+        InvoiceSubmission.objects.filter(key__in=["p0", "p1", "p2", "p3", "p4"]).update(
+            created_at=timezone.now() - timedelta(hours=49))
+        with self.assertNumQueries(4):  # dos lotes: SELECT + DELETE cada uno
+            self.assertEqual(idempotency.purge(batch_size=3), 5)
+        self.assertEqual(InvoiceSubmission.objects.count(), 2)
+        self.assertEqual(Factura.objects.count(), 7)
+
+        call_command("purge_invoice_submissions", "--hours", "0", stdout=io.StringIO())
+        self.assertFalse(InvoiceSubmission.objects.exists())
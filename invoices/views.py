@@ -1,27 +1,93 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 from django.db import transaction
-from django.db.models import Max
+from django.db.models import F, Prefetch, prefetch_related_objects
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.contrib import messages
 import json
+import re
+import uuid
+from datetime import MAXYEAR, MINYEAR
 
+from .filters import SALES_KEYSET_FIELDS, filter_facturas, with_line_counts
 from .forms import FacturaForm
+from inventory.facets import invalidate_facets
 from inventory.models import Product
-from .models import Factura, DetalleFactura
+from inventory.pagination import keyset_paginate, parse_per_page
+from . import idempotency
+from .models import DetalleFactura, Factura, InvoiceSubmission
+from .numbering import next_code
+from .pdf import iter_zip, month_invoices, store_pdf
+from analytics.rollup import record_invoice
 
+SALES_PER_PAGE = 25
+PDF_MAX_AGE = 24 * 3600  # segundos; el PDF de una factura no cambia
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
 
-def generar_codigo_factura():
-    ultimo_id = Factura.objects.aggregate(max_id=Max("id"))["max_id"] or 0
-    return f"F{ultimo_id + 1:04d}"  # F0001, F0002, ...
 
 def sales_list(request):
-    facturas = Factura.objects.prefetch_related("detalles__producto").all().order_by("-fecha")
-    return render(request, "sales_list.html", {"facturas": facturas})
+    """
+    Listado de ventas con filtros y paginación por cursor sobre (fecha, id):
+    cada página cuesta lo mismo sin importar cuántas facturas haya, porque no
+    hay COUNT(*) ni OFFSET y los detalles solo se cargan para la página visible.
+    """
+    per_page = parse_per_page(request.GET.get("per_page"), default=SALES_PER_PAGE)
+    qs = with_line_counts(filter_facturas(request.GET))
+    page = keyset_paginate(qs, "-fecha", request.GET.get("cursor"), per_page, fields=SALES_KEYSET_FIELDS)
+    prefetch_related_objects(
+        page.object_list,
+        Prefetch("detalles", queryset=DetalleFactura.objects.select_related("producto").only(
+            "factura_id", "cantidad", "precio_unitario", "subtotal", "producto__name",
+        )),
+    )
+    return render(request, "sales_list.html", {
+        "facturas": page.object_list,
+        "page": page,
+        "filters": {key: request.GET.get(key, "").strip() for key in ("desde", "hasta", "cliente", "total_min")},
+    })
+
+def _parse_cart(cart):
+    """Lista de (product_id, cantidad) del carrito, o None si alguna línea no es válida."""
+    lines = []
+    try:
+        for item in cart:
+            lines.append((int(item.get("product_id")), int(item.get("quantity"))))
+    except Exception:
+        return None
+    return lines
+
+
+def _form_context(factura_form, products):
+    # clave nueva en cada formulario mostrado; los reenvíos del mismo formulario la repiten
+    return {"factura_form": factura_form, "products": products, "idempotency_key": uuid.uuid4().hex}
+
+
+def _registered(request, factura):
+    messages.success(request, f"✅ Factura {factura.codigo} registrada correctamente. Total: ${factura.total}.")
+    return redirect("sales_list")
+
+
+def _replay(request, submission, digest, error):
+    """Respuesta a un envío cuya clave ya se usó."""
+    if submission.request_hash != digest:
+        return error("Este formulario ya se envió con otro carrito. Recarga la página para registrar una nueva factura.")
+    if submission.factura is None:
+        return error("La factura se está registrando; revisa el listado de ventas en unos segundos.")
+    return _registered(request, submission.factura)
+
 
 @transaction.atomic
 def register_invoice(request):
     """
     Vista que reemplaza el flujo basado en formset.
     Usa un carrito en JS que se envía como JSON en 'cart_data'.
+
+    La factura se registra con un número fijo de sentencias más una por producto:
+    un solo SELECT ... FOR UPDATE para todos los productos del carrito, la
+    validación de stock en memoria, un UPDATE condicional (quantity >= n) por
+    producto para descontar el stock, el código de numbering.py y un
+    bulk_create de los detalles.
     """
     products = Product.objects.all()
 
@@ -33,79 +99,196 @@ def register_invoice(request):
         except Exception:
             cart = []
 
+        key = request.POST.get("idempotency_key", "").strip()[:idempotency.MAX_KEY_LENGTH]
+        digest = idempotency.request_hash(request.POST.get("cliente", ""), cart_json)
+
+        def error(message):
+            messages.error(request, message)
+            response = render(request, "register_invoice.html", _form_context(factura_form, products))
+            # después de renderizar: con la transacción marcada ya no se puede consultar
+            transaction.set_rollback(True)
+            return response
+
+        # Reenvío de un formulario ya registrado (p. ej. tras un corte de red):
+        # se responde con la factura original sin bloquear productos
+        if key:
+            previous = idempotency.find(key)
+            if previous is not None:
+                return _replay(request, previous, digest, error)
+
         # Validación rápida del carrito
         if not cart:
             messages.error(request, "Debes agregar al menos un producto al carrito.")
-            return render(request, "register_invoice.html", {"factura_form": factura_form, "products": products})
+            return render(request, "register_invoice.html", _form_context(factura_form, products))
 
         if factura_form.is_valid():
-            # crear factura (sin total de momento)
-            factura = factura_form.save(commit=False)
-            factura.codigo = generar_codigo_factura()
-            factura.total = 0
-            factura.save()
-
-            total = 0
+            lines = _parse_cart(cart)
+            if lines is None:
+                return error("Formato de producto incorrecto en el carrito.")
 
-            # Procesar cada item del carrito
-            for item in cart:
-                try:
-                    product_id = int(item.get("product_id"))
-                    cantidad = int(item.get("quantity"))
-                except Exception:
-                    transaction.set_rollback(True)
-                    factura.delete()
-                    messages.error(request, "Formato de producto incorrecto en el carrito.")
-                    return render(request, "register_invoice.html", {"factura_form": factura_form, "products": products})
+            # la clave se reserva antes de bloquear productos: un reenvío simultáneo
+            # espera aquí y luego encuentra la factura de este envío
+            if key:
+                previous = idempotency.claim(key, digest)
+                if previous is not None:
+                    return _replay(request, previous, digest, error)
 
-                # bloqueo de fila para evitar race-conditions en stock
-                producto = Product.objects.select_for_update().get(pk=product_id)
+            # bloqueo de todas las filas del carrito a la vez para evitar race-conditions en stock
+            locked = (Product.objects
+                      .select_for_update()
+                      .only("id", "name", "price", "quantity", "min_stock")
+                      .in_bulk({product_id for product_id, _ in lines}))
 
+            # Validación en memoria (un producto puede venir en varias líneas)
+            requested = {}
+            for product_id, cantidad in lines:
+                producto = locked.get(product_id)
+                if producto is None:
+                    return error("Formato de producto incorrecto en el carrito.")
                 if cantidad <= 0:
-                    transaction.set_rollback(True)
-                    factura.delete()
-                    messages.error(request, f"La cantidad para {producto.name} debe ser mayor que 0.")
-                    return render(request, "register_invoice.html", {"factura_form": factura_form, "products": products})
-
-                if cantidad > producto.quantity:
-                    transaction.set_rollback(True)
-                    factura.delete()
-                    messages.error(request, f"Stock insuficiente para {producto.name}. Disponible: {producto.quantity}")
-                    return render(request, "register_invoice.html", {"factura_form": factura_form, "products": products})
-
-                precio_unitario = producto.price
-                subtotal = precio_unitario * cantidad
-
-                # crear detalle
-                DetalleFactura.objects.create(
-                    factura=factura,
-                    producto=producto,
-                    cantidad=cantidad,
-                    precio_unitario=precio_unitario,
-                    subtotal=subtotal
-                )
+                    return error(f"La cantidad para {producto.name} debe ser mayor que 0.")
+                requested[product_id] = requested.get(product_id, 0) + cantidad
+                if requested[product_id] > producto.quantity:
+                    return error(f"Stock insuficiente para {producto.name}. Disponible: {producto.quantity}")
 
-                # descontar stock
+            # descontar stock: el filtro quantity >= n protege aunque la base de datos
+            # no soporte SELECT ... FOR UPDATE (SQLite)
+            now = timezone.now()
+            low_stock = []
+            for product_id, cantidad in requested.items():
+                producto = locked[product_id]
+                if not Product.objects.filter(pk=product_id, quantity__gte=cantidad).update(
+                    quantity=F("quantity") - cantidad, updated_at=now
+                ):
+                    return error(f"Stock insuficiente para {producto.name}. Otra venta lo modificó; intenta de nuevo.")
                 producto.quantity -= cantidad
-                producto.save()
                 # ✅ Verificación automática de stock mínimo (FR-11)
-                if hasattr(producto, "min_stock") and producto.quantity <= producto.min_stock:
-                    messages.warning(
-                        request,
-                        f"⚠️ El producto '{producto.name}' ha alcanzado su stock mínimo ({producto.quantity} unidades restantes)."
-                    )
-                total += subtotal
-
-            factura.total = total
+                if producto.quantity <= producto.min_stock:
+                    low_stock.append(producto)
+
+            # crear factura con el total ya calculado; el código se pide al final para
+            # retener lo menos posible el contador de la serie
+            factura = factura_form.save(commit=False)
+            factura.codigo = next_code()
+            factura.total = sum(locked[product_id].price * cantidad for product_id, cantidad in lines)
             factura.save()
 
-            messages.success(request, f"✅ Factura {factura.codigo} registrada correctamente. Total: ${factura.total}.")
-            return redirect("sales_list")
+            # crear detalles
+            DetalleFactura.objects.bulk_create([
+                DetalleFactura(
+                    factura=factura,
+                    producto=locked[product_id],
+                    cantidad=cantidad,
+                    precio_unitario=locked[product_id].price,
+                    subtotal=locked[product_id].price * cantidad,
+                )
+                for product_id, cantidad in lines
+            ])
+
+            for producto in low_stock:
+                messages.warning(
+                    request,
+                    f"⚠️ El producto '{producto.name}' ha alcanzado su stock mínimo ({producto.quantity} unidades restantes)."
+                )
+
+            if key:
+                InvoiceSubmission.objects.filter(key=key).update(factura=factura)
+
+            # update() no dispara las señales de Product: las facetas del inventario se invalidan aquí
+            transaction.on_commit(invalidate_facets)
+            # resumen diario de ventas para analítica (misma transacción)
+            record_invoice(factura)
+
+            return _registered(request, factura)
         else:
             # formulario inválido
             messages.error(request, "Revisa los datos de la factura.")
-            return render(request, "register_invoice.html", {"factura_form": factura_form, "products": products})
+            return render(request, "register_invoice.html", _form_context(factura_form, products))
 
     # GET
     factura_form = FacturaForm()
-    return render(request, "register_invoice.html", {"factura_form": factura_form, "products": products})
\ No newline at end of file
+    return render(request, "register_invoice.html", _form_context(factura_form, products))
+
+
+def _byte_range(request, etag, size):
+    """
+    (inicio, fin) del encabezado Range si pide un único rango válido; None para
+    enviar el archivo completo (sin Range, varios rangos o If-Range de otra
+    versión); ValueError si el rango no se puede satisfacer.
+    """
+    header = request.headers.get("Range", "")
+    if not header or request.headers.get("If-Range", etag) != etag:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1  # bytes=-N: los últimos N
+    if start > end or start >= size:
+        raise ValueError
+    return start, end
+
+
+def invoice_pdf(request, factura_id):
+    """
+    PDF de la factura leído del archivo guardado, con ETag (304 si el navegador
+    ya lo tiene) y rangos de bytes (206). Si el worker todavía no lo generó, se
+    genera ahora y queda guardado para las siguientes descargas.
+    """
+    factura = get_object_or_404(Factura, pk=factura_id)
+    if factura.pdf_etag:
+        etag = f'"{factura.pdf_etag}"'
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified["ETag"] = etag
+            return not_modified
+    store_pdf(factura)
+    etag = f'"{factura.pdf_etag}"'
+
+    try:
+        file = factura.pdf.open("rb")
+    except FileNotFoundError:
+        raise Http404("El PDF de la factura no está disponible.")
+    filename = f"factura-{factura.codigo}.pdf"
+    size = file.size
+    try:
+        byte_range = _byte_range(request, etag, size)
+    except ValueError:
+        file.close()
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if byte_range is None:
+        response = FileResponse(file, filename=filename, content_type="application/pdf")
+    else:
+        start, end = byte_range
+        with file:
+            file.seek(start)
+            response = HttpResponse(file.read(end - start + 1), status=206, content_type="application/pdf")
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Disposition"] = f'inline; filename="{filename}"'
+    response["ETag"] = etag
+    response["Accept-Ranges"] = "bytes"
+    patch_cache_control(response, private=True, max_age=PDF_MAX_AGE)
+    return response
+
+
+def invoices_month_zip(request):
+    """
+    ZIP con los PDFs guardados de las facturas de un mes (?mes=AAAA-MM; por
+    defecto el actual), enviado en streaming a medida que se leen los archivos.
+    """
+    match = re.fullmatch(r"(\d{4})-(\d{2})", request.GET.get("mes", "").strip())
+    today = timezone.localdate()
+    year, month = (int(match[1]), int(match[2])) if match else (today.year, today.month)
+    # month_invoices necesita también el 1.º del mes siguiente (9999-12 no tiene),
+    # así que el último año admitido es MAXYEAR - 1
+    if not (MINYEAR <= year < MAXYEAR and 1 <= month <= 12):
+        raise Http404("Mes no válido.")
+    response = StreamingHttpResponse(iter_zip(month_invoices(year, month)), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="facturas-{year}-{month:02d}.zip"'
+    return response
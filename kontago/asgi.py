@@ -9,8 +9,21 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kontago.settings')
 
 application = get_asgi_application()
+
+# En desarrollo (uvicorn --reload) se sirven los estáticos como lo hace runserver
+if settings.DEBUG:
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+
+    application = ASGIStaticFilesHandler(application)
+
+# Procesos de matplotlib listos antes de la primera gráfica (analytics/render_pool.py)
+if settings.CHART_RENDER_WARM_UP:
+    from analytics.render_pool import warm_up
+
+    warm_up()
@@ -86,6 +86,25 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 'default' es la LocMemCache por proceso que Django usa si no se configura nada.
+# Los conteos de los filtros del inventario (inventory/facets.py) tienen su propio
+# alias para poder llevarlos a Redis o Memcached sin tocar el resto: con varios
+# procesos de servidor hace falta un backend compartido para que la invalidación
+# tras un cambio llegue a todos.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'facets': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'kontago-facets',
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -135,4 +154,35 @@ MEDIA_URL = '/media/'
 
 LOGIN_URL = '/account/login/'
 LOGIN_REDIRECT_URL = '/'
-LOGOUT_REDIRECT_URL = '/account/login/'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = '/account/login/'
+
+# Caché de respuestas de OpenAI (inventory/llm.py)
+LLM_CACHE_TTL = 7 * 24 * 3600  # segundos
+LLM_CACHE_MAX_ENTRIES = 5000
+LLM_CACHE_PRUNE_EVERY = 100  # escrituras entre limpiezas (también: manage.py llm_cache --prune)
+LLM_STREAM_TIMEOUT = 90  # segundos máximos por respuesta en streaming
+LLM_FANOUT_CHUNK_SIZE = 15  # productos por consulta en los análisis de catálogo completo
+LLM_FANOUT_CONCURRENCY = 4  # consultas simultáneas a OpenAI por página
+
+# Pool de procesos que dibuja las gráficas (analytics/render_pool.py); 0 = en el proceso
+CHART_RENDER_WORKERS = min(2, os.cpu_count() or 1)
+CHART_RENDER_TIMEOUT = 10  # segundos que una solicitud espera al pool antes de la imagen provisional
+# True: wsgi.py/asgi.py arrancan los procesos al cargar, no con la primera gráfica.
+# Conviene en los servidores de producción; en desarrollo y comandos no hace falta.
+CHART_RENDER_WARM_UP = False
+
+# Motor de reabastecimiento (analytics/restock.py)
+RESTOCK_DEMAND_DAYS = 30  # ventana para la demanda diaria
+RESTOCK_LEAD_TIME_DAYS = 7  # días que tarda en llegar un pedido
+RESTOCK_REVIEW_DAYS = 14  # días de demanda que cubre cada pedido
+RESTOCK_SERVICE_Z = 1.65  # ~95% de nivel de servicio
+
+# Pronóstico de demanda (analytics/forecasting.py, manage.py refresh_forecasts)
+FORECAST_HISTORY_DAYS = 90  # días de historial para ajustar los modelos
+
+# Numeración de facturas (invoices/numbering.py)
+INVOICE_SERIES = "F"  # prefijo de los códigos de este nodo (p. ej. "T2-" para la tienda 2)
+INVOICE_NUMBER_BLOCK_SIZE = 1  # > 1: cada proceso reserva bloques de códigos (puede dejar huecos)
+
+# Claves de idempotencia de las facturas (invoices/idempotency.py)
+INVOICE_IDEMPOTENCY_TTL_HOURS = 48  # horas que se guardan; las borra manage.py purge_invoice_submissions
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kontago.settings')
 
 application = get_wsgi_application()
+
+# Procesos de matplotlib listos antes de la primera gráfica (analytics/render_pool.py)
+from django.conf import settings  # noqa: E402
+
+if settings.CHART_RENDER_WARM_UP:
+    from analytics.render_pool import warm_up
+
+    warm_up()